@@ -72,12 +72,63 @@ const Upload = () => {
     }
   };
 
+  // Map backend results into the existing results shape
+  const mapResults = (items, offset) =>
+    items.map((r, idx) => ({
+      id: offset + idx + 1,
+      name: r.title || r.name || 'Product',
+      price: r.price || '',
+      store: r.store || r.source || '',
+      image: r.image || uploadedImage.preview,
+      similarity: Math.round((r.score || 0.8) * 100) || 80,
+      link: r.link || r.url || '#',
+      snippet: r.snippet || r.description || '',
+    }));
+
+  // Apply one NDJSON event from /upload/stream as soon as it arrives
+  const handleStreamEvent = (event, state) => {
+    switch (event.event) {
+      case 'raw_caption':
+        setRawCaption(event.raw_caption || '');
+        break;
+      case 'refined_query':
+        setRefinedQuery(event.refined_query || '');
+        break;
+      case 'results':
+        if (Array.isArray(event.results) && event.results.length > 0) {
+          const mapped = mapResults(event.results, state.count);
+          state.count += mapped.length;
+          setResults((prev) => [...prev, ...mapped]);
+          setSuccess(true);
+        }
+        break;
+      case 'summary':
+        setApiStatus(event.processing_info?.apis_used || {});
+        // Replace the provisional per-provider list with the final ranked merge
+        if (Array.isArray(event.results) && event.results.length > 0) {
+          setResults(mapResults(event.results, 0));
+        }
+        if (!event.total_results) {
+          setError('No similar products found. Try uploading a different image.');
+        }
+        break;
+      case 'error':
+        setError(event.detail || 'Failed to process image');
+        break;
+      default:
+        break;
+    }
+  };
+
   const processImage = async () => {
     if (!uploadedImage) return;
 
     setIsProcessing(true);
     setError('');
     setSuccess(false);
+    setResults([]);
+    setRawCaption('');
+    setRefinedQuery('');
 
     const formData = new FormData();
     formData.append("file", uploadedImage.file);
@@ -85,43 +136,38 @@ const Upload = () => {
     try {
       console.log("Sending image to backend...");
       
-      const response = await fetch("http://127.0.0.1:8000/upload", {
+      const response = await fetch("http://127.0.0.1:8000/upload/stream", {
         method: "POST",
         body: formData,
       });
 
       console.log("Response status:", response.status);
       
-      if (response.ok) {
-        const data = await response.json();
-        console.log("Received upload data:", data);
-        
-        if (data.success) {
-          // Show raw caption and refined query
-          setRawCaption(data.raw_caption || '');
-          setRefinedQuery(data.refined_query || '');
-          setApiStatus(data.processing_info?.apis_used || {});
-          
-          // Map tavily results into the existing results shape
-          if (Array.isArray(data.results) && data.results.length > 0) {
-            const mapped = data.results.map((r, idx) => ({
-              id: idx + 1,
-              name: r.title || r.name || 'Product',
-              price: r.price || '',
-              store: r.store || r.source || '',
-              image: r.image || uploadedImage.preview,
-              similarity: Math.round((r.score || 0.8) * 100) || 80,
-              link: r.link || r.url || '#',
-              snippet: r.snippet || r.description || '',
-            }));
-            setResults(mapped);
-            setSuccess(true);
-          } else {
-            setResults([]);
-            setError('No similar products found. Try uploading a different image.');
+      if (response.ok && response.body) {
+        // Each line is one pipeline stage; render it without waiting for the rest
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const state = { count: 0 };
+        let buffer = '';
+
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+
+          let newline;
+          while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (line) {
+              const event = JSON.parse(line);
+              console.log("Received stream event:", event.event);
+              handleStreamEvent(event, state);
+            }
           }
-        } else {
-          setError(data.detail || 'Failed to process image');
+        }
+        if (buffer.trim()) {
+          handleStreamEvent(JSON.parse(buffer), state);
         }
       } else {
         const errorData = await response.json().catch(() => ({}));
@@ -0,0 +1,207 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.ranking import STOPWORDS, canonicalize_url, tokenize
+
+# Currency markers (symbols, prefixes and ISO codes) -> ISO 4217 code
+CURRENCY_MARKERS = {
+    "$": "USD", "us$": "USD", "usd": "USD",
+    "₹": "INR", "rs": "INR", "rs.": "INR", "inr": "INR",
+    "€": "EUR", "eur": "EUR",
+    "£": "GBP", "gbp": "GBP",
+    "¥": "JPY", "jpy": "JPY",
+    "a$": "AUD", "au$": "AUD", "aud": "AUD",
+    "c$": "CAD", "ca$": "CAD", "cad": "CAD",
+}
+
+# Alphabetic markers must be whole words, so "Covers 2" isn't read as "Rs 2"
+_PRICE = re.compile(
+    r"(?P<pre>\b(?:us\$|au\$|ca\$|a\$|c\$|rs\.?|inr|usd|eur|gbp|jpy|aud|cad)|[$₹€£¥])?\s*"
+    r"(?P<num>\d[\d,.]*)"
+    r"\s*(?P<post>(?:inr|usd|eur|gbp|jpy|aud|cad)\b|[$₹€£¥])?",
+    re.IGNORECASE,
+)
+
+# Attributes that must agree for two offers to be the same product
+COLORS = {
+    "black", "white", "navy", "blue", "red", "green", "grey", "gray", "beige", "brown",
+    "maroon", "pink", "purple", "yellow", "orange", "olive", "khaki", "cream", "tan",
+}
+GARMENTS = {
+    "shirt", "tshirt", "tee", "top", "blouse", "dress", "gown", "jeans", "pants",
+    "trousers", "chinos", "shorts", "skirt", "jacket", "blazer", "coat", "hoodie", "sweater",
+    "kurta", "saree", "sneakers", "shoes", "boots",
+}
+_GRAY_ALIASES = {"gray": "grey"}
+
+# Store names often appended to titles ("... - Myntra") carry no product signal
+STORE_WORDS = {"amazon", "myntra", "ajio", "flipkart", "walmart", "ebay", "etsy", "com", "in"}
+
+
+def parse_price(text) -> Tuple[Optional[float], Optional[str]]:
+    """Parse a display price such as "$49.99", "₹1,299" or "39,99 €" into (amount, currency).
+
+    Ranges ("$20 - $30") use the lower bound, and an amount with a currency marker is
+    preferred over bare numbers. Returns (None, None) when no amount is found.
+    """
+    if isinstance(text, (int, float)):
+        return float(text), None
+    if not text:
+        return None, None
+    matches = list(_PRICE.finditer(str(text)))
+    if not matches:
+        return None, None
+    # An amount with a currency marker beats bare numbers ("Pack of 2 for $50")
+    match = next((m for m in matches if m.group("pre") or m.group("post")), matches[0])
+
+    marker = (match.group("pre") or match.group("post") or "").lower()
+    currency = CURRENCY_MARKERS.get(marker)
+    number = match.group("num").rstrip(".,")
+
+    if "," in number and "." in number:
+        # 1.299,00 (European) vs 1,299.00 (US/Indian)
+        if number.rfind(",") > number.rfind("."):
+            number = number.replace(".", "").replace(",", ".")
+        else:
+            number = number.replace(",", "")
+    elif "," in number:
+        # 39,99 is a decimal comma; 1,299 and 1,29,999 are grouping
+        head, _, tail = number.rpartition(",")
+        number = f"{head.replace(',', '')}.{tail}" if len(tail) == 2 and head.count(",") == 0 else number.replace(",", "")
+    elif number.count(".") > 1:
+        number = number.replace(".", "")
+    elif currency == "EUR" and "." in number and len(number.rpartition(".")[2]) == 3:
+        # Euro prices group thousands with a dot: "€ 1.299" is 1299, not 1.299
+        number = number.replace(".", "")
+
+    try:
+        return float(number), currency
+    except ValueError:
+        return None, None
+
+
+def _product_tokens(title: str) -> frozenset:
+    return frozenset(t for t in tokenize(title) if t not in STORE_WORDS and t not in STOPWORDS)
+
+
+def _attribute(tokens: frozenset, vocabulary: set) -> str:
+    found = sorted(tokens & vocabulary)
+    return _GRAY_ALIASES.get(found[0], found[0]) if found else ""
+
+
+class PriceCompareAgent:
+    def __init__(self, similarity_threshold: float = 0.6):
+        self.similarity_threshold = similarity_threshold
+
+    def compare(self, results: List[Dict], default_currency: Optional[str] = None) -> List[Dict]:
+        """Group the same product across stores and summarize its prices.
+
+        Returns one entry per product with min/max/median price, offer and store
+        counts, and its offers sorted cheapest first. Products offered by more
+        stores come first, then the cheapest.
+        """
+        titles: List[str] = []
+        offers: List[Dict] = []
+        amounts: List[float] = []
+        currencies: List[str] = []
+        seen_links = set()
+
+        # One pass over the merged results builds the price columns
+        for item in results:
+            if not isinstance(item, dict):
+                continue
+            amount, currency = parse_price(item.get("price") or item.get("extracted_price"))
+            if amount is None or amount <= 0:
+                continue
+            link = item.get("link") or item.get("url") or ""
+            canonical = canonicalize_url(link)
+            if canonical and canonical in seen_links:
+                continue
+            seen_links.add(canonical)
+            titles.append(item.get("title") or "")
+            amounts.append(amount)
+            currencies.append(currency or default_currency or "")
+            offers.append({
+                "title": item.get("title") or "",
+                "price": item.get("price"),
+                "amount": amount,
+                "currency": currency or default_currency,
+                "store": item.get("source") or item.get("store") or "",
+                "link": link,
+            })
+
+        if not offers:
+            return []
+
+        group_ids = self._group(titles, currencies)
+        return self._summarize(offers, np.asarray(amounts, dtype=np.float64), group_ids, currencies)
+
+    # Backwards-compatible alias matching the other agents
+    def run(self, results: List[Dict]) -> List[Dict]:
+        return self.compare(results)
+
+    def _group(self, titles: List[str], currencies: List[str]) -> np.ndarray:
+        """Assign a product id to every offer.
+
+        Offers are blocked by (currency, garment, color) so fuzzy title matching
+        only compares offers that could be the same product; within a block an
+        offer joins the first product whose title tokens overlap enough.
+        """
+        group_ids = np.empty(len(titles), dtype=np.int64)
+        blocks: Dict[Tuple[str, str, str], List[Tuple[frozenset, int]]] = {}
+        exact: Dict[Tuple[str, frozenset], int] = {}
+        next_id = 0
+        for i, title in enumerate(titles):
+            tokens = _product_tokens(title)
+            # Identical token sets (reordered/re-punctuated titles) skip the fuzzy scan
+            known = exact.get((currencies[i], tokens))
+            if known is not None:
+                group_ids[i] = known
+                continue
+            block_key = (currencies[i], _attribute(tokens, GARMENTS), _attribute(tokens, COLORS))
+            products = blocks.setdefault(block_key, [])
+            for representative, product_id in products:
+                union = len(tokens | representative)
+                if union and len(tokens & representative) / union >= self.similarity_threshold:
+                    group_ids[i] = product_id
+                    break
+            else:
+                products.append((tokens, next_id))
+                group_ids[i] = next_id
+                next_id += 1
+            exact[(currencies[i], tokens)] = int(group_ids[i])
+        return group_ids
+
+    @staticmethod
+    def _summarize(offers: List[Dict], amounts: np.ndarray, group_ids: np.ndarray, currencies: List[str]) -> List[Dict]:
+        # Sort by (product, price) so every product is a contiguous, price-ordered run
+        order = np.lexsort((amounts, group_ids))
+        sorted_groups = group_ids[order]
+        sorted_amounts = amounts[order]
+
+        starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+        counts = np.diff(np.r_[starts, len(order)])
+        mins = sorted_amounts[starts]
+        maxs = sorted_amounts[starts + counts - 1]
+        medians = (sorted_amounts[starts + (counts - 1) // 2] + sorted_amounts[starts + counts // 2]) / 2.0
+
+        products = []
+        for g, start in enumerate(starts):
+            run = order[start:start + counts[g]]
+            product_offers = [offers[i] for i in run]
+            cheapest = product_offers[0]
+            products.append({
+                "title": cheapest["title"],
+                "currency": currencies[run[0]] or None,
+                "min_price": round(float(mins[g]), 2),
+                "max_price": round(float(maxs[g]), 2),
+                "median_price": round(float(medians[g]), 2),
+                "offer_count": int(counts[g]),
+                "store_count": len({o["store"] for o in product_offers if o["store"]}),
+                "offers": product_offers,
+            })
+
+        products.sort(key=lambda p: (-p["store_count"], -p["offer_count"], p["min_price"]))
+        return products
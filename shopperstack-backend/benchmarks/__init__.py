@@ -0,0 +1,3 @@
+# benchmarks package
+# Run individual benchmarks from the backend directory, e.g.
+# `python -m benchmarks.bench_ranking`.
@@ -0,0 +1,69 @@
+"""Throughput of the heuristic refiner's attribute extractor (services/attributes.py).
+
+Generates caption-like sentences from the vocabulary plus filler words, then
+reports captions per second for `refine` one at a time and for `refine_batch`
+(where repeated captions are extracted once), and the compile time.
+
+Run from the backend directory:
+    python -m benchmarks.bench_attributes [--captions 50000] [--unique 0.3]
+"""
+import argparse
+import json
+import random
+import time
+
+from services.attributes import AttributeExtractor
+from utils import config
+
+OPENERS = ["A", "An image of a", "A photo of a", "A man wearing a", "A woman in a", "Close-up of a"]
+FILLER = ["with", "and", "on a white background", "standing", "collar", "pockets", "model", "outdoors"]
+
+
+def make_captions(vocabulary, n: int, unique_share: float, seed: int = 5):
+    rng = random.Random(seed)
+    attributes = vocabulary["attributes"]
+    terms = {}
+    for name, spec in attributes.items():
+        values = spec["values"]
+        terms[name] = [term for entry in values.values()
+                       for term in (entry if isinstance(entry, list) else entry["terms"])]
+    unique = []
+    for _ in range(max(1, int(n * unique_share))):
+        words = [rng.choice(OPENERS)]
+        for name in rng.sample(list(terms), k=rng.randint(1, len(terms))):
+            words.append(rng.choice(terms[name]))
+            if rng.random() < 0.4:
+                words.append(rng.choice(FILLER))
+        unique.append(" ".join(words))
+    return [rng.choice(unique) for _ in range(n)]
+
+
+def bench(n: int, unique_share: float) -> None:
+    with open(config.ATTRIBUTE_VOCAB_PATH) as f:
+        vocabulary = json.load(f)
+    start = time.perf_counter()
+    extractor = AttributeExtractor(vocabulary)
+    compile_ms = (time.perf_counter() - start) * 1000
+    captions = make_captions(vocabulary, n, unique_share)
+    print(f"{extractor.size} terms compiled in {compile_ms:.1f} ms; "
+          f"{n} captions, {len(set(captions))} unique, {sum(map(len, captions)) / n:.0f} chars on average")
+
+    start = time.perf_counter()
+    for caption in captions:
+        extractor.refine(caption)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    extractor.refine_batch(captions)
+    batch = time.perf_counter() - start
+
+    print(f"refine        {n / single:>10,.0f} captions/s  ({single / n * 1e6:.1f} us each)")
+    print(f"refine_batch  {n / batch:>10,.0f} captions/s  ({batch / n * 1e6:.1f} us each)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--captions", type=int, default=50000)
+    parser.add_argument("--unique", type=float, default=0.3, help="share of distinct captions")
+    args = parser.parse_args()
+    bench(args.captions, args.unique)
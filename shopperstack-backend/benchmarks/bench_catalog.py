@@ -0,0 +1,114 @@
+"""Benchmark for the offline product catalog (services/catalog.py).
+
+Generates a synthetic fashion catalog, builds and saves its index, maps it back
+in, then times top-k queries: exact (every posting read) and with a postings
+budget. "quality" is the exact BM25 score mass of the budgeted top k relative to
+the exact top k (the synthetic catalog has many tied products, so comparing doc
+ids would understate it).
+
+Run from the backend directory:
+    python -m benchmarks.bench_catalog [--sizes 10000 100000 300000] [--queries 200] [--k 5] [--budget 20000]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from services.catalog import CatalogIndex
+
+COLORS = ["black", "white", "navy", "blue", "red", "green", "grey", "beige", "brown", "maroon", "olive",
+          "mustard", "pink", "lavender", "teal", "cream"]
+MATERIALS = ["cotton", "linen", "silk", "denim", "wool", "polyester", "rayon", "chiffon", "khadi", "velvet"]
+TYPES = ["shirt", "button-up shirt", "dress", "jeans", "jacket", "blazer", "kurta", "t-shirt", "chinos",
+         "saree", "hoodie", "sweater", "skirt", "shorts", "sneakers", "lehenga", "trousers", "polo"]
+STYLES = ["formal", "casual", "party wear", "office wear", "slim fit", "regular fit", "oversized", "festive",
+          "summer", "winter", "printed", "embroidered", "striped", "solid"]
+SLEEVES = ["long sleeve", "short sleeve", "sleeveless", "three-quarter sleeve"]
+BRANDS = [f"brand{i}" for i in range(400)]
+STORES = ["myntra", "ajio", "amazon", "flipkart", "tatacliq", "nykaa fashion"]
+
+QUERIES = [
+    "black button-up shirt long sleeve cotton formal office wear",
+    "red silk saree festive",
+    "blue denim jeans slim fit",
+    "white linen kurta summer casual",
+    "olive wool blazer winter formal",
+    "striped cotton t-shirt oversized",
+]
+
+
+def make_product(rng: random.Random, i: int) -> dict:
+    color, material, kind = rng.choice(COLORS), rng.choice(MATERIALS), rng.choice(TYPES)
+    style, sleeve, brand = rng.choice(STYLES), rng.choice(SLEEVES), rng.choice(BRANDS)
+    return {
+        "title": f"{brand.title()} {color.title()} {material.title()} {kind.title()} - {style.title()}",
+        "link": f"https://shop.example.com/p/{i}",
+        "snippet": f"{sleeve} {kind} in {material}, {style}. Machine washable, {rng.choice(STYLES)} look.",
+        "price": f"${rng.randint(10, 150)}.99",
+        "store": rng.choice(STORES),
+    }
+
+
+def make_catalog(path: str, n: int, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps(make_product(rng, i)) + "\n")
+
+
+def _score_mass(index: CatalogIndex, query: str, k: int, budget: int) -> float:
+    exact = index.search(query, k)
+    everything = dict(index.search(query, index.size))
+    ideal = sum(score for _, score in exact)
+    return sum(everything[doc] for doc, _ in index.search(query, k, budget)) / ideal if ideal else 1.0
+
+
+def _time_queries(fn, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def bench(sizes, n_queries: int, k: int, budget: int) -> None:
+    rng = random.Random(3)
+    queries = []
+    for _ in range(n_queries):
+        base = rng.choice(QUERIES).split()
+        queries.append(" ".join(rng.sample(base, k=max(2, len(base) - rng.randrange(3)))))
+
+    print(f"{'docs':>8} {'build s':>8} {'map ms':>7} {'exact p50':>9} {'exact p95':>9} "
+          f"{'budget p50':>10} {'budget p95':>10} {'quality':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = os.path.join(tmp, f"catalog-{n}.jsonl")
+            make_catalog(path, n)
+            built = CatalogIndex.build(path)
+            built.save(os.path.join(tmp, f"index-{n}"))
+
+            start = time.perf_counter()
+            index = CatalogIndex.load(os.path.join(tmp, f"index-{n}"))
+            map_ms = (time.perf_counter() - start) * 1000
+
+            index.search(queries[0], k)  # warm the page cache
+            e50, e95 = _time_queries(lambda q: index.search(q, k), queries)
+            b50, b95 = _time_queries(lambda q: index.search(q, k, budget), queries)
+            quality = statistics.mean(_score_mass(index, q, k, budget) for q in queries)
+            print(f"{n:>8} {built.meta['build_seconds']:>8.2f} {map_ms:>7.1f} {e50:>9.3f} {e95:>9.3f} "
+                  f"{b50:>10.3f} {b95:>10.3f} {quality:>7.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=20000)
+    args = parser.parse_args()
+    bench(args.sizes, args.queries, args.k, args.budget)
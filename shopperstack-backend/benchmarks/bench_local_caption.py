@@ -0,0 +1,99 @@
+"""Micro-benchmark for the local (offline) captioner.
+
+Compares the NumPy captioner in services/local_caption.py, one image at a time
+and batched, against the previous pure-Pillow/Python implementation.
+
+Run from the backend directory:
+    python -m benchmarks.bench_local_caption [--sizes 640 1024 2048] [--batch 16] [--repeat 10]
+"""
+import argparse
+import io
+import random
+import statistics
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from services import local_caption
+
+
+def legacy_caption(img_bytes) -> str:
+    """The captioner `_local_image_caption` used before the NumPy rewrite."""
+    img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
+    thumb = img.copy()
+    thumb.thumbnail((200, 200))
+
+    pixels = list(thumb.getdata())
+    r = sum([p[0] for p in pixels]) / len(pixels)
+    g = sum([p[1] for p in pixels]) / len(pixels)
+    b = sum([p[2] for p in pixels]) / len(pixels)
+
+    best = None
+    best_dist = None
+    for name, (cr, cg, cb) in list(local_caption.NAMED_COLORS.items())[:11]:
+        d = (r - cr) ** 2 + (g - cg) ** 2 + (b - cb) ** 2
+        if best_dist is None or d < best_dist:
+            best = name
+            best_dist = d
+
+    edges = thumb.convert('L').filter(ImageFilter.FIND_EDGES)
+    edges.getbbox()
+    nonzero = sum(1 for px in edges.getdata() if px > 20)
+    density = nonzero / (edges.width * edges.height)
+    pattern = 'patterned' if density > 0.04 else 'solid'
+
+    w, h = img.size
+    aspect = h / (w + 1e-6)
+    likely = 'shirt' if aspect < 1.6 else 'dress' if aspect > 1.6 else 'garment'
+    return f"A {pattern} {best} {likely}"
+
+
+def make_image(edge: int, seed: int) -> bytes:
+    """A garment-like JPEG: colored block on a light backdrop, striped for odd seeds."""
+    rng = random.Random(seed)
+    w, h = edge, int(edge * rng.choice([1.0, 1.3, 1.8]))
+    img = Image.new("RGB", (w, h), (235, 235, 230))
+    draw = ImageDraw.Draw(img)
+    color = tuple(rng.randrange(256) for _ in range(3))
+    draw.rectangle([w // 6, h // 8, w * 5 // 6, h * 7 // 8], fill=color)
+    if seed % 2:
+        stripe = tuple(255 - c for c in color)
+        for y in range(h // 8, h * 7 // 8, max(4, h // 40)):
+            draw.line([(w // 6, y), (w * 5 // 6, y)], fill=stripe, width=2)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _median_ms(fn, repeat):
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def bench(sizes, batch, repeat):
+    print(f"batch of {batch} JPEGs, median of {repeat} runs, ms per image")
+    print(f"{'edge px':>8} {'legacy':>8} {'single':>8} {'batched':>8} {'speedup':>8}")
+    for edge in sizes:
+        images = [make_image(edge, seed) for seed in range(batch)]
+        legacy = _median_ms(lambda: [legacy_caption(b) for b in images], repeat) / batch
+        single = _median_ms(lambda: [local_caption.caption_image(b) for b in images], repeat) / batch
+        batched = _median_ms(lambda: local_caption.caption_batch(images), repeat) / batch
+        print(f"{edge:>8} {legacy:>8.2f} {single:>8.2f} {batched:>8.2f} {legacy / batched:>7.1f}x")
+
+    sample = make_image(sizes[0], 1)
+    print(f"\nlegacy: {legacy_caption(sample)!r}")
+    print(f"numpy:  {local_caption.caption_image(sample)!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[640, 1024, 2048])
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    bench(args.sizes, args.batch, args.repeat)
@@ -0,0 +1,64 @@
+"""Micro-benchmark for the multi-provider merge/ranking stage.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ranking [--sizes 500 2000 5000] [--repeat 20]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from services.ranking import rank_results
+
+COLORS = ["black", "white", "navy", "blue", "red", "green", "grey", "beige", "brown", "maroon"]
+TYPES = ["shirt", "button-up shirt", "dress", "jeans", "jacket", "blazer", "kurta", "t-shirt", "chinos"]
+MATERIALS = ["cotton", "linen", "silk", "denim", "wool", "polyester blend"]
+STYLES = ["formal office wear", "casual wear", "party wear", "slim fit", "regular fit"]
+STORES = ["myntra.com", "ajio.com", "amazon.in", "flipkart.com", "example.com", "fashionstore.com"]
+
+QUERY = "black button-up shirt long sleeve cotton formal office wear"
+
+
+def make_candidates(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    items = []
+    for i in range(n):
+        title = " ".join([
+            rng.choice(COLORS).title(), rng.choice(MATERIALS).title(),
+            rng.choice(TYPES).title(), "-", rng.choice(STYLES).title(),
+        ])
+        # ~10% exact duplicates behind tracking params
+        product_id = rng.randrange(int(n * 0.9) or 1)
+        store = rng.choice(STORES)
+        items.append({
+            "title": title,
+            "link": f"https://www.{store}/p/{product_id}?utm_source=google&gclid={i}",
+            "price": f"${rng.randint(10, 120)}.99",
+            "source": store,
+            "snippet": f"{title}. {rng.choice(STYLES)} in {rng.choice(MATERIALS)}, long sleeve, machine washable.",
+        })
+    return items
+
+
+def bench(sizes, repeat):
+    print(f"query: {QUERY!r}")
+    print(f"{'candidates':>10} {'median ms':>10} {'p95 ms':>8} {'returned':>9}")
+    for n in sizes:
+        items = make_candidates(n)
+        rank_results(QUERY, items)  # warm-up
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ranked = rank_results(QUERY, items)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{n:>10} {statistics.median(timings):>10.2f} {p95:>8.2f} {len(ranked):>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 2000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    bench(args.sizes, args.repeat)
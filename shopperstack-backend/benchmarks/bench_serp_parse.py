@@ -0,0 +1,182 @@
+"""CPU cost of turning a SerpApi google_shopping response into products.
+
+Compares the old path (`response.json()`: decode the body to text, parse it all
+with the standard json module, then build a dict for every item) with the lean
+one in services/serp.py (orjson straight from bytes when installed, skipping
+items without a title and link before building anything), and with the much
+smaller body SerpApi returns when SERP_JSON_RESTRICTOR is set.
+
+The default response is synthetic but shaped like a recorded one: 60 shopping
+results carrying every field SerpApi sends (ratings, extensions, thumbnails,
+product API links...) plus the search metadata, filters and inline results. Use
+`--response` to benchmark a real recorded body, or `--save` to write the
+synthetic one out.
+
+Run from the backend directory:
+    python -m benchmarks.bench_serp_parse [--response recorded.json] [--repeat 200]
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.bench_ranking import COLORS, MATERIALS, STORES, STYLES, TYPES
+from services import serp
+from services.serp import parse_response
+
+QUERY = "black cotton button-up shirt"
+RESTRICTED_FIELDS = ("title", "link", "price", "source", "snippet")
+
+
+def make_response(results: int = 60, seed: int = 7) -> Dict:
+    """A google_shopping response with SerpApi's full per-item payload."""
+    rng = random.Random(seed)
+    items = []
+    for i in range(results):
+        store = rng.choice(STORES)
+        title = " ".join([rng.choice(COLORS).title(), rng.choice(MATERIALS).title(), rng.choice(TYPES).title(),
+                          "-", rng.choice(STYLES).title()])
+        product_id = f"{rng.getrandbits(64)}"
+        price = rng.randint(10, 120) + 0.99
+        items.append({
+            "position": i + 1,
+            "title": title,
+            "link": f"https://www.{store}/p/{product_id}?utm_source=google_shopping&srsltid={rng.getrandbits(96):x}",
+            "product_link": f"https://www.google.com/shopping/product/{product_id}?gl=us&hl=en&q=black+shirt",
+            "product_id": product_id,
+            "serpapi_product_api": f"https://serpapi.com/search.json?engine=google_product&product_id={product_id}&gl=us&hl=en",
+            "serpapi_product_api_comparative": f"https://serpapi.com/search.json?engine=google_product&offers=1&product_id={product_id}",
+            "source": store,
+            "source_icon": f"https://encrypted-tbn0.gstatic.com/favicon-tbn?q=tbn:{rng.getrandbits(128):x}",
+            "price": f"${price:.2f}",
+            "extracted_price": price,
+            "old_price": f"${price + 15:.2f}",
+            "extracted_old_price": price + 15,
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "reviews": rng.randint(0, 20000),
+            "extensions": ["Free delivery", f"{rng.randint(5, 40)}% off", "Free 30-day returns"],
+            "badge": "Top Quality Store",
+            "thumbnail": f"https://encrypted-tbn1.gstatic.com/shopping?q=tbn:{rng.getrandbits(256):x}&usqp=CAE",
+            "thumbnails": [f"https://encrypted-tbn{j}.gstatic.com/shopping?q=tbn:{rng.getrandbits(256):x}" for j in range(4)],
+            "tag": "SALE",
+            "delivery": "Free delivery by Fri, Oct 24",
+            "store_rating": round(rng.uniform(3.5, 5.0), 1),
+            "store_reviews": rng.randint(100, 90000),
+            "snippet": f"{title}. {rng.choice(STYLES)} in {rng.choice(MATERIALS)}, long sleeve, machine washable.",
+        })
+    filters = [
+        {"type": name, "options": [{"text": f"{name} option {j}",
+                                    "tbs": f"mr:1,{name.lower()}:{rng.getrandbits(48):x}",
+                                    "link": f"https://www.google.com/search?tbm=shop&q=black+shirt&tbs={rng.getrandbits(64):x}",
+                                    "serpapi_link": f"https://serpapi.com/search.json?engine=google_shopping&tbs={rng.getrandbits(64):x}"}
+                                   for j in range(12)]}
+        for name in ("Price", "Color", "Size", "Brand", "Material", "Sleeve length", "Seller", "Condition")
+    ]
+    return {
+        "search_metadata": {"id": f"{rng.getrandbits(96):x}", "status": "Success",
+                            "json_endpoint": "https://serpapi.com/searches/abc/def.json",
+                            "created_at": "2026-10-17 10:00:00 UTC", "processed_at": "2026-10-17 10:00:00 UTC",
+                            "google_shopping_url": "https://www.google.com/search?tbm=shop&q=black+shirt",
+                            "raw_html_file": "https://serpapi.com/searches/abc/def.html", "total_time_taken": 1.84},
+        "search_parameters": {"engine": "google_shopping", "q": QUERY, "google_domain": "google.com",
+                              "device": "desktop"},
+        "search_information": {"shopping_results_state": "Results for exact spelling",
+                               "query_displayed": QUERY},
+        "filters": filters,
+        "inline_shopping_results": [dict(items[i], position=i + 1) for i in range(min(10, results))],
+        "shopping_results": items,
+        "serpapi_pagination": {"current": 1, "next": "https://serpapi.com/search.json?engine=google_shopping&start=60"},
+    }
+
+
+def restrict(data: Dict) -> Dict:
+    """What SerpApi returns for json_restrictor=shopping_results[].{title,link,price,source,snippet}."""
+    return {"shopping_results": [{key: item[key] for key in RESTRICTED_FIELDS if key in item}
+                                 for item in data.get("shopping_results", [])]}
+
+
+def legacy_parse(body: bytes) -> List[Dict]:
+    """The old path: `response.json()` and a dict for every item before filtering."""
+    data = json.loads(body.decode("utf-8"))
+    results = []
+    for item in data.get("shopping_results", []):
+        product = {
+            "title": item.get("title", "").strip(),
+            "price": item.get("price", "").strip(),
+            "link": item.get("link", ""),
+            "source": item.get("source", ""),
+            "snippet": item.get("snippet") or item.get("description", "")
+        }
+        if product["title"] and product["link"]:
+            results.append(product)
+    return results
+
+
+def stdlib_parse(body: bytes) -> List[Dict]:
+    orjson, serp.orjson = serp.orjson, None
+    try:
+        return parse_response(body)
+    finally:
+        serp.orjson = orjson
+
+
+def time_parser(parse: Callable[[bytes], List[Dict]], body: bytes, repeat: int) -> Dict:
+    parse(body)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(body)
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    return {"median_us": round(median * 1e6, 1), "mb_per_s": round(len(body) / median / 1e6, 1)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--response", help="a recorded google_shopping JSON body")
+    parser.add_argument("--save", help="write the synthetic response to this path and exit")
+    parser.add_argument("--results", type=int, default=60, help="shopping results in the synthetic response")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.response:
+        with open(args.response, "rb") as f:
+            body = f.read()
+    else:
+        body = json.dumps(make_response(args.results)).encode()
+    if args.save:
+        with open(args.save, "wb") as f:
+            f.write(body)
+        return 0
+    restricted = json.dumps(restrict(json.loads(body))).encode()
+
+    assert legacy_parse(body) == parse_response(body) == stdlib_parse(body) == parse_response(restricted)
+    runs = [
+        ("response.json() + dict per item", body, legacy_parse),
+        ("json from bytes + lean extract", body, stdlib_parse),
+    ]
+    if serp.orjson is not None:
+        runs.append(("orjson + lean extract", body, parse_response))
+    runs.append(("restricted body + lean extract", restricted, parse_response))
+    report = [{"path": name, "body_kb": round(len(data) / 1024, 1), **time_parser(parse, data, args.repeat)}
+              for name, data, parse in runs]
+    base = report[0]["median_us"]
+    for row in report:
+        row["speedup"] = round(base / row["median_us"], 2) if row["median_us"] else None
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"{len(parse_response(body))} products per response; orjson {'installed' if serp.orjson else 'not installed'}")
+    print(f"{'path':<34} {'body KB':>8} {'median us':>10} {'MB/s':>7} {'speedup':>8}")
+    for row in report:
+        print(f"{row['path']:<34} {row['body_kb']:>8} {row['median_us']:>10} {row['mb_per_s']:>7} {row['speedup']:>7}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
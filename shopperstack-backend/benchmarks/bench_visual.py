@@ -0,0 +1,101 @@
+"""Benchmark for the visual similarity index (services/vector_index.py).
+
+Times the embedding of one upload, then builds flat, int8, IVF and IVF+int8
+indexes over synthetic clustered vectors and reports build time, single-query
+p50/p95, per-query time when 32 queries share one batch, recall@k against the
+exact flat scan, and the resident size of the index per million vectors.
+
+Run from the backend directory:
+    python -m benchmarks.bench_visual [--sizes 100000 500000] [--queries 200] [--k 10] [--nprobe 8]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.bench_local_caption import make_image
+from services.image_features import FEATURE_DIM, embed_images
+from services.vector_index import VectorIndex
+
+BATCH = 32
+RECORD = b'{"title":"Product","link":"https://shop.example.com/p/0"}'
+
+
+def make_vectors(n: int, dim: int = FEATURE_DIM, clusters: int = 2000, seed: int = 7) -> np.ndarray:
+    """Unit vectors scattered around `clusters` centers, like products of a few thousand looks."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=n)] + rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _percentiles(timings):
+    timings = sorted(timings)
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def bench_embedding(repeat: int = 50) -> None:
+    image = make_image(1024, 3)
+    embed_images([image])
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        embed_images([image])
+        timings.append((time.perf_counter() - start) * 1000)
+    p50, p95 = _percentiles(timings)
+    print(f"embed one 1024px JPEG: p50 {p50:.2f} ms  p95 {p95:.2f} ms  ({FEATURE_DIM} dims)\n")
+
+
+def bench(sizes, n_queries: int, k: int, nprobe: int) -> None:
+    print(f"{'docs':>8} {'mode':>9} {'build s':>8} {'p50 ms':>7} {'p95 ms':>7} {'batch ms/q':>10} "
+          f"{'recall':>7} {'MB/M vec':>8}")
+    for n in sizes:
+        vectors = make_vectors(n)
+        rng = np.random.default_rng(11)
+        queries = vectors[rng.integers(n, size=n_queries)] + 0.1 * rng.standard_normal((n_queries, FEATURE_DIM))
+        queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+        nlist = max(16, int(4 * np.sqrt(n)))
+        modes = {
+            "flat": dict(),
+            "int8": dict(quantize=True),
+            "ivf": dict(nlist=nlist),
+            "ivf-int8": dict(nlist=nlist, quantize=True),
+        }
+        records = [RECORD] * n
+        exact = None
+        for mode, options in modes.items():
+            index = VectorIndex.build(vectors, records, **options)
+            found = index.search(queries, k, nprobe)
+            # Compare record ids, not rows: an IVF index stores rows in cluster order
+            ids = [{int(index.ids[row]) for row, _ in matches} for matches in found]
+            if exact is None:
+                exact = ids
+            recall = statistics.mean(len(a & b) / k for a, b in zip(ids, exact))
+
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query, k, nprobe)
+                timings.append((time.perf_counter() - start) * 1000)
+            p50, p95 = _percentiles(timings)
+            start = time.perf_counter()
+            for offset in range(0, n_queries, BATCH):
+                index.search(queries[offset:offset + BATCH], k, nprobe)
+            batch_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+            # Records are left out: they depend on the catalog, not on the index layout
+            index_bytes = index.nbytes - index.records.nbytes - index.rec_ptr.nbytes
+            print(f"{n:>8} {mode:>9} {index.meta['build_seconds']:>8.2f} {p50:>7.2f} {p95:>7.2f} "
+                  f"{batch_ms:>10.3f} {recall:>7.1%} {index_bytes / n * 1e6 / 2 ** 20:>8.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 500000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+    bench_embedding()
+    bench(args.sizes, args.queries, args.k, args.nprobe)
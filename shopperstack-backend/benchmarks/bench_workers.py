@@ -0,0 +1,76 @@
+"""Throughput scaling of the multi-worker launcher (run.py) on a CPU-bound workload.
+
+Launches `run.py --workers N` for each worker count with every provider key
+unset, so each upload is captioned by the local NumPy captioner and searched in
+the offline catalog: all of it CPU work inside the backend. Every request uses
+a distinct image, so the caption cache never hits, and each launch starts from
+an empty cache file. Reports throughput, p50/p95 latency and the speedup over
+the first worker count.
+
+Image preprocessing runs in a per-worker process pool; it is off by default
+here so the measured scaling is the workers' own (`--preprocess` keeps it on).
+Expect near-linear scaling up to the number of physical cores.
+
+Run from the backend directory:
+    python -m benchmarks.bench_workers [--workers 1 2 4] [--requests 400] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import Dict, List
+
+from benchmarks.bench_local_caption import make_image
+from benchmarks.loadtest import _free_port, drive, launch_backend, summarize
+
+NO_PROVIDERS = {"GEMINI_API_KEY": "", "HF_API_KEY": "", "SERPAPI_KEY": "", "TAVILY_API_KEY": ""}
+
+
+def run_one(workers: int, images: List[bytes], warmup: List[bytes], args) -> Dict:
+    port = _free_port()
+    command = [sys.executable, "run.py", "--workers", str(workers), "--port", str(port),
+               "--log-level", "warning", "--no-access-log"]
+    env = {**NO_PROVIDERS, "PREPROCESS_ENABLED": "true" if args.preprocess else "false"}
+    with launch_backend(port, env, startup_timeout=60.0, command=command) as (url, _):
+        # Every worker imports lazily-built state on its first request; warm them all
+        asyncio.run(drive(url, warmup, len(warmup), min(len(warmup), args.concurrency)))
+        report = summarize(asyncio.run(drive(url, images, len(images), args.concurrency)))
+    report["workers"] = workers
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--image-edge", type=int, default=1024)
+    parser.add_argument("--preprocess", action="store_true", help="keep image preprocessing on")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON")
+    args = parser.parse_args(argv)
+
+    warmup_count = 4 * max(args.workers)
+    # Distinct seeds per run, so no worker count reuses another's captions
+    reports = []
+    for offset, workers in enumerate(args.workers):
+        base = offset * (args.requests + warmup_count)
+        images = [make_image(args.image_edge, base + i) for i in range(args.requests + warmup_count)]
+        reports.append(run_one(workers, images[warmup_count:], images[:warmup_count], args))
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return 0
+    print(f"{args.requests} uploads at concurrency {args.concurrency}, {args.image_edge}px images, "
+          f"{os.cpu_count()} CPUs")
+    base_rps = reports[0]["throughput_rps"] or 1.0
+    print(f"{'workers':>7}  {'req/s':>8}  {'speedup':>7}  {'p50 ms':>8}  {'p95 ms':>8}  errors")
+    for report in reports:
+        print(f"{report['workers']:>7}  {report['throughput_rps']:>8}  "
+              f"{report['throughput_rps'] / base_rps:>6.2f}x  {report['p50_ms']:>8}  {report['p95_ms']:>8}  "
+              f"{report['error_rate']:.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""Offline load test for POST /upload.
+
+Starts the provider stubs from benchmarks/stubs.py, launches the backend in a
+subprocess pointed at them (fresh caption cache, dummy keys), then drives
+/upload at a fixed concurrency and reports throughput, p50/p95/p99 latency,
+errors, mean time per pipeline stage and the backend's peak RSS.
+
+Run from the backend directory:
+    python -m benchmarks.loadtest [--requests 200] [--concurrency 16] [--unique-images 200]
+        [--latency serp=uniform:0.2,1.5] [--error-rate gemini=0.1] [--json]
+
+Regression mode: `--save-baseline bench.json` stores the run; `--baseline
+bench.json` compares against it and exits 1 when throughput, a latency
+percentile or peak RSS is worse by more than `--tolerance` (default 15%).
+Keep the scenario flags identical between the two runs.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import uvicorn
+from prometheus_client.parser import text_string_to_metric_families
+
+from benchmarks.bench_local_caption import make_image
+from benchmarks.stubs import add_stub_arguments, app_from_args, backend_env
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Metric -> True when higher is better. Everything else in a report is informational.
+COMPARED = {"throughput_rps": True, "p50_ms": False, "p95_ms": False, "p99_ms": False, "peak_rss_mb": False}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve_stubs(app, port: int):
+    """Run the stub app with uvicorn on a background thread."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"stub server failed to start on port {port}")
+        time.sleep(0.02)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+@contextlib.contextmanager
+def launch_backend(port: int, env_overrides: Dict[str, str], startup_timeout: float = 30.0,
+                   command: Optional[List[str]] = None):
+    """Start `uvicorn main:app` (or `command`, which must serve on `port`) in a subprocess
+    and wait until /health answers.
+    """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = {
+            **os.environ,
+            **env_overrides,
+            "CAPTION_CACHE_PATH": os.path.join(cache_dir, "captions.sqlite3"),
+            # Injected failures make every fallback log a warning; keep the report readable
+            "LOG_LEVEL": os.getenv("LOADTEST_LOG_LEVEL", "ERROR"),
+        }
+        command = command or [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                              "--port", str(port), "--log-level", "warning", "--no-access-log"]
+        proc = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+        try:
+            url = f"http://127.0.0.1:{port}"
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"backend exited during startup (code {proc.returncode})")
+                try:
+                    if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("backend did not become healthy in time")
+                time.sleep(0.1)
+            yield url, proc
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+
+def peak_rss_mb(proc: subprocess.Popen) -> Optional[float]:
+    """High-water RSS of a running child (Linux), else of all reaped children."""
+    try:
+        with open(f"/proc/{proc.pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if proc.poll() is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def drive(url: str, images: List[bytes], total: int, concurrency: int,
+                deadline_ms: Optional[int] = None) -> Dict:
+    """POST `total` uploads (cycling through `images`) with at most `concurrency` in flight."""
+    headers = {"X-Deadline-Ms": str(deadline_ms)} if deadline_ms else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    partial = 0
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120.0) as client:
+        async def upload(i: int):
+            nonlocal partial
+            files = {"file": (f"item{i}.jpg", images[i % len(images)], "image/jpeg")}
+            start = time.perf_counter()
+            try:
+                response = await client.post("/upload", files=files, headers=headers)
+                status = str(response.status_code)
+                is_partial = response.status_code == 200 and response.json().get("partial", False)
+            except httpx.HTTPError as e:
+                status, is_partial = type(e).__name__, False
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            partial += is_partial
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(i: int):
+            async with semaphore:
+                await upload(i)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(bounded(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {"latencies": latencies, "statuses": statuses, "partial": partial, "elapsed": elapsed}
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(run: Dict) -> Dict:
+    ordered = sorted(run["latencies"])
+    total = len(ordered)
+    ok = run["statuses"].get("200", 0)
+    return {
+        "requests": total,
+        "ok": ok,
+        "error_rate": round(1 - ok / total, 4) if total else 0.0,
+        "partial": run["partial"],
+        "statuses": run["statuses"],
+        "elapsed_s": round(run["elapsed"], 3),
+        "throughput_rps": round(total / run["elapsed"], 2) if run["elapsed"] else 0.0,
+        "p50_ms": round(_percentile(ordered, 50) * 1000, 1),
+        "p95_ms": round(_percentile(ordered, 95) * 1000, 1),
+        "p99_ms": round(_percentile(ordered, 99) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+    }
+
+
+def stage_means(metrics_text: str) -> Dict[str, float]:
+    """Mean milliseconds per upload stage, from the backend's /metrics histograms."""
+    sums, counts = {}, {}
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name != "shopperstack_stage_duration_seconds":
+            continue
+        for sample in family.samples:
+            stage = sample.labels.get("stage")
+            if sample.name.endswith("_sum"):
+                sums[stage] = sample.value
+            elif sample.name.endswith("_count"):
+                counts[stage] = sample.value
+    return {stage: round(sums[stage] / counts[stage] * 1000, 1) for stage in sorted(counts) if counts[stage]}
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions of `result` against `baseline`, as human-readable lines."""
+    regressions = []
+    for metric, higher_is_better in COMPARED.items():
+        new, old = result.get(metric), baseline.get(metric)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        if worse > tolerance:
+            regressions.append(f"{metric}: {old} -> {new} ({change:+.1%}, tolerance {tolerance:.0%})")
+    if result.get("error_rate", 0) > baseline.get("error_rate", 0) + tolerance / 10:
+        regressions.append(f"error_rate: {baseline.get('error_rate')} -> {result['error_rate']}")
+    return regressions
+
+
+def scenario_of(args) -> Dict:
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "unique_images": args.unique_images,
+        "image_edge": args.image_edge,
+        "deadline_ms": args.deadline_ms,
+        "latency": sorted(args.latency or []),
+        "error_rate": sorted(args.error_rate or []),
+        "serp_results": args.serp_results,
+        "seed": args.seed,
+    }
+
+
+def run(args) -> Dict:
+    images = [make_image(args.image_edge, seed) for seed in range(args.unique_images + args.warmup)]
+    measured, warmup_images = images[:args.unique_images], images[args.unique_images:]
+    stub_app = app_from_args(args)
+
+    with serve_stubs(stub_app, _free_port()) as stub_url:
+        with launch_backend(_free_port(), backend_env(stub_url)) as (url, proc):
+            # Warm-up uses its own images so it doesn't pre-fill the caption cache
+            if args.warmup:
+                asyncio.run(drive(url, warmup_images, args.warmup, min(args.concurrency, args.warmup)))
+            outcome = asyncio.run(drive(url, measured, args.requests, args.concurrency, args.deadline_ms))
+            report = summarize(outcome)
+            report["stages_ms"] = stage_means(httpx.get(f"{url}/metrics", timeout=5.0).text)
+            report["peak_rss_mb"] = peak_rss_mb(proc)
+        report["providers"] = {name: stub.stats() for name, stub in stub_app.state.stubs.items()}
+
+    report["scenario"] = scenario_of(args)
+    return report
+
+
+def print_report(report: Dict) -> None:
+    print(f"requests      {report['requests']} ({report['ok']} ok, {report['partial']} partial, "
+          f"statuses {report['statuses']})")
+    print(f"throughput    {report['throughput_rps']} req/s over {report['elapsed_s']} s")
+    print(f"latency (ms)  p50 {report['p50_ms']}  p95 {report['p95_ms']}  p99 {report['p99_ms']}  "
+          f"max {report['max_ms']}")
+    print(f"peak RSS      {report['peak_rss_mb']} MB")
+    print("stages (ms)   " + "  ".join(f"{stage} {ms}" for stage, ms in report["stages_ms"].items()))
+    print("provider calls " + "  ".join(f"{name} {s['calls']}/{s['errors']} err"
+                                        for name, s in report["providers"].items()))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--unique-images", type=int, default=None,
+                        help="distinct images to cycle through (default: one per request, i.e. no cache hits)")
+    parser.add_argument("--image-edge", type=int, default=1024)
+    parser.add_argument("--deadline-ms", type=int, default=None, help="send X-Deadline-Ms with every upload")
+    parser.add_argument("--warmup", type=int, default=4)
+    add_stub_arguments(parser)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--baseline", help="compare against a report saved with --save-baseline")
+    parser.add_argument("--save-baseline", help="write this run's report to a file")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args(argv)
+    args.unique_images = args.unique_images or args.requests
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("scenario") != report["scenario"]:
+            print("warning: baseline was recorded with a different scenario", file=sys.stderr)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"no regressions against {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Cold-start report: what `import main` costs and how soon a fresh backend answers.
+
+Imports the app in a clean interpreter under `python -X importtime` and reports
+the total import time, the cumulative time of the heaviest packages and whether
+any provider SDK (Gemini, Tavily) was imported; they should only load on first
+use or in the background warm-up. Then launches `uvicorn main:app` with every
+provider key set (no provider is called) and measures the time from spawning
+the process to the first 200 from /health, and until the provider warm-up has
+finished.
+
+Run from the backend directory:
+    python -m benchmarks.startup [--runs 3] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.loadtest import BACKEND_DIR, _free_port
+from benchmarks.stubs import backend_env
+
+# Imported lazily by the app; any of them in the import profile is a regression
+PROVIDER_SDKS = ("google.generativeai", "tavily")
+# Reported individually when they show up in the profile
+HEAVY_MODULES = ("fastapi", "uvicorn", "pydantic", "numpy", "PIL.Image", "httpx", "requests",
+                 "prometheus_client", *PROVIDER_SDKS)
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """Cumulative import time per module in ms, from `-X importtime` output."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # the header row
+        cumulative[parts[2].strip()] = int(parts[1]) / 1000.0
+    return cumulative
+
+
+def import_profile(env_overrides: Optional[Dict[str, str]] = None) -> Dict:
+    """Import `main` in a fresh interpreter and summarize where the time went."""
+    env = {**os.environ, **(env_overrides or {})}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    cumulative = parse_importtime(result.stderr)
+    return {
+        "import_main_ms": round(cumulative.get("main", 0.0), 1),
+        "modules_ms": {name: round(cumulative[name], 1) for name in HEAVY_MODULES if name in cumulative},
+        "provider_sdks_imported": [name for name in PROVIDER_SDKS if name in cumulative],
+    }
+
+
+def time_to_first_ok(env_overrides: Dict[str, str], timeout: float = 60.0) -> Dict:
+    """Spawn the backend and time its first 200 from /health and the end of provider warm-up."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = {**os.environ, **env_overrides, "LOG_LEVEL": "ERROR",
+               "CAPTION_CACHE_PATH": os.path.join(cache_dir, "captions.sqlite3")}
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=BACKEND_DIR, env=env,
+        )
+        first_ok = warm = None
+        try:
+            deadline = started + timeout
+            while warm is None and time.perf_counter() < deadline:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"backend exited during startup (code {proc.returncode})")
+                try:
+                    response = httpx.get(url, timeout=1.0)
+                except httpx.HTTPError:
+                    time.sleep(0.02)
+                    continue
+                if response.status_code == 200:
+                    if first_ok is None:
+                        first_ok = time.perf_counter() - started
+                    if response.json().get("provider_warmup_seconds") is not None:
+                        warm = time.perf_counter() - started
+                        break
+                time.sleep(0.02)
+            if first_ok is None:
+                raise RuntimeError("backend did not answer /health in time")
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+    return {
+        "first_ok_ms": round(first_ok * 1000, 1),
+        "providers_warm_ms": round(warm * 1000, 1) if warm is not None else None,
+    }
+
+
+def report(runs: int = 3) -> Dict:
+    # Keys make the app take its provider paths; nothing is called during startup
+    env = backend_env("http://127.0.0.1:9")
+    profile = import_profile(env)
+    launches: List[Dict] = [time_to_first_ok(env) for _ in range(runs)]
+    warm = [launch["providers_warm_ms"] for launch in launches if launch["providers_warm_ms"] is not None]
+    return {
+        **profile,
+        "runs": runs,
+        "first_ok_ms": round(statistics.median(launch["first_ok_ms"] for launch in launches), 1),
+        "providers_warm_ms": round(statistics.median(warm), 1) if warm else None,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="backend launches; medians are reported")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    result = report(args.runs)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    print(f"import main: {result['import_main_ms']} ms")
+    for name, ms in sorted(result["modules_ms"].items(), key=lambda item: -item[1]):
+        print(f"  {name:<22} {ms:>8} ms")
+    print(f"provider SDKs imported with the app: {', '.join(result['provider_sdks_imported']) or 'none'}")
+    print(f"first 200 from /health: {result['first_ok_ms']} ms (median of {result['runs']})")
+    print(f"provider clients warm:  {result['providers_warm_ms']} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
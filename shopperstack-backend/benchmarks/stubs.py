@@ -0,0 +1,234 @@
+"""Local stand-ins for the provider APIs the backend calls, for offline load tests.
+
+One FastAPI app serves all four providers under their own prefixes:
+
+    POST /v1beta/models/{model}:generateContent   Gemini (REST transport)
+    POST /hf/models/{model_id}                     Hugging Face inference API
+    GET  /serpapi/search                           SerpApi Google Shopping
+    POST /tavily/search                            Tavily
+
+Each provider sleeps for a latency drawn from its own distribution and fails
+with a 503 at its own error rate. Point the backend at them with
+GEMINI_API_ENDPOINT, HF_INFERENCE_URL, SERPAPI_URL and TAVILY_API_URL (see
+`backend_env`). `benchmarks/loadtest.py` starts them for you; to run them alone:
+
+    python -m benchmarks.stubs [--port 8900] [--latency gemini=lognormal:0.4,0.3] [--error-rate serp=0.05]
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import math
+import random
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+PROVIDERS = ("gemini", "huggingface", "serp", "tavily")
+
+# Rough medians seen against the real APIs from a dev laptop
+DEFAULT_LATENCY = {
+    "gemini": "lognormal:0.45,0.35",
+    "huggingface": "lognormal:0.9,0.5",
+    "serp": "lognormal:0.8,0.4",
+    "tavily": "lognormal:0.6,0.4",
+}
+
+COLORS = ["black", "white", "navy", "red", "olive", "beige", "maroon", "grey"]
+MATERIALS = ["cotton", "linen", "denim", "silk", "wool"]
+GARMENTS = ["button-up shirt", "t-shirt", "kurta", "blazer", "dress", "jeans", "hoodie"]
+STORES = ["myntra.com", "ajio.com", "amazon.in", "flipkart.com", "example.com"]
+
+
+class LatencyProfile:
+    """A latency distribution parsed from a spec string (all values in seconds).
+
+    `fixed:0.2` (or just `0.2`), `uniform:0.1,0.5` or `lognormal:median,sigma`.
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        if not args:
+            kind, args = "fixed", kind
+        try:
+            values = [float(v) for v in args.split(",")]
+        except ValueError:
+            raise ValueError(f"bad latency spec {spec!r}") from None
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}.get(kind)
+        if expected is None or len(values) != expected or min(values) < 0:
+            raise ValueError(f"bad latency spec {spec!r}")
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.values[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.values)
+        median, sigma = self.values
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+
+class ProviderStub:
+    def __init__(self, name: str, latency: str, error_rate: float = 0.0):
+        self.name = name
+        self.latency = LatencyProfile(latency)
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+
+    async def respond(self, rng: random.Random, payload) -> JSONResponse:
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample(rng))
+        if rng.random() < self.error_rate:
+            self.errors += 1
+            # Google-style error body; the Gemini client insists on it, the others only read the status
+            error = {"code": 503, "message": f"{self.name} stub: injected failure", "status": "UNAVAILABLE"}
+            return JSONResponse({"error": error}, status_code=503)
+        return JSONResponse(payload)
+
+    def stats(self) -> Dict:
+        return {"latency": self.latency.spec, "error_rate": self.error_rate, "calls": self.calls, "errors": self.errors}
+
+
+def _pick(options, seed: bytes, salt: str) -> str:
+    digest = hashlib.blake2b(seed, digest_size=4, person=salt.encode()[:16]).digest()
+    return options[int.from_bytes(digest, "big") % len(options)]
+
+
+def _caption_for(seed: bytes) -> str:
+    """A stable caption per image, with a short tag so distinct images give distinct queries."""
+    tag = hashlib.blake2b(seed, digest_size=3).hexdigest()
+    return (f"A {_pick(COLORS, seed, 'color')} {_pick(MATERIALS, seed, 'material')} "
+            f"{_pick(GARMENTS, seed, 'garment')} style {tag}")
+
+
+def _products(query: str, count: int, source: str, offset: int = 0):
+    words = query.split() or ["item"]
+    items = []
+    for i in range(offset, offset + count):
+        store = STORES[i % len(STORES)]
+        title = f"{' '.join(words[:6]).title()} - Variant {i + 1}"
+        items.append({
+            "title": title,
+            "link": f"https://www.{store}/p/{hashlib.blake2b(f'{query}|{i}'.encode(), digest_size=5).hexdigest()}",
+            "price": f"${10 + (i * 7) % 90}.99",
+            "source": store,
+            "snippet": f"{title}. {source} stub result for {query!r}.",
+        })
+    return items
+
+
+def _gemini_payload(body: Dict) -> Dict:
+    parts = [part for content in body.get("contents", []) for part in content.get("parts", [])]
+    image = next((part.get("inline_data") or part.get("inlineData") for part in parts
+                  if part.get("inline_data") or part.get("inlineData")), None)
+    if image:
+        text = _caption_for(base64.b64decode(image.get("data", "")))
+    else:
+        prompt = " ".join(part.get("text", "") for part in parts)
+        # The refine prompt quotes the caption on a "Raw caption:" line; echo a tidied version back
+        caption = next((line.split(":", 1)[1].strip().strip('"') for line in prompt.splitlines()
+                        if line.strip().startswith("Raw caption:")), prompt[-80:])
+        text = f"{caption.lower().removeprefix('a ').strip()} online shopping"
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 1, "totalTokenCount": 2},
+    }
+
+
+def create_app(latency: Optional[Dict[str, str]] = None, error_rate: Optional[Dict[str, float]] = None,
+               serp_results: int = 20, tavily_results: int = 5, seed: int = 7) -> FastAPI:
+    latency = {**DEFAULT_LATENCY, **(latency or {})}
+    error_rate = error_rate or {}
+    stubs = {name: ProviderStub(name, latency[name], error_rate.get(name, 0.0)) for name in PROVIDERS}
+    rng = random.Random(seed)
+
+    app = FastAPI(title="ShopperStack provider stubs")
+    app.state.stubs = stubs
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def gemini_generate(model: str, request: Request):
+        return await stubs["gemini"].respond(rng, _gemini_payload(await request.json()))
+
+    @app.post("/hf/models/{model_id:path}")
+    async def hf_inference(model_id: str, request: Request):
+        image = await request.body()
+        return await stubs["huggingface"].respond(rng, [{"generated_text": _caption_for(image).lower()}])
+
+    @app.get("/serpapi/search")
+    async def serp_search(q: str = "", start: int = 0):
+        return await stubs["serp"].respond(rng, {"shopping_results": _products(q, serp_results, "SerpApi", start)})
+
+    @app.post("/tavily/search")
+    async def tavily_search(request: Request):
+        query = (await request.json()).get("query", "")
+        return await stubs["tavily"].respond(rng, {"query": query, "results": _products(query, tavily_results, "Tavily")})
+
+    @app.get("/stats")
+    async def stats():
+        return {name: stub.stats() for name, stub in stubs.items()}
+
+    return app
+
+
+def backend_env(base_url: str) -> Dict[str, str]:
+    """Environment that points the backend at stubs served from `base_url`."""
+    base_url = base_url.rstrip("/")
+    return {
+        "GEMINI_API_KEY": "stub-key",
+        "HF_API_KEY": "stub-key",
+        "SERPAPI_KEY": "stub-key",
+        "TAVILY_API_KEY": "tvly-stub-key",
+        "GEMINI_API_ENDPOINT": base_url,
+        "HF_INFERENCE_URL": f"{base_url}/hf",
+        "SERPAPI_URL": f"{base_url}/serpapi/search",
+        "TAVILY_API_URL": f"{base_url}/tavily",
+        # The stubs have no quota; measure the pipeline, not the outbound rate limiters
+        "RATE_LIMIT_GEMINI_PER_MINUTE": "0",
+        "RATE_LIMIT_HUGGINGFACE_PER_MINUTE": "0",
+        "RATE_LIMIT_SERP_PER_MINUTE": "0",
+        "RATE_LIMIT_TAVILY_PER_MINUTE": "0",
+    }
+
+
+def parse_assignments(pairs, convert=str) -> Dict:
+    """Parse repeated `provider=value` options."""
+    parsed = {}
+    for pair in pairs or []:
+        name, sep, value = pair.partition("=")
+        if not sep or name not in PROVIDERS:
+            raise argparse.ArgumentTypeError(f"expected one of {', '.join(PROVIDERS)}=VALUE, got {pair!r}")
+        parsed[name] = convert(value)
+    return parsed
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", action="append", metavar="PROVIDER=SPEC",
+                        help="fixed:S | uniform:A,B | lognormal:MEDIAN,SIGMA (repeatable)")
+    parser.add_argument("--error-rate", action="append", metavar="PROVIDER=RATE",
+                        help="share of calls answered with a 503 (repeatable)")
+    parser.add_argument("--serp-results", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+
+
+def app_from_args(args) -> FastAPI:
+    return create_app(
+        latency=parse_assignments(args.latency),
+        error_rate=parse_assignments(args.error_rate, float),
+        serp_results=args.serp_results,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(app_from_args(args), host=args.host, port=args.port, log_level="warning")
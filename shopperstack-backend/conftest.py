@@ -0,0 +1,65 @@
+import asyncio
+import inspect
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+import main
+from utils import config
+
+# Minimal PNG header; the stubs never decode it
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+DEFAULT_TAVILY = [{"title": "Black Button-Up Shirt", "link": "https://example.com/tavily"}]
+DEFAULT_SERP = [{"title": "Black Cotton Long Sleeve Shirt", "link": "https://example.com/serp"}]
+
+
+def _stage(answer, delay):
+    """A provider coroutine giving `answer`: a value, or a (sync or async) function of the input."""
+    async def call(value, *args, **kwargs):
+        if delay:
+            await asyncio.sleep(delay)
+        result = answer(value) if callable(answer) else answer
+        return await result if inspect.isawaitable(result) else result
+    return call
+
+
+def stub_providers(services, caption="A black button-up shirt", refine="black button-up shirt",
+                   tavily=DEFAULT_TAVILY, serp=DEFAULT_SERP, delays=None):
+    """Replace the provider calls on `services` with local stubs (no network, no keys).
+
+    Each of `caption` (image bytes in), `refine` (caption in), `tavily` and `serp`
+    (query in) is the answer itself or a function computing it; `delays` maps those
+    names to seconds each call sleeps first.
+    """
+    delays = delays or {}
+    services.gemini.caption_image_async = _stage(caption, delays.get("caption", 0.0))
+    services.gemini.refine_query_async = _stage(refine, delays.get("refine", 0.0))
+    services.tavily_search = _stage(tavily, delays.get("tavily", 0.0))
+    services.serp.search_products_async = _stage(serp, delays.get("serp", 0.0))
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """Open the app in-process with stubbed providers.
+
+        async with backend(caption=..., refine=..., tavily=..., serp=..., delays=...) as (client, services):
+            await client.post("/upload", files=...)
+
+    The caption cache lives in `tmp_path` and preprocessing is off, since the stub
+    images aren't decodable.
+    """
+    monkeypatch.setattr(config, "CAPTION_CACHE_PATH", str(tmp_path / "captions.sqlite3"))
+    monkeypatch.setattr(config, "PREPROCESS_ENABLED", False)
+
+    @asynccontextmanager
+    async def open_backend(**stubs):
+        async with main.lifespan(main.app):
+            services = main.app.state.services
+            stub_providers(services, **stubs)
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                yield client, services
+
+    return open_backend
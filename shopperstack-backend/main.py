@@ -1,31 +1,74 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST
+from starlette.datastructures import Headers, MutableHeaders
 import uvicorn
 import os
 import asyncio
+import json
+import logging
+import math
+import time
+from contextlib import aclosing, asynccontextmanager
+from datetime import datetime, timezone
 from typing import Dict, List
 
 # Service helpers
-from utils.encode_image import encode_uploaded_file
-from services.gemini import caption_image_from_base64, refine_query
-from services.tavily import search as tavily_search_service
-from services.serp import SerpService
+from services.gemini import GENERIC_CAPTION, _local_image_caption_from_bytes
+from services.huggingface_blip import model_cooloff
+from services.container import ServiceContainer
+from services.preprocess import preprocess_image_async
+from services.ranking import canonicalize_url, rank_results
+from services.search_registry import SearchProvider
+from agents.price_compare_agent import PriceCompareAgent
+from utils.cache import normalize_text_key
+from utils.deadline import Deadline
+from utils.encode_image import ImageUploadError, read_image_upload
+from utils.log import configure_logging, new_request_id, request_id_var, shutdown_logging
+from utils.metrics import (
+    REQUEST_SECONDS,
+    REQUESTS,
+    REQUESTS_IN_FLIGHT,
+    provider_error,
+    provider_timer,
+    register_services,
+    render as render_metrics,
+    stage_timer,
+    unregister,
+)
+from utils import config
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger("shopperstack")
 
 # Get API keys from environment
 HF_API_KEY = os.getenv("HF_API_KEY")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build shared provider clients once at startup and close them on shutdown."""
+    configure_logging()
+    services = ServiceContainer()
+    app.state.services = services
+    services.start()
+    collector = register_services(services)
+    try:
+        yield
+    finally:
+        unregister(collector)
+        await services.aclose()
+        shutdown_logging()
+
+price_compare_agent = PriceCompareAgent()
+
 # Create FastAPI app instance
 app = FastAPI(
     title="ShopperStack Backend",
     description="AI-powered image-to-product matching backend",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -37,30 +80,345 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# instantiate SerpService directly (avoid agent import issues)
-serp_service = SerpService()
+class UploadSizeLimit:
+    """Refuse upload bodies over the limit while they stream in.
+
+    Starlette spools the whole multipart body before the handler runs, so the
+    limit is enforced here: a declared Content-Length over it is refused before
+    anything is read, and a chunked body is cut off with 413 as soon as it passes it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith("/upload"):
+            return await self.app(scope, receive, send)
+        # A batch may carry up to BATCH_MAX_FILES images, each within the per-image limit
+        files = config.BATCH_MAX_FILES if scope["path"] == "/upload/batch" else 1
+        limit = (config.MAX_UPLOAD_BYTES + config.UPLOAD_MULTIPART_OVERHEAD) * max(1, files)
+        detail = f"Image exceeds the {config.MAX_UPLOAD_BYTES} byte upload limit"
+
+        try:
+            declared = int(Headers(scope=scope).get("content-length") or 0)
+        except ValueError:
+            declared = 0
+        if declared > limit:
+            return await JSONResponse(status_code=413, content={"detail": detail})(scope, receive, send)
+
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing, so this becomes the response
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, receive_limited, send)
+
+app.add_middleware(UploadSizeLimit)
+
+class RequestTracking:
+    """Thread a request ID through every log record and count/time the request.
+    Clients may pass their own X-Request-ID; it is echoed back on the response.
+
+    Plain ASGI rather than `@app.middleware`, which returns once the headers are
+    sent: a streamed response is timed (and stays in flight) until its last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_id = new_request_id(Headers(scope=scope).get("x-request-id"))
+        request_id_var.set(request_id)
+        method, path = scope["method"], scope["path"]
+        # Label by route template so unknown paths can't blow up label cardinality
+        endpoint = path if path in _ROUTE_PATHS else "other"
+        REQUESTS_IN_FLIGHT.labels(endpoint).inc()
+        started = time.perf_counter()
+        status = 500
+
+        async def send_tracked(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Request-ID", request_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_tracked)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.labels(endpoint).dec()
+            REQUESTS.labels(endpoint, method, str(status)).inc()
+            REQUEST_SECONDS.labels(endpoint).observe(elapsed)
+            logger.info("%s %s -> %d", method, path, status, extra={"ms": round(elapsed * 1000, 1)})
+
+app.add_middleware(RequestTracking)
+
+def _as_list(results) -> List:
+    """Normalize a provider response to a list of result dicts."""
+    if results is None:
+        return []
+    if not isinstance(results, list):
+        return [results]
+    return results
+
+async def _search_provider(provider: SearchProvider, query: str, services: ServiceContainer,
+                           deadline: Deadline = None) -> List:
+    """Run one provider through the search cache; failures degrade to an empty result list.
+    A provider still running after its own timeout, or when the search budget of the
+    `deadline` runs out, is cut off.
+    """
+
+    name = provider.name
+    key = (name, normalize_text_key(query))
+
+    async def call_provider():
+        return _as_list(await provider.search(query))
+
+    async def load():
+        # Concurrent identical searches share one provider call
+        return await services.search_flight.do(key, call_provider)
+
+    budgets = [provider.timeout, deadline.budget_for("search") if deadline else None]
+    timeout = min((b for b in budgets if b is not None), default=None)
+    try:
+        # Empty responses usually mean the provider failed; don't cache them
+        with provider_timer(name):
+            return await asyncio.wait_for(services.search_cache.get_or_load(key, load, cacheable=bool), timeout)
+    except asyncio.TimeoutError:
+        # The shared provider call keeps running and still fills the cache for later requests
+        logger.warning("%s search timed out", name)
+        provider_error(name, "timeout")
+        if deadline:
+            deadline.degrade(f"search:{name}")
+        return []
+    except Exception as e:
+        logger.warning("%s search failed: %s", name, e)
+        provider_error(name)
+        return []
 
-async def search_products(query: str):
-    """Run tavily search and serp search in parallel and merge results."""
-    loop = asyncio.get_event_loop()
-    tavily_future = loop.run_in_executor(None, tavily_search_service, query)
-    serp_future = loop.run_in_executor(None, serp_service.search_products, query)
+def fan_out_search(query: str, services: ServiceContainer, deadline: Deadline = None):
+    """`(provider, results)` from every enabled search provider, in completion order.
+    In first-k mode (SEARCH_FIRST_K) it ends once enough relevant results are in.
+    """
+    return services.search_providers.fan_out(
+        query,
+        lambda provider, q: _search_provider(provider, q, services, deadline),
+        first_k=config.SEARCH_FIRST_K,
+        min_score=config.SEARCH_FIRST_K_MIN_SCORE,
+    )
+
+async def search_candidates(query: str, services: ServiceContainer, deadline: Deadline = None) -> List:
+    """Run every search provider concurrently; returns the unranked candidate list."""
+    candidates = []
+    with stage_timer("search"):
+        async with aclosing(fan_out_search(query, services, deadline)) as provider_results:
+            async for _, results in provider_results:
+                candidates.extend(results)
+    return candidates
+
+async def search_products(query: str, services: ServiceContainer):
+    """Search every registered provider concurrently and merge the results."""
+    return merge_results(query, await search_candidates(query, services), services=services)
+
+def merge_results(query: str, results: List, seen_urls=None, services: ServiceContainer = None) -> List:
+    """Dedupe, score against the refined query (scaled by each provider's weight)
+    and keep the configured top-k.
+    """
+    return rank_results(
+        query,
+        results,
+        top_k=config.RANK_TOP_K,
+        min_score=config.RANK_MIN_SCORE,
+        duplicate_threshold=config.RANK_DUPLICATE_THRESHOLD,
+        seen_urls=seen_urls,
+        weights=services.search_providers.weights() if services else None
+    )
+
+async def visual_stage(image_bytes, services: ServiceContainer) -> List:
+    """Products that look like the upload, from the local visual index (empty without one).
+    Needs only the image, so it runs alongside captioning.
+    """
+    if not services.visual.loaded:
+        return []
+    with stage_timer("visual"):
+        try:
+            return await asyncio.to_thread(services.visual.search, image_bytes)
+        except Exception as e:
+            logger.warning("Visual search failed: %s", e)
+            return []
+
+async def collect_visual(task: asyncio.Future, deadline: Deadline = None) -> List:
+    """Wait for a running visual search, but no longer than the request deadline allows."""
+    try:
+        return await asyncio.wait_for(task, deadline.remaining() if deadline and deadline.seconds else None)
+    except asyncio.TimeoutError:
+        logger.warning("Visual search missed the deadline")
+        deadline.degrade("visual")
+        return []
+
+def merge_visual(results: List, matches: List) -> List:
+    """Fold visual matches in alongside the ranked text results.
+    Text results that were also matched visually get their `visual_score`; the
+    remaining matches are returned as the similar items, best first.
+    """
+    by_url = {canonicalize_url(item.get("link", "")): item for item in results}
+    similar = []
+    for match in matches:
+        existing = by_url.get(canonicalize_url(match.get("link", "")))
+        if existing is not None:
+            existing["visual_score"] = match["visual_score"]
+        else:
+            similar.append(match)
+    return similar
+
+async def preprocess_stage(image_bytes, services: ServiceContainer, content_type: str = None):
+    """Rotate, strip, shrink and re-encode an upload in the preprocessing pool.
+    Returns (image bytes, content type, stats); the result is what every caption backend sees.
+    """
+    if not config.PREPROCESS_ENABLED:
+        return image_bytes, content_type, {"enabled": False}
+    with stage_timer("preprocess"):
+        processed, processed_type, stats = await preprocess_image_async(
+            image_bytes,
+            content_type,
+            executor=services.image_pool,
+            max_edge=config.PREPROCESS_MAX_EDGE,
+            output_format=config.PREPROCESS_FORMAT,
+            quality=config.PREPROCESS_QUALITY
+        )
+    logger.debug("Preprocessed image: %s -> %s bytes (%s saved)",
+                 stats["original_bytes"], stats["processed_bytes"], stats["bytes_saved"])
+    return processed, processed_type, stats
+
+async def caption_stage(image_bytes, services: ServiceContainer, content_type: str = None, deadline: Deadline = None):
+    """Caption an image (bytes or a memoryview), serving repeat uploads from the
+    content-addressed cache. The upload is preprocessed only on a cache miss.
+    Returns (caption, preprocessing stats).
+    With a `deadline`, a vision call that overruns the caption budget is abandoned
+    for the local captioner.
+    """
+    with stage_timer("caption"):
+        if deadline is None:
+            return await _caption(image_bytes, services, content_type)
+        try:
+            return await asyncio.wait_for(
+                _caption(image_bytes, services, content_type), deadline.budget_for("caption")
+            )
+        except asyncio.TimeoutError:
+            # The shared vision call keeps running and still fills the cache for later uploads
+            logger.warning("Caption stage missed its deadline; using the local captioner")
+            deadline.degrade("caption")
+            caption = await asyncio.to_thread(_local_image_caption_from_bytes, image_bytes)
+            return caption, {"bytes_saved": 0, "timed_out": True}
+
+async def _caption(image_bytes, services: ServiceContainer, content_type: str = None):
+    caption_cache = services.caption_cache
+    # Keyed by the original upload so cache hits skip preprocessing too
+    image_key = caption_cache.key_for(image_bytes)
+
+    raw_caption = await asyncio.to_thread(caption_cache.get, image_key)
+    if raw_caption is not None:
+        logger.debug("Caption cache hit: %s", raw_caption)
+        return raw_caption, {"cached": True, "bytes_saved": 0}
+
+    async def generate():
+        processed, processed_type, stats = await preprocess_stage(image_bytes, services, content_type)
+        logger.debug("Calling Gemini Vision API for image caption")
+        caption = await services.gemini.caption_image_async(processed, processed_type)
+        logger.info("Caption generated: %s", caption)
+        # Don't pin the generic fallback; retry the vision call next time
+        if caption and caption != GENERIC_CAPTION:
+            await asyncio.to_thread(caption_cache.set, image_key, caption)
+        return caption, stats
+
+    try:
+        # Concurrent uploads of the same image share one vision call
+        return await services.caption_flight.do(image_key, generate)
+    except Exception as e:
+        logger.warning("Caption stage failed: %s", e)
+        return GENERIC_CAPTION, {"bytes_saved": 0, "error": str(e)}
+
+async def refine_stage(raw_caption: str, services: ServiceContainer, deadline: Deadline = None) -> str:
+    """Refine a caption into a search query, falling back to the caption itself.
+    Results are cached by normalized caption with stale-while-revalidate.
+    With a `deadline`, the raw caption is used if refinement would overrun its budget.
+    """
+    logger.debug("Calling Gemini API for query refinement")
+    try:
+        key = normalize_text_key(raw_caption)
+        with stage_timer("refine"):
+            refined_query = await asyncio.wait_for(
+                services.refine_cache.get_or_load(
+                    key,
+                    lambda: services.refine_flight.do(key, lambda: services.gemini.refine_query_async(raw_caption)),
+                    cacheable=bool
+                ),
+                deadline.budget_for("refine") if deadline else None
+            )
+        logger.info("Refined query: %s", refined_query)
+        return refined_query
+    except asyncio.TimeoutError:
+        logger.warning("Refinement missed its deadline; searching with the raw caption")
+        if deadline is not None:
+            deadline.degrade("refine")
+        return raw_caption
+    except Exception as e:
+        logger.warning("Refinement failed: %s", e)
+        return raw_caption
 
-    tavily_results, serp_results = await asyncio.gather(tavily_future, serp_future)
+def _processing_info(preprocessing: Dict = None, deadline: Deadline = None) -> Dict:
+    info = {
+        "apis_used": {
+            "blip": bool(HF_API_KEY),
+            "gemini": bool(GEMINI_API_KEY),
+            "tavily": bool(TAVILY_API_KEY)
+        },
+        "preprocessing": preprocessing or {}
+    }
+    if deadline is not None:
+        info["deadline"] = deadline.info()
+    return info
 
-    # Normalize results to lists
-    if tavily_results is None:
-        tavily_results = []
-    elif not isinstance(tavily_results, list):
-        tavily_results = [tavily_results]
+def _request_deadline(request: Request) -> Deadline:
+    """Latency budget for one upload: the X-Deadline-Ms header if valid, else UPLOAD_DEADLINE_SECONDS."""
+    seconds = config.UPLOAD_DEADLINE_SECONDS
+    header = request.headers.get("x-deadline-ms")
+    if header:
+        try:
+            requested = float(header)
+        except ValueError:
+            requested = math.nan
+        # 0, negative, nan and inf would otherwise mean "no deadline" and bypass the maximum
+        if math.isfinite(requested) and requested > 0:
+            seconds = min(requested / 1000, config.UPLOAD_DEADLINE_MAX_SECONDS)
+        else:
+            logger.warning("Ignoring invalid X-Deadline-Ms header: %r", header)
+    return Deadline(seconds if seconds > 0 else None, config.DEADLINE_SHARES)
 
-    if serp_results is None:
-        serp_results = []
-    elif not isinstance(serp_results, list):
-        serp_results = [serp_results]
+def _validate_image_upload(file: UploadFile) -> None:
+    if not file.content_type or not file.content_type.startswith('image/'):
+        raise HTTPException(
+            status_code=400, 
+            detail="File must be an image (JPEG, PNG, etc.)"
+        )
 
-    # Simple merge: concatenation (you can improve ranking/duplicates later)
-    return tavily_results + serp_results
+async def _read_image_upload(file: UploadFile):
+    """Stream the upload into one buffer; returns (memoryview, sniffed content type)."""
+    try:
+        with stage_timer("encode"):
+            return await read_image_upload(file, config.MAX_UPLOAD_BYTES, config.UPLOAD_CHUNK_SIZE)
+    except ImageUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 @app.get("/")
 async def read_root():
@@ -75,67 +433,93 @@ async def read_root():
         }
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request counts, stage and provider latency histograms,
+    provider errors, cache hit ratios and in-flight gauges
+    """
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
-async def health_check():
-    """Detailed health check with API status"""
+async def health_check(request: Request):
+    """Detailed health check: live circuit-breaker state, rolling latency and rate-limit queues per provider"""
+    services: ServiceContainer = request.app.state.services
+    configured = {
+        "gemini": bool(GEMINI_API_KEY),
+        "huggingface": bool(HF_API_KEY),
+        "serp": bool(services.serp.api_key),
+        "tavily": bool(TAVILY_API_KEY)
+    }
+    providers = {
+        name: {"configured": configured.get(name, True), **breaker.stats()}
+        for name, breaker in services.breakers.items()
+    }
+    degraded = any(p["configured"] and p["state"] != "closed" for p in providers.values())
     return {
-        "status": "healthy",
-        "timestamp": "2024-01-01T00:00:00Z",
-        "api_keys": {
-            "huggingface": "configured" if HF_API_KEY else "missing",
-            "gemini": "configured" if GEMINI_API_KEY else "missing", 
-            "tavily": "configured" if TAVILY_API_KEY else "missing"
-        }
+        "status": "degraded" if degraded else "healthy",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "worker_pid": os.getpid(),
+        "provider_warmup_seconds": services.warmup_seconds,
+        "providers": providers,
+        "caption_cache": services.caption_cache.stats(),
+        "refine_cache": services.refine_cache.stats(),
+        "search_cache": services.search_cache.stats(),
+        "shared_results": services.shared_results.stats() if services.shared_results else {"enabled": False},
+        "search_providers": services.search_providers.stats(),
+        "catalog": services.catalog.stats(),
+        "visual_index": services.visual.stats(),
+        "coalesced_calls": {
+            "caption": services.caption_flight.stats(),
+            "refine": services.refine_flight.stats(),
+            "search": services.search_flight.stats()
+        },
+        "rate_limits": {name: limiter.stats() for name, limiter in services.rate_limiters.items()},
+        "hf_models": model_cooloff.stats()
     }
 
 @app.post("/upload")
-async def upload_image(file: UploadFile = File(...)):
+async def upload_image(request: Request, file: UploadFile = File(...)):
     """
     Upload an image and process it through the AI pipeline:
     1. BLIP (HF) → raw caption
     2. Gemini → refined search query  
-    3. Tavily + Serp → product search results
+    3. Registered search providers (Tavily, Serp, ...) → product search results
+    4. Local visual index → visually similar products (alongside steps 1-3)
     """
+    deadline = _request_deadline(request)
     try:
         # Validate file type
-        if not file.content_type or not file.content_type.startswith('image/'):
-            raise HTTPException(
-                status_code=400, 
-                detail="File must be an image (JPEG, PNG, etc.)"
-            )
+        _validate_image_upload(file)
         
-        print(f"Processing upload: {file.filename} ({file.content_type})")
+        logger.info("Processing upload: %s (%s)", file.filename, file.content_type)
+        services: ServiceContainer = request.app.state.services
         
-        # Step 1: Encode image to base64
-        base64_img = encode_uploaded_file(file)
-        print(f"Image encoded successfully, size: {len(base64_img)} chars")
+        # Step 1: Read raw image bytes (sniffed and size-checked while streaming)
+        image_bytes, content_type = await _read_image_upload(file)
+        logger.debug("Image read: %d bytes (%s)", len(image_bytes), content_type)
+        visual_task = asyncio.ensure_future(visual_stage(image_bytes, services))
         
-        # Step 2: Generate raw caption using Gemini Vision
-        print("Calling Gemini Vision API for image caption...")
-        try:
-            raw_caption = caption_image_from_base64(base64_img)
-            print(f"Gemini Vision caption generated: {raw_caption}")
-        except Exception as e:
-            print(f"Gemini Vision API failed: {e}")
-            raw_caption = "An image of clothing or fashion item"
+        # Step 2: Generate raw caption using Gemini Vision (skipped on cache hit)
+        raw_caption, preprocessing = await caption_stage(image_bytes, services, content_type, deadline)
         
-        # Step 3: Refine caption using Gemini API
-        print("Calling Gemini API for query refinement...")
-        try:
-            refined_query = refine_query(raw_caption)
-            print(f"Gemini refinement: {refined_query}")
-        except Exception as e:
-            print(f"Gemini API failed: {e}")
-            refined_query = raw_caption
+        # Step 3: Refine caption using Gemini API (raw caption if it would overrun the budget)
+        refined_query = await refine_stage(raw_caption, services, deadline)
         
-        # Step 4: Search products using Tavily and Serp APIs
-        print("Calling Tavily and Serp APIs for product search...")
+        # Step 4: Search products with every registered provider; late providers are cut off
+        logger.debug("Calling search providers for product search")
         try:
-            search_results = await search_products(refined_query)
-            print(f"Search returned {len(search_results) if isinstance(search_results, list) else 'results'}")
+            candidates = await search_candidates(refined_query, services, deadline)
+            search_results = merge_results(refined_query, candidates, services=services)
+            logger.info("Search returned %d results", len(search_results))
         except Exception as e:
-            print(f"Search APIs failed: {e}")
-            search_results = []
+            logger.warning("Search APIs failed: %s", e)
+            candidates, search_results = [], []
+        
+        # Step 5: Add products from the visual index that look like the upload
+        similar_items = merge_visual(search_results, await collect_visual(visual_task, deadline))
+        
+        # Step 6: Compare prices for the same product across stores
+        price_comparison = price_compare_agent.compare(candidates)
         
         # Return the complete pipeline results
         return {
@@ -143,31 +527,217 @@ async def upload_image(file: UploadFile = File(...)):
             "raw_caption": raw_caption,
             "refined_query": refined_query,
             "results": search_results,
-            "processing_info": {
-                "apis_used": {
-                    "blip": bool(HF_API_KEY),
-                    "gemini": bool(GEMINI_API_KEY),
-                    "tavily": bool(TAVILY_API_KEY)
-                }
-            }
+            "similar_items": similar_items,
+            "price_comparison": price_comparison,
+            "partial": bool(deadline.degraded),
+            "degraded_stages": deadline.degraded,
+            "processing_info": _processing_info(preprocessing, deadline)
         }
         
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
-        print(f"Unexpected error in upload_image: {str(e)}")
+        logger.exception("Unexpected error in upload_image")
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.post("/upload/stream")
+async def upload_image_stream(request: Request, file: UploadFile = File(...)):
+    """
+    Streaming variant of /upload. Emits one NDJSON event per pipeline stage as soon
+    as it completes, so the client can render the caption before search finishes:
+    1. {"event": "raw_caption", ...}
+    2. {"event": "refined_query", ...}
+    3. {"event": "results", "provider": ...} once per search provider, in completion order
+       (ranked, and without links already sent by an earlier provider)
+    4. {"event": "summary", ...} with the final merged top-k in "results", the
+       visually "similar_items", the cross-store "price_comparison" and
+       "partial"/"degraded_stages" for stages the request deadline cut short
+    """
+    deadline = _request_deadline(request)
+    _validate_image_upload(file)
+    logger.info("Processing streamed upload: %s (%s)", file.filename, file.content_type)
+    services: ServiceContainer = request.app.state.services
+    image_bytes, content_type = await _read_image_upload(file)
+
+    async def events():
+        visual_task = asyncio.ensure_future(visual_stage(image_bytes, services))
+        try:
+            raw_caption, preprocessing = await caption_stage(image_bytes, services, content_type, deadline)
+            yield _ndjson({"event": "raw_caption", "raw_caption": raw_caption})
+
+            refined_query = await refine_stage(raw_caption, services, deadline)
+            yield _ndjson({"event": "refined_query", "refined_query": refined_query})
+
+            result_counts = {}
+            candidates = []
+            sent_urls = set()
+            with stage_timer("search"):
+                async with aclosing(fan_out_search(refined_query, services, deadline)) as provider_results:
+                    async for provider, results in provider_results:
+                        candidates.extend(results)
+                        ranked = merge_results(refined_query, results, seen_urls=sent_urls, services=services)
+                        result_counts[provider] = len(ranked)
+                        yield _ndjson({"event": "results", "provider": provider, "results": ranked})
+
+            merged = merge_results(refined_query, candidates, services=services)
+            similar_items = merge_visual(merged, await collect_visual(visual_task, deadline))
+
+            yield _ndjson({
+                "event": "summary",
+                "success": True,
+                "raw_caption": raw_caption,
+                "refined_query": refined_query,
+                "result_counts": result_counts,
+                "total_results": len(merged),
+                "results": merged,
+                "similar_items": similar_items,
+                "price_comparison": price_compare_agent.compare(candidates),
+                "partial": bool(deadline.degraded),
+                "degraded_stages": deadline.degraded,
+                "processing_info": _processing_info(preprocessing, deadline)
+            })
+        except Exception as e:
+            # Headers are already sent; report the failure in-band
+            logger.exception("Unexpected error in upload_image_stream")
+            yield _ndjson({"event": "error", "detail": f"Internal server error: {str(e)}"})
+        finally:
+            visual_task.cancel()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def _shared_task(tasks: Dict, key, start) -> asyncio.Task:
+    """One task per key within a batch; later callers with the same key await it too."""
+    task = tasks.get(key)
+    if task is None:
+        task = tasks[key] = asyncio.ensure_future(start())
+    return task
+
+@app.post("/upload/batch")
+async def upload_image_batch(request: Request, files: List[UploadFile] = File(...)):
+    """
+    Upload several images (e.g. a whole outfit) through one pipeline run:
+    1. Identical images (same content hash) are read once and captioned once
+    2. Caption, refine and search each run with their own concurrency limit
+       (BATCH_*_CONCURRENCY), so one large batch can't monopolize a provider
+    3. Images whose captions refine to the same query share one search
+    Results come back per file, in upload order. A file that fails validation
+    only fails its own entry.
+    """
+    if len(files) > config.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.BATCH_MAX_FILES} images can be uploaded per batch"
+        )
+
+    logger.info("Processing batch upload of %d files", len(files))
+    services: ServiceContainer = request.app.state.services
+
+    # Step 1: Read every file; duplicates collapse onto one image key
+    entries = []
+    images = {}
+    for index, file in enumerate(files):
+        entry = {"index": index, "filename": file.filename}
+        try:
+            _validate_image_upload(file)
+            image_bytes, content_type = await _read_image_upload(file)
+        except HTTPException as e:
+            entry.update({"success": False, "status_code": e.status_code, "detail": e.detail})
+        else:
+            entry["image_key"] = services.caption_cache.key_for(image_bytes)
+            images.setdefault(entry["image_key"], (image_bytes, content_type))
+        entries.append(entry)
+
+    caption_limit = asyncio.Semaphore(max(1, config.BATCH_CAPTION_CONCURRENCY))
+    refine_limit = asyncio.Semaphore(max(1, config.BATCH_REFINE_CONCURRENCY))
+    search_limit = asyncio.Semaphore(max(1, config.BATCH_SEARCH_CONCURRENCY))
+    refine_tasks = {}
+    search_tasks = {}
+
+    async def refine(raw_caption: str) -> str:
+        async with refine_limit:
+            return await refine_stage(raw_caption, services)
+
+    async def search(refined_query: str) -> List:
+        async with search_limit:
+            return await search_candidates(refined_query, services)
+
+    async def pipeline(image_bytes, content_type):
+        # Step 2: Caption each unique image
+        async with caption_limit:
+            raw_caption, preprocessing = await caption_stage(image_bytes, services, content_type)
+        # Step 3: Refine each unique caption, then search each unique query
+        refined_query = await _shared_task(
+            refine_tasks, normalize_text_key(raw_caption), lambda: refine(raw_caption)
+        )
+        candidates = await _shared_task(
+            search_tasks, normalize_text_key(refined_query), lambda: search(refined_query)
+        )
+        return raw_caption, refined_query, candidates, preprocessing
+
+    keys = list(images)
+    try:
+        outcomes = await asyncio.gather(
+            *(pipeline(*images[key]) for key in keys), return_exceptions=True
+        )
+    finally:
+        # Don't leave shared stage tasks running if the request is cancelled
+        for task in (*refine_tasks.values(), *search_tasks.values()):
+            task.cancel()
+
+    # Step 4: Rank and price-compare once per unique image, then fan back out per file
+    responses = {}
+    for key, outcome in zip(keys, outcomes):
+        if isinstance(outcome, Exception):
+            logger.warning("Batch pipeline failed for image %s: %s", key[:12], outcome)
+            responses[key] = {"success": False, "status_code": 500, "detail": f"Internal server error: {outcome}"}
+            continue
+        raw_caption, refined_query, candidates, preprocessing = outcome
+        responses[key] = {
+            "success": True,
+            "raw_caption": raw_caption,
+            "refined_query": refined_query,
+            "results": merge_results(refined_query, candidates, services=services),
+            "price_comparison": price_compare_agent.compare(candidates),
+            "processing_info": _processing_info(preprocessing)
+        }
+
+    first_index = {}
+    for entry in entries:
+        key = entry.pop("image_key", None)
+        if key is None:
+            continue
+        entry.update(responses[key])
+        if key in first_index:
+            entry["duplicate_of"] = first_index[key]
+        else:
+            first_index[key] = entry["index"]
+
+    return {
+        "success": any(entry["success"] for entry in entries),
+        "results": entries,
+        "batch_info": {
+            "files": len(entries),
+            "unique_images": len(images),
+            "unique_queries": len(search_tasks),
+            "failed": sum(1 for entry in entries if not entry["success"])
+        }
+    }
+
+def _ndjson(event: Dict) -> bytes:
+    return json.dumps(event).encode("utf-8") + b"\n"
+
+_ROUTE_PATHS = {route.path for route in app.routes}
+
 # For development - run with: uvicorn main:app --reload
 if __name__ == "__main__":
+    # One process, for local runs; `python run.py --workers N` is the production launcher
     uvicorn.run(
-        "main:app",
-        host="127.0.0.1",
-        port=8000,
-        reload=True,
+        app,
+        host=config.WEB_HOST,
+        port=config.WEB_PORT,
         log_level="info"
     )
@@ -1,41 +1,198 @@
 #!/usr/bin/env python3
 """
-Robust startup script for the shopperstack backend
-Handles uAgents lifecycle and suppresses harmless warnings
+Production launcher for the shopperstack backend.
+
+Runs the FastAPI app on WEB_WORKERS processes that share one listening socket.
+With preloading (the default) the app is imported once in the supervisor and
+the workers are forked from it, so startup work and read-only memory are shared.
+The supervisor restarts workers that die; on SIGTERM or Ctrl+C it asks every
+worker to drain (stop accepting, finish in-flight requests for up to
+WEB_GRACEFUL_TIMEOUT seconds, run shutdown) and exits once they have.
+
+    python run.py [--workers 4] [--host 0.0.0.0] [--port 8000] [--no-preload]
+
+Platforms without fork (Windows) fall back to uvicorn's own multi-process mode.
 """
 
-import asyncio
-import warnings
+import argparse
+import logging
+import os
+import signal
 import sys
-from main import app
+import time
+import warnings
+from typing import Dict, Optional
+
 import uvicorn
 
+from utils import config
+
 # Suppress specific asyncio warnings
 warnings.filterwarnings("ignore", category=RuntimeWarning, message=".*coroutine.*was never awaited.*")
 warnings.filterwarnings("ignore", category=RuntimeWarning, message=".*Task was destroyed.*")
 
-def main():
+APP = "main:app"
+
+# Supervisor messages share uvicorn's console format
+logger = logging.getLogger("uvicorn.error")
+
+# A worker that exits sooner than this after starting is crash-looping; restarts then back off
+MIN_WORKER_UPTIME = 5.0
+RESTART_BACKOFF = 1.0
+# Extra time after the graceful timeout before stragglers are killed
+KILL_GRACE = 5.0
+
+
+def resolve_workers(workers: int) -> int:
+    """0 (or less) means one worker per CPU."""
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def preload_app():
+    """Import the app and build what every worker would otherwise build on its own
+    (the compiled attribute vocabulary), before forking.
+    """
+    from main import app
+    from services import attributes
+
+    attributes.get_extractor()
+    return app
+
+
+class Supervisor:
+    """Pre-fork process manager: `workers` children serve `server_config` on one socket."""
+
+    def __init__(self, server_config: uvicorn.Config, workers: int, graceful_timeout: float):
+        self.server_config = server_config
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.children: Dict[int, float] = {}
+        self.stopping = False
+        self._kill_at: Optional[float] = None
+        self._socket = None
+
+    def run(self) -> int:
+        self._socket = self.server_config.bind_socket()
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        logger.info("Supervisor %d starting %d workers", os.getpid(), self.workers)
+        for _ in range(self.workers):
+            self._spawn()
+
+        while self.children:
+            if self.stopping:
+                self._drain()
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.1)
+                continue
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            logger.warning("Worker %d exited (status %d); restarting", pid, status)
+            if time.monotonic() - started < MIN_WORKER_UPTIME:
+                time.sleep(RESTART_BACKOFF)
+            if not self.stopping:
+                self._spawn()
+
+        self._socket.close()
+        logger.info("Supervisor %d stopped", os.getpid())
+        return 0
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return
+        # Worker: uvicorn installs its own SIGTERM/SIGINT handlers and drains on them
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            uvicorn.Server(self.server_config).run(sockets=[self._socket])
+        except BaseException:
+            logger.exception("Worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _request_stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def _drain(self) -> None:
+        now = time.monotonic()
+        if self._kill_at is None:
+            logger.info("Draining %d workers (up to %.0fs)", len(self.children), self.graceful_timeout)
+            self._kill_at = now + self.graceful_timeout + KILL_GRACE
+            self._signal_children(signal.SIGTERM)
+        elif now >= self._kill_at:
+            logger.warning("Killing %d workers that did not drain in time", len(self.children))
+            self._signal_children(signal.SIGKILL)
+            self._kill_at = float("inf")
+
+    def _signal_children(self, signum) -> None:
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                self.children.pop(pid, None)
+
+
+def serve(host: str, port: int, workers: int, preload: bool = True, graceful_timeout: float = 30.0,
+          log_level: str = "info", access_log: bool = True) -> int:
+    workers = resolve_workers(workers)
+    # Workers split every provider quota between them (see utils/rate_limit.py); the
+    # environment carries the count to workers that import the app themselves
+    config.RATE_LIMIT_WORKERS = workers
+    os.environ["RATE_LIMIT_WORKERS"] = str(workers)
+    options = dict(host=host, port=port, log_level=log_level, access_log=access_log,
+                   timeout_graceful_shutdown=graceful_timeout)
+
+    if workers > 1 and not hasattr(os, "fork"):
+        # Spawned workers import the app themselves; nothing to preload
+        uvicorn.run(APP, workers=workers, **options)
+        return 0
+
+    target = preload_app() if preload else APP
+    server_config = uvicorn.Config(target, **options)
+    if workers == 1:
+        uvicorn.Server(server_config).run()
+        return 0
+    return Supervisor(server_config, workers, graceful_timeout).run()
+
+
+def main(argv=None) -> int:
     """Main entry point with proper error handling"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=config.WEB_HOST)
+    parser.add_argument("--port", type=int, default=config.WEB_PORT)
+    parser.add_argument("--workers", type=int, default=config.WEB_WORKERS, help="worker processes (0 = one per CPU)")
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=config.WEB_PRELOAD,
+                        help="import the app once before forking workers")
+    parser.add_argument("--graceful-timeout", type=float, default=config.WEB_GRACEFUL_TIMEOUT,
+                        help="seconds a draining worker waits for in-flight requests")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--access-log", action=argparse.BooleanOptionalAction, default=True)
+    args = parser.parse_args(argv)
+
     try:
         print("Starting ShopperStack Backend...")
-        print("FastAPI server will run on: http://127.0.0.1:8000")
-        print("Image Caption Agent will run on: http://127.0.0.1:8002")
-        print("Tavily Agent will run on: http://127.0.0.1:8003")
+        print(f"FastAPI server will run on: http://{args.host}:{args.port} "
+              f"with {resolve_workers(args.workers)} worker(s)")
         print("Press Ctrl+C to stop the server")
-        
-        uvicorn.run(
-            "main:app",
-            host="127.0.0.1",
-            port=8000,
-            log_level="info",
-            access_log=True
-        )
-        
+        return serve(args.host, args.port, args.workers, preload=args.preload,
+                     graceful_timeout=args.graceful_timeout, log_level=args.log_level,
+                     access_log=args.access_log)
     except KeyboardInterrupt:
         print("\nShutting down gracefully...")
+        return 0
     except Exception as e:
         print(f"Error starting application: {e}")
-        sys.exit(1)
+        return 1
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
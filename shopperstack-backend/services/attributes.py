@@ -0,0 +1,192 @@
+"""Single-pass product attribute extraction for the heuristic query refiner.
+
+The vocabulary (data/attributes.json, or ATTRIBUTE_VOCAB_PATH) maps each
+attribute (type, color, material, ...) to canonical values and the terms that
+mean them: synonyms and multi-word phrases. Every term of every attribute is
+compiled into one regular expression shaped like a prefix trie, so a caption
+is scanned once, left to right, whatever the vocabulary size, and at each
+position the longest term wins ("navy blue" over "navy", "dress shirt" over
+"dress").
+
+A value may be written as a list of terms, or as {"terms": [...], "weight": w}
+for weak evidence such as "fabric" -> "premium fabric". An attribute may set a
+"default" used when nothing matches, and "upgrades": cue terms that turn one
+value into a more specific one anywhere in the caption ("shirt" + "buttons" ->
+"button-up shirt").
+
+Each extracted attribute comes with a confidence in [0, 1]. Mentions add up
+per value, later mentions counting less (1, 1/2, 1/3, ...). The best value's
+confidence is its share of the attribute's total, times its weight. "black
+shirt" is 1.0 black; "black shirt with white collar" is 0.67 black.
+"""
+import json
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils import config
+
+logger = logging.getLogger(__name__)
+
+# Hyphens, underscores and slashes separate words like spaces do ("long-sleeved" == "long sleeved")
+_SEPARATORS = str.maketrans({"-": " ", "_": " ", "/": " "})
+# What a space inside a vocabulary term matches in a caption
+_GAP = r"[\s_/-]+"
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").lower().translate(_SEPARATORS).split())
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    """A regex matching exactly `terms`, factored by common prefix so matching never
+    backtracks across alternatives. Greedy optional tails make the longest term win.
+    """
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        ends_here = "" in node
+        branches = [(_GAP if char == " " else re.escape(char)) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends_here:
+            body = ("(?:" + body + ")?") if len(branches) > 1 or len(body) > 1 else body + "?"
+        return body
+
+    return build(trie)
+
+
+class AttributeExtractor:
+    """A vocabulary compiled for single-pass extraction. Immutable, so one instance is
+    shared by every request.
+    """
+
+    def __init__(self, vocabulary: Dict):
+        attributes = vocabulary.get("attributes") or {}
+        self.order: List[str] = list(vocabulary.get("order") or attributes)
+        self.filler: List[str] = list(vocabulary.get("filler") or [])
+        self.min_parts: int = int(vocabulary.get("min_parts", 0))
+        self.defaults: Dict[str, str] = {}
+        self.upgrades: Dict[Tuple[str, str], List[Tuple[str, frozenset]]] = {}
+        # normalized term -> [(attribute, value, weight)]; one term may feed several attributes
+        self.terms: Dict[str, List[Tuple[str, str, float]]] = {}
+        # normalized cue term -> upgrade ids it supports
+        self.cues: Dict[str, List[str]] = {}
+
+        for attribute, spec in attributes.items():
+            if spec.get("default"):
+                self.defaults[attribute] = spec["default"]
+            for value, entry in (spec.get("values") or {}).items():
+                terms, weight = (entry, 1.0) if isinstance(entry, list) else (entry["terms"], entry.get("weight", 1.0))
+                for term in list(terms) + [value]:
+                    targets = self.terms.setdefault(normalize(term), [])
+                    if all(existing[:2] != (attribute, value) for existing in targets):
+                        targets.append((attribute, value, float(weight)))
+            for base, upgrades in (spec.get("upgrades") or {}).items():
+                for upgraded, cue_terms in upgrades.items():
+                    cue_id = f"{attribute}:{base}->{upgraded}"
+                    for cue in cue_terms:
+                        self.cues.setdefault(normalize(cue), []).append(cue_id)
+                    self.upgrades.setdefault((attribute, base), []).append((upgraded, frozenset([cue_id])))
+
+        words = [term for term in set(self.terms) | set(self.cues) if term]
+        self.pattern = re.compile(r"\b(?:" + _trie_pattern(words) + r")\b") if words else None
+        self.size = len(words)
+        # normalized term -> (targets, cue ids)
+        self._lookup = {term: (tuple(self.terms.get(term, ())), tuple(self.cues.get(term, ()))) for term in words}
+
+    @classmethod
+    def from_file(cls, path: str) -> "AttributeExtractor":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def extract(self, text: str) -> Dict[str, Dict]:
+        """{attribute: {"value": ..., "confidence": ...}} for every attribute found
+        (or defaulted, at confidence 0) in `text`.
+        """
+        # attribute -> {value: [score, weight, first mention]}
+        scores: Dict[str, Dict[str, List[float]]] = {}
+        mentions: Dict[str, int] = {}
+        seen_cues = set()
+        if self.pattern is not None:
+            lookup = self._lookup
+            for term in self.pattern.findall(text.lower()):
+                # Separator variants ("long-sleeved") fall back to the normalized term
+                targets, cues = lookup.get(term) or lookup[normalize(term)]
+                for attribute, value, weight in targets:
+                    rank = mentions.get(attribute, 0)
+                    mentions[attribute] = rank + 1
+                    values = scores.get(attribute)
+                    if values is None:
+                        scores[attribute] = {value: [weight, weight, rank]}
+                    elif value in values:
+                        values[value][0] += weight / (rank + 1)
+                    else:
+                        values[value] = [weight / (rank + 1), weight, rank]
+                if cues:
+                    seen_cues.update(cues)
+
+        found: Dict[str, Dict] = {}
+        for attribute, values in scores.items():
+            if len(values) == 1:
+                (value, (score, weight, _)), = values.items()
+                confidence = weight
+            else:
+                # Highest score first; ties go to the value mentioned first
+                value, (score, weight, _) = min(values.items(), key=lambda item: (-item[1][0], item[1][2]))
+                confidence = weight * score / sum(entry[0] for entry in values.values())
+            if seen_cues:
+                for upgraded, cues in self.upgrades.get((attribute, value), ()):
+                    if cues & seen_cues:
+                        value = upgraded
+                        break
+            found[attribute] = {"value": value, "confidence": round(confidence, 2)}
+        for attribute, default in self.defaults.items():
+            if attribute not in found:
+                found[attribute] = {"value": default, "confidence": 0.0}
+        return found
+
+    def extract_batch(self, texts: Sequence[str]) -> List[Dict[str, Dict]]:
+        """`extract` for many captions; repeated captions are extracted once."""
+        memo: Dict[str, Dict[str, Dict]] = {}
+        results = []
+        for text in texts:
+            extracted = memo.get(text)
+            if extracted is None:
+                extracted = memo[text] = self.extract(text)
+            results.append(extracted)
+        return results
+
+    def to_query(self, attributes: Dict[str, Dict]) -> str:
+        """Join extracted values in vocabulary order into a search query, padded with the
+        filler words when fewer than `min_parts` attributes were found.
+        """
+        parts = [attributes[name]["value"] for name in self.order if name in attributes]
+        if len(parts) < self.min_parts:
+            parts.extend(self.filler)
+        return " ".join(parts)
+
+    def refine(self, caption: str) -> str:
+        return self.to_query(self.extract(caption))
+
+    def refine_batch(self, captions: Sequence[str]) -> List[str]:
+        return [self.to_query(attributes) for attributes in self.extract_batch(captions)]
+
+
+_shared_extractor: Optional[AttributeExtractor] = None
+
+
+def get_extractor() -> AttributeExtractor:
+    """The extractor for ATTRIBUTE_VOCAB_PATH, compiled on first use."""
+    global _shared_extractor
+    if _shared_extractor is None:
+        _shared_extractor = AttributeExtractor.from_file(config.ATTRIBUTE_VOCAB_PATH)
+        logger.debug("Compiled %d attribute terms from %s", _shared_extractor.size, config.ATTRIBUTE_VOCAB_PATH)
+    return _shared_extractor
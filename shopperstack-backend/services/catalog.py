@@ -0,0 +1,361 @@
+"""Offline product catalog with a BM25 inverted index.
+
+Products come from a JSONL file (one product object per line with at least
+`title` and `link`). The index is built once and saved next to the cache as
+memory-mapped NumPy arrays, so a restart maps it back in instead of
+re-tokenizing the catalog:
+
+- postings: per term, the documents containing it and the term's precomputed
+  BM25 contribution to each ("impact"), sorted by impact (highest last)
+- forward index: per document, its terms and impacts, for exact rescoring
+- records: the raw JSON line of every product, decoded only for the top k
+
+Queries sum impacts over the query terms' postings. When those fit in
+`postings_budget` the result is the exact BM25 top k. Otherwise only postings
+above a shared impact cutoff are read (the low-IDF tail such as "wear" or
+"sleeve" goes first), and the best candidates are rescored exactly from the
+forward index, so query cost stays flat as the catalog grows.
+
+`ProductCatalog.reload_if_changed` rebuilds the index when the file changes and
+swaps the new snapshot in; searches in progress keep using the old one.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils import config
+from utils.snapshot import load_snapshot, save_snapshot
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Title words count twice: a "kurta" in the title matters more than one in the description
+TITLE_WEIGHT = 2
+TEXT_FIELDS = ("snippet", "description", "brand", "store", "source", "category", "color", "material")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("a an and are as at by for from in is it of on or the to with".split())
+
+_ARRAYS = ("post_ptr", "post_doc", "post_impact", "fwd_ptr", "fwd_term", "fwd_impact", "rec_ptr", "records")
+# Candidates per result slot that a budgeted search rescores exactly
+RESCORE_POOL = 40
+
+
+def _stem(token: str) -> str:
+    """Fold plurals so "shirts" finds "shirt" and "dresses" finds "dress"."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith("sses"):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in _TOKEN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def _document_tokens(product: Dict) -> List[str]:
+    tokens = tokenize(str(product.get("title", ""))) * TITLE_WEIGHT
+    for field in TEXT_FIELDS:
+        value = product.get(field)
+        if value:
+            tokens.extend(tokenize(str(value)))
+    for tag in product.get("tags") or ():
+        tokens.extend(tokenize(str(tag)))
+    return tokens
+
+
+def _source_signature(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+class CatalogIndex:
+    """An immutable, searchable snapshot of one version of the catalog file."""
+
+    def __init__(self, vocab: Dict[str, int], arrays: Dict[str, np.ndarray], meta: Dict):
+        self.vocab = vocab
+        self.meta = meta
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self.size = len(self.rec_ptr) - 1
+
+    @classmethod
+    def build(cls, path: str) -> "CatalogIndex":
+        started = time.perf_counter()
+        signature = _source_signature(path)
+        vocab: Dict[str, int] = {}
+        doc_terms, doc_tfs, doc_lens, doc_widths = array("i"), array("i"), array("i"), array("i")
+        rec_ptr, records = [0], bytearray()
+        skipped = 0
+
+        with open(path, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    product = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if not isinstance(product, dict) or not product.get("title") or not product.get("link"):
+                    skipped += 1
+                    continue
+                counts: Dict[int, int] = {}
+                tokens = _document_tokens(product)
+                for token in tokens:
+                    term = vocab.setdefault(token, len(vocab))
+                    counts[term] = counts.get(term, 0) + 1
+                if not counts:
+                    skipped += 1
+                    continue
+                doc_terms.extend(counts.keys())
+                doc_tfs.extend(counts.values())
+                doc_lens.append(len(tokens))
+                doc_widths.append(len(counts))
+                records += line
+                rec_ptr.append(len(records))
+
+        if skipped:
+            logger.warning("Catalog %s: skipped %d lines without a title and link", path, skipped)
+
+        n_docs = len(doc_lens)
+        terms = np.frombuffer(doc_terms, dtype=np.int32) if doc_terms else np.zeros(0, np.int32)
+        tfs = np.frombuffer(doc_tfs, dtype=np.int32).astype(np.float32) if doc_tfs else np.zeros(0, np.float32)
+        lens = np.frombuffer(doc_lens, dtype=np.int32).astype(np.float32) if doc_lens else np.zeros(0, np.float32)
+        widths = np.frombuffer(doc_widths, dtype=np.int32) if doc_widths else np.zeros(0, np.int32)
+        docs = np.repeat(np.arange(n_docs, dtype=np.int32), widths)
+
+        # BM25 contribution of every (term, doc) pair, computed once here instead of per query
+        df = np.bincount(terms, minlength=len(vocab)).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        avgdl = float(lens.mean()) if n_docs else 0.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lens / avgdl) if n_docs else lens
+        impact = (idf[terms] * tfs * (BM25_K1 + 1) / (tfs + norm[docs])).astype(np.float32)
+
+        # Postings grouped by term, in ascending impact order within each term
+        order = np.lexsort((impact, terms))
+        arrays = {
+            "post_ptr": np.concatenate(([0], np.cumsum(df, dtype=np.int64))),
+            "post_doc": docs[order],
+            "post_impact": impact[order],
+            "fwd_ptr": np.concatenate(([0], np.cumsum(widths, dtype=np.int64))),
+            "fwd_term": terms,
+            "fwd_impact": impact,
+            "rec_ptr": np.asarray(rec_ptr, dtype=np.int64),
+            "records": np.frombuffer(bytes(records), dtype=np.uint8),
+        }
+        meta = {
+            "format": INDEX_FORMAT,
+            "source": os.path.abspath(path),
+            "source_size": signature[0],
+            "source_mtime_ns": signature[1],
+            "documents": n_docs,
+            "terms": len(vocab),
+            "avgdl": round(avgdl, 3),
+            "build_seconds": round(time.perf_counter() - started, 3),
+        }
+        return cls(vocab, arrays, meta)
+
+    def save(self, index_dir: str) -> str:
+        """Write this snapshot as a new version under `index_dir` (see utils/snapshot.py)."""
+        arrays = {name: getattr(self, name) for name in _ARRAYS}
+        return save_snapshot(index_dir, arrays, {"vocab": self.vocab, "meta": self.meta})
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["CatalogIndex"]:
+        """Map the CURRENT saved version back in, or None if there isn't a usable one."""
+        snapshot = load_snapshot(index_dir, _ARRAYS, ("meta", "vocab"))
+        if snapshot is None:
+            return None
+        arrays, documents = snapshot
+        if documents["meta"].get("format") != INDEX_FORMAT:
+            return None
+        return cls(documents["vocab"], arrays, documents["meta"])
+
+    def matches(self, path: str) -> bool:
+        try:
+            size, mtime_ns = _source_signature(path)
+        except OSError:
+            return False
+        return (self.meta.get("source") == os.path.abspath(path)
+                and self.meta.get("source_size") == size and self.meta.get("source_mtime_ns") == mtime_ns)
+
+    def search(self, query: str, k: int, postings_budget: int = 0) -> List[Tuple[int, float]]:
+        """Top `k` (doc id, BM25 score) pairs for `query`, best first.
+
+        With a `postings_budget`, at most about that many postings are read to pick
+        candidates, and the best `RESCORE_POOL * k` of them are then scored exactly.
+        0 reads every posting.
+        """
+        terms = sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab})
+        if not terms or k <= 0:
+            return []
+        spans = [(int(self.post_ptr[t]), int(self.post_ptr[t + 1])) for t in terms]
+        truncated = bool(postings_budget) and sum(end - start for start, end in spans) > postings_budget
+        if truncated:
+            spans = self._above_cutoff(spans, postings_budget)
+
+        docs, scores = self._accumulate(spans, RESCORE_POOL * k if truncated else k)
+        if truncated:
+            scores = self._score(docs, np.asarray(terms, dtype=np.int32))
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[best], scores[best]
+        top = np.lexsort((docs, -scores))
+        return [(int(docs[i]), float(scores[i])) for i in top]
+
+    def record(self, doc: int) -> Dict:
+        start, end = int(self.rec_ptr[doc]), int(self.rec_ptr[doc + 1])
+        return json.loads(self.records[start:end].tobytes())
+
+    def _accumulate(self, spans: List[Tuple[int, int]], limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Sum the postings in `spans` per document; returns (at least) the `limit` best documents."""
+        docs = np.concatenate([self.post_doc[start:end] for start, end in spans])
+        impacts = np.concatenate([self.post_impact[start:end] for start, end in spans])
+        # Dense accumulation beats sorting the postings unless the catalog dwarfs them
+        if self.size <= 16 * len(docs):
+            totals = np.bincount(docs, weights=impacts, minlength=self.size)
+            # A document fills at most one slot per span, so this many slots hold `limit` distinct ones
+            slots = min(limit * len(spans), len(docs))
+            docs = np.unique(docs[np.argpartition(-totals[docs], slots - 1)[:slots]])
+            return docs, totals[docs]
+        docs, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=impacts)
+        if len(scores) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            docs, scores = docs[best], scores[best]
+        return docs, scores
+
+    def _score(self, docs: np.ndarray, query_terms: np.ndarray) -> np.ndarray:
+        """Exact BM25 scores of `docs`, from their forward-index entries."""
+        starts = self.fwd_ptr[docs]
+        widths = self.fwd_ptr[docs + 1] - starts
+        offsets = np.concatenate(([0], np.cumsum(widths)[:-1]))
+        positions = np.repeat(starts - offsets, widths) + np.arange(int(widths.sum()))
+        weights = np.where(np.isin(self.fwd_term[positions], query_terms), self.fwd_impact[positions], 0.0)
+        return np.add.reduceat(weights, offsets)
+
+    def _above_cutoff(self, spans: List[Tuple[int, int]], budget: int) -> List[Tuple[int, int]]:
+        """Shorten each span to its postings at or above one shared impact cutoff, chosen so
+        that about `budget` postings remain in total.
+        """
+        impacts = [self.post_impact[start:end] for start, end in spans]
+        # Every stride-th impact of each (ascending) span stands for `stride` postings
+        stride = max(1, sum(len(values) for values in impacts) // 512)
+        samples = np.sort(np.concatenate([values[::stride] for values in impacts]))[::-1]
+        cutoff = samples[min(len(samples), max(1, budget // stride)) - 1]
+        cuts = [start + int(np.searchsorted(values, cutoff)) for (start, _), values in zip(spans, impacts)]
+        return [(cut, end) for (_, end), cut in zip(spans, cuts) if cut < end]
+
+
+class ProductCatalog:
+    """The offline catalog used when no live search provider is available.
+
+    Loads (or builds and saves) the index on first use and rebuilds it when the
+    catalog file changes, swapping the new snapshot in atomically.
+    """
+
+    def __init__(self, path: str, index_dir: Optional[str] = None, top_k: int = 5, postings_budget: int = 0):
+        self.path = path
+        self.index_dir = index_dir
+        self.top_k = top_k
+        self.postings_budget = postings_budget
+        self._index: Optional[CatalogIndex] = None
+        self._lock = threading.Lock()
+        self._reported_missing = False
+        self.reloads = 0
+        self.searches = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def load(self) -> bool:
+        """Make sure an index for the current file is loaded. Returns True if one is."""
+        if self._index is None:
+            self.reload_if_changed()
+        return self._index is not None
+
+    def reload_if_changed(self) -> bool:
+        """Rebuild the index if the catalog file changed since it was built. Returns True on a swap."""
+        with self._lock:
+            current = self._index
+            if current is not None and current.matches(self.path):
+                return False
+            if not os.path.exists(self.path):
+                if current is None and not self._reported_missing:
+                    logger.warning("Product catalog not found: %s", self.path)
+                    self._reported_missing = True
+                return False
+
+            index = CatalogIndex.load(self.index_dir) if self.index_dir and current is None else None
+            if index is None or not index.matches(self.path):
+                try:
+                    index = CatalogIndex.build(self.path)
+                except OSError as e:
+                    logger.warning("Could not read product catalog %s: %s", self.path, e)
+                    return False
+                if self.index_dir:
+                    try:
+                        index.save(self.index_dir)
+                    except OSError as e:
+                        logger.warning("Could not save catalog index to %s: %s", self.index_dir, e)
+
+            self._index = index
+            self.reloads += 1
+            logger.info("Product catalog loaded", extra={
+                "documents": index.size, "terms": len(index.vocab), "build_seconds": index.meta.get("build_seconds"),
+            })
+            return True
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Dict]:
+        index = self._index
+        if index is None:
+            if not self.load():
+                return []
+            index = self._index
+        self.searches += 1
+        results = []
+        for doc, score in index.search(query, k or self.top_k, self.postings_budget):
+            product = index.record(doc)
+            product["catalog_score"] = round(score, 4)
+            results.append(product)
+        return results
+
+    def stats(self) -> Dict:
+        index = self._index
+        return {
+            "path": self.path,
+            "loaded": index is not None,
+            "postings_budget": self.postings_budget,
+            "documents": index.size if index else 0,
+            "terms": len(index.vocab) if index else 0,
+            "reloads": self.reloads,
+            "searches": self.searches,
+        }
+
+
+_shared_catalog: Optional[ProductCatalog] = None
+
+
+def get_shared_catalog() -> ProductCatalog:
+    """Process-wide catalog for callers that don't get one from the service container."""
+    global _shared_catalog
+    if _shared_catalog is None:
+        _shared_catalog = ProductCatalog(
+            config.CATALOG_PATH, config.CATALOG_INDEX_DIR, config.CATALOG_TOP_K, config.CATALOG_POSTINGS_BUDGET
+        )
+    return _shared_catalog
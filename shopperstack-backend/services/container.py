@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from services.catalog import ProductCatalog
+from services.gemini import GeminiService
+from services.search_registry import SearchRegistry
+from services.serp import SerpService
+from services.vector_index import VisualSearch
+from services import tavily
+from utils import config
+from utils.cache import CaptionCache, SharedStore, TTLCache
+from utils.circuit_breaker import CircuitBreaker
+from utils.rate_limit import get_limiter, limiters
+from utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def build_pooled_client(max_connections: int, max_keepalive: int) -> httpx.AsyncClient:
+    """Create a keep-alive async client whose connection pool is shared by every request."""
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(limits=limits)
+
+
+class ServiceContainer:
+    """Provider clients built once at application startup and reused by every request.
+
+    Holds one Gemini model, pooled async HTTP clients for SerpApi, Hugging Face
+    and Tavily, the registry of product search providers, a circuit breaker and
+    rate limiter per provider, the result caches, single-flight groups, the offline
+    product catalog, the visual similarity index and the image preprocessing
+    process pool.
+    Created in the FastAPI lifespan, started once the event loop runs and closed on
+    shutdown. Provider SDKs are imported and their clients built on first use, or by
+    a background warm-up once the server is taking requests (PROVIDER_WARMUP).
+    """
+
+    def __init__(self):
+        # Calls wait for their provider's shared rate limiter once the breaker admits them.
+        # Hugging Face takes a token per model request instead (see services/huggingface_blip.py).
+        self.breakers = {
+            "gemini": CircuitBreaker("gemini", limiter=get_limiter("gemini")),
+            # Model racing is bounded by its own deadline; only a blown deadline counts as slow
+            "huggingface": CircuitBreaker("huggingface", slow_call_seconds=config.HF_CAPTION_DEADLINE),
+            "serp": CircuitBreaker("serp", limiter=get_limiter("serp")),
+            "tavily": CircuitBreaker("tavily", limiter=get_limiter("tavily")),
+        }
+        self.rate_limiters = limiters()
+
+        self.serp_http = build_pooled_client(config.SERP_MAX_CONNECTIONS, config.SERP_MAX_KEEPALIVE)
+        self.hf_http = build_pooled_client(config.HF_MAX_CONNECTIONS, config.HF_MAX_KEEPALIVE)
+        self.tavily_http = build_pooled_client(config.TAVILY_MAX_CONNECTIONS, config.TAVILY_MAX_KEEPALIVE)
+
+        self.gemini = GeminiService(
+            hf_client=self.hf_http,
+            breaker=self.breakers["gemini"],
+            hf_breaker=self.breakers["huggingface"],
+        )
+        self.serp = SerpService(async_client=self.serp_http, breaker=self.breakers["serp"])
+        # Built on first search or by the warm-up; importing the SDK takes a while
+        self.tavily_client = None
+        self._tavily_ready = False
+
+        # Product search sources queried for every upload; register more to add stores.
+        # The lambdas look the search up per call, so it can be swapped after startup.
+        self.search_providers = SearchRegistry()
+        self.search_providers.register_configured("tavily", lambda query: self.tavily_search(query))
+        self.search_providers.register_configured("serp", lambda query: self.serp.search_products_async(query))
+
+        self.caption_cache = CaptionCache(
+            config.CAPTION_CACHE_PATH,
+            max_entries=config.CAPTION_CACHE_MAX_ENTRIES,
+            memory_ttl=config.CAPTION_CACHE_MEMORY_TTL,
+            disk_ttl=config.CAPTION_CACHE_DISK_TTL,
+        )
+        # Refine/search results go through the caption cache's file too, so worker
+        # processes share them instead of each warming its own copy
+        self.shared_results = SharedStore(config.CAPTION_CACHE_PATH) if config.SHARED_RESULT_CACHE else None
+        self.refine_cache = TTLCache(
+            "refine",
+            ttl=config.REFINE_CACHE_TTL,
+            stale_ttl=config.REFINE_CACHE_STALE_TTL,
+            max_entries=config.REFINE_CACHE_MAX_ENTRIES,
+            shared=self.shared_results,
+        )
+        self.search_cache = TTLCache(
+            "search",
+            ttl=config.SEARCH_CACHE_TTL,
+            stale_ttl=config.SEARCH_CACHE_STALE_TTL,
+            max_entries=config.SEARCH_CACHE_MAX_ENTRIES,
+            shared=self.shared_results,
+        )
+
+        self.catalog = ProductCatalog(
+            config.CATALOG_PATH,
+            index_dir=config.CATALOG_INDEX_DIR,
+            top_k=config.CATALOG_TOP_K,
+            postings_budget=config.CATALOG_POSTINGS_BUDGET,
+        )
+        self.visual = VisualSearch(
+            config.VISUAL_INDEX_DIR,
+            embedder=config.VISUAL_EMBEDDER,
+            top_k=config.VISUAL_TOP_K,
+            min_score=config.VISUAL_MIN_SCORE,
+            nprobe=config.VISUAL_NPROBE,
+        )
+        self._catalog_task = None
+        self._warmup_task = None
+        self.warmup_seconds = None
+
+        # Pillow preprocessing runs in worker processes, off the event loop
+        self.image_pool = (
+            ProcessPoolExecutor(max_workers=config.PREPROCESS_WORKERS)
+            if config.PREPROCESS_ENABLED and config.PREPROCESS_WORKERS > 0 else None
+        )
+
+        # In-flight deduplication for identical concurrent work
+        self.caption_flight = SingleFlight("caption")
+        self.refine_flight = SingleFlight("refine")
+        self.search_flight = SingleFlight("search")
+
+    def start(self) -> None:
+        """Load the product catalog and visual index in the background and keep them current,
+        and warm up the provider clients.
+        """
+        self._catalog_task = asyncio.create_task(self._watch_catalog())
+        if config.PROVIDER_WARMUP:
+            self._warmup_task = asyncio.create_task(self.warm_up())
+
+    async def warm_up(self) -> None:
+        """Import the provider SDKs and build their clients off the event loop, so the
+        first upload doesn't pay for it.
+        """
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.gemini.warm_up)
+            await self._get_tavily_client()
+        except Exception as e:
+            logger.warning("Provider warm-up failed: %s", e)
+            return
+        self.warmup_seconds = round(time.perf_counter() - started, 3)
+        logger.info("Provider clients ready in %.2fs", self.warmup_seconds)
+
+    async def _get_tavily_client(self):
+        if not self._tavily_ready:
+            client = await asyncio.to_thread(tavily.build_async_client, self.tavily_http)
+            # A concurrent first call may have finished first; keep the client already in use
+            if not self._tavily_ready:
+                self.tavily_client, self._tavily_ready = client, True
+        return self.tavily_client
+
+    async def _watch_catalog(self) -> None:
+        await asyncio.to_thread(self.catalog.load)
+        await asyncio.to_thread(self.visual.reload_if_changed)
+        while config.CATALOG_RELOAD_SECONDS > 0:
+            await asyncio.sleep(config.CATALOG_RELOAD_SECONDS)
+            for index in (self.catalog, self.visual):
+                try:
+                    await asyncio.to_thread(index.reload_if_changed)
+                except Exception as e:
+                    logger.warning("%s reload failed: %s", type(index).__name__, e)
+
+    async def tavily_search(self, query: str):
+        return await tavily.search_async(
+            query, tavily_client=await self._get_tavily_client(), circuit_breaker=self.breakers["tavily"],
+            catalog=self.catalog,
+        )
+
+    async def aclose(self) -> None:
+        """Release pooled connections, background cache refreshes and catalog reloads,
+        the cache file handles and the preprocessing workers.
+        """
+        for task in (self._catalog_task, self._warmup_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        for cache in (self.refine_cache, self.search_cache):
+            await cache.aclose()
+        for client in (self.serp_http, self.hf_http, self.tavily_http):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning("Error closing HTTP client: %s", e)
+        await asyncio.to_thread(self.caption_cache.close)
+        if self.shared_results is not None:
+            await asyncio.to_thread(self.shared_results.close)
+        if self.image_pool is not None:
+            await asyncio.to_thread(self.image_pool.shutdown, cancel_futures=True)
@@ -1,196 +1,249 @@
+import logging
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
-import io
-from PIL import Image, ImageFilter
+import asyncio
 import base64
+import threading
+from typing import List, Optional
+
+from services import attributes, local_caption
+from utils import config
+from utils.circuit_breaker import OPEN, CircuitBreaker
+from utils.rate_limit import get_limiter
+from services.huggingface_blip import (
+    HF_API_KEY,
+    _detect_content_type,
+    generate_caption_from_bytes,
+    generate_caption_from_bytes_async,
+)
 
-load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+logger = logging.getLogger(__name__)
+
+# Returned when no captioner could describe the image
+GENERIC_CAPTION = "An image of clothing or a fashion item"
+
+CAPTION_PROMPT = (
+    "Provide a concise one-sentence caption describing the image. "
+    "Focus on clothing attributes (type, color, sleeve length, material, occasion) "
+    "and avoid mentioning 'photo' or 'image'."
+)
+CAPTION_GENERATION_CONFIG = {"temperature": 0.0, "max_output_tokens": 60}
+REFINE_GENERATION_CONFIG = {"temperature": 0.7, "max_output_tokens": 60}
+
 
 class GeminiService:
-    def __init__(self):
-        if GEMINI_API_KEY:
-            genai.configure(api_key=GEMINI_API_KEY)
-            self.model = genai.GenerativeModel("gemini-1.5-flash")
-        else:
-            self.model = None
+    def __init__(self, hf_client=None, breaker: Optional[CircuitBreaker] = None,
+                 hf_breaker: Optional[CircuitBreaker] = None):
+        # Pooled async client for the Hugging Face BLIP fallback (see services/container.py)
+        self.hf_client = hf_client
+        # While a breaker is open its provider is skipped and the next fallback runs at once
+        self.breaker = breaker or CircuitBreaker("gemini", limiter=get_limiter("gemini"))
+        self.hf_breaker = hf_breaker or CircuitBreaker("huggingface")
+        # A custom endpoint (a proxy or the load-test stubs) is reached over REST; the SDK's
+        # async client is gRPC-only, so async calls then run the REST client in a worker thread
+        self.rest_endpoint = config.GEMINI_API_ENDPOINT
+        # The SDK takes over a second to import, so the model is built on first use
+        # (or by `warm_up`), never at construction
+        self._model = None
+        self._model_ready = False
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The Gemini model, or None without an API key. The first access imports the SDK."""
+        if not self._model_ready:
+            self._build_model()
+        return self._model
+
+    @model.setter
+    def model(self, value) -> None:
+        self._model = value
+        self._model_ready = True
+
+    def warm_up(self) -> bool:
+        """Build the model now (blocking); True when Gemini is configured."""
+        return self.model is not None
+
+    async def _ensure_model(self) -> None:
+        # Never import the SDK on the event loop
+        if not self._model_ready:
+            await asyncio.to_thread(self._build_model)
+
+    def _build_model(self) -> None:
+        with self._model_lock:
+            if self._model_ready:
+                return
+            model = None
+            if GEMINI_API_KEY:
+                try:
+                    genai = import_sdk()
+                    if self.rest_endpoint:
+                        genai.configure(api_key=GEMINI_API_KEY, transport="rest",
+                                        client_options={"api_endpoint": self.rest_endpoint})
+                    else:
+                        genai.configure(api_key=GEMINI_API_KEY)
+                    model = genai.GenerativeModel("gemini-1.5-flash")
+                except Exception as e:
+                    logger.warning("Gemini model setup failed, refining locally: %s", e)
+            self._model = model
+            self._model_ready = True
 
     def refine_query(self, raw_caption: str) -> str:
         """Refine the image caption into a detailed product search query."""
 
-        print(f"Refining query from caption: {raw_caption}")
+        logger.debug("Refining query from caption: %s", raw_caption)
 
         # Gemini API is available
         if self.model:
             try:
-                prompt = f"""
-                You are refining image captions into detailed e-commerce product search queries.
-                Include: clothing type, color, sleeve length, fabric/material, and occasion (formal/casual/etc.).
-                Make it useful for searching online shops.
-                Do NOT add extra words like 'photo' or 'image'.
+                response = self.breaker.call_sync(lambda: self.model.generate_content(
+                    _refine_prompt(raw_caption),
+                    generation_config=REFINE_GENERATION_CONFIG
+                ))
+                refined = response.text.strip()
+                logger.debug("Gemini refinement: %s", refined)
+                return refined
+            except Exception as e:
+                logger.warning("Gemini refine request failed: %s", e)
 
-                Raw caption: "{raw_caption}"
+        return _heuristic_refine(raw_caption)
 
-                Refined query:
-                """
-                response = self.model.generate_content(
-                    prompt,
-                    generation_config={
-                        "temperature": 0.7,
-                        "max_output_tokens": 60,
-                    }
-                )
+    async def refine_query_async(self, raw_caption: str) -> str:
+        """Async variant of `refine_query`; the Gemini call never blocks the event loop."""
+
+        logger.debug("Refining query from caption: %s", raw_caption)
+
+        await self._ensure_model()
+        if self.model:
+            try:
+                response = await self.breaker.call(lambda: self._generate_async(
+                    _refine_prompt(raw_caption), REFINE_GENERATION_CONFIG
+                ))
                 refined = response.text.strip()
-                print(f"Gemini API success: {refined}")
+                logger.debug("Gemini refinement: %s", refined)
                 return refined
             except Exception as e:
-                print(f"Gemini API request failed: {e}")
-
-        # -----------------
-        # Heuristic fallback
-        # -----------------
-        print("Using heuristic refinement...")
-
-        caption_lower = raw_caption.lower()
-
-        # Clothing type
-        clothing_type = ""
-        if 'shirt' in caption_lower:
-            clothing_type = "button-up shirt" if 'button' in caption_lower else "shirt"
-        elif 'dress' in caption_lower:
-            clothing_type = "dress"
-        elif 'pants' in caption_lower or 'jeans' in caption_lower:
-            clothing_type = "pants"
-        elif 'jacket' in caption_lower:
-            clothing_type = "jacket"
+                logger.warning("Gemini refine request failed: %s", e)
+
+        return _heuristic_refine(raw_caption)
+
+    def refine_batch(self, raw_captions: List[str]) -> List[str]:
+        """Refine several captions, in order. Repeated captions are refined once, and
+        while Gemini is unconfigured or its circuit is open the whole batch goes
+        through the heuristic extractor in one pass.
+        """
+        unique = list(dict.fromkeys(raw_captions))
+        if self.model and self.breaker.state != OPEN:
+            refined = dict(zip(unique, map(self.refine_query, unique)))
+        else:
+            refined = dict(zip(unique, attributes.get_extractor().refine_batch(unique)))
+        return [refined[caption] for caption in raw_captions]
+
+    async def refine_batch_async(self, raw_captions: List[str]) -> List[str]:
+        """Async variant of `refine_batch`; unique captions are refined concurrently."""
+        unique = list(dict.fromkeys(raw_captions))
+        await self._ensure_model()
+        if self.model and self.breaker.state != OPEN:
+            refined = dict(zip(unique, await asyncio.gather(*map(self.refine_query_async, unique))))
         else:
-            clothing_type = "clothing item"
-
-        # Color
-        color = ""
-        for c in ["black", "white", "blue", "red", "green", "grey", "beige", "brown"]:
-            if c in caption_lower:
-                color = c
-                break
-
-        # Style / occasion
-        style = ""
-        if 'formal' in caption_lower or 'office' in caption_lower:
-            style = "formal office wear"
-        elif 'casual' in caption_lower:
-            style = "casual wear"
-        elif 'party' in caption_lower:
-            style = "party wear"
-
-        # Material
-        material = ""
-        if 'cotton' in caption_lower:
-            material = "cotton"
-        elif 'silk' in caption_lower:
-            material = "silk"
-        elif 'denim' in caption_lower:
-            material = "denim"
-        elif 'smooth' in caption_lower or 'fabric' in caption_lower:
-            material = "premium fabric"
-
-        # Sleeve length
-        sleeve = ""
-        if 'long-sleeved' in caption_lower or 'long sleeve' in caption_lower:
-            sleeve = "long sleeve"
-        elif 'short-sleeved' in caption_lower or 'short sleeve' in caption_lower:
-            sleeve = "short sleeve"
-
-        # Build refined query
-        query_parts = [x for x in [color, clothing_type, sleeve, material, style] if x]
-
-        if len(query_parts) < 3:
-            query_parts.extend(["fashion", "clothing", "style"])
-
-        refined = " ".join(query_parts)
-        print(f"Heuristic refinement: {refined}")
-        return refined
+            refined = dict(zip(unique, attributes.get_extractor().refine_batch(unique)))
+        return [refined[caption] for caption in raw_captions]
 
     def caption_image_from_base64(self, image_base64: str) -> str:
         """Generate a short caption for an image provided as a base64 string.
         Tries Gemini Vision if configured; falls back to HuggingFace BLIP if Gemini is unavailable
         or the request fails, and finally to a simple heuristic caption.
         """
-        # Normalize data URL / base64
-        data_url_mime = None
-        if image_base64.startswith("data:"):
-            try:
-                prefix, payload = image_base64.split(",", 1)
-                if prefix.startswith("data:") and ";" in prefix:
-                    data_url_mime = prefix.split(":", 1)[1].split(";", 1)[0]
-                image_base64 = payload
-            except Exception:
-                pass
+        # Normalize data URL / base64, then decode once for every backend
+        image_base64, data_url_mime = _split_data_url(image_base64)
+        try:
+            image_bytes = base64.b64decode(image_base64)
+        except Exception as e:
+            logger.warning("Invalid base64 image: %s", e)
+            return GENERIC_CAPTION
 
         # Try Gemini Vision via the configured model if available
         if self.model:
             try:
-                prompt = (
-                    "Provide a concise one-sentence caption describing the image. "
-                    "Focus on clothing attributes (type, color, sleeve length, material, occasion) "
-                    "and avoid mentioning 'photo' or 'image'."
-                )
+                response = self.breaker.call_sync(lambda: self.model.generate_content(
+                    _caption_contents(image_bytes, data_url_mime),
+                    generation_config=CAPTION_GENERATION_CONFIG
+                ))
+                text = _extract_text(response)
+                if text:
+                    # If the model is asking for the image instead of returning a caption,
+                    # treat as a failure so fallback mechanisms run.
+                    if self._is_requesting_image(text):
+                        logger.warning("Gemini asked for the image instead of returning a caption: %r", text)
+                    else:
+                        return text
+            except Exception as e:
+                logger.warning("Gemini vision request failed: %s", e)
 
-                # Attempt to pass the base64 as an "image" argument if the client supports it.
-                # This is wrapped in try/except to avoid hard-failing on API shape differences.
-                response = None
-                try:
-                    response = self.model.generate_content(
-                        prompt,
-                        image=image_base64,
-                        generation_config={
-                            "temperature": 0.0,
-                            "max_output_tokens": 60,
-                        }
-                    )
-                except TypeError:
-                    # Some client versions expect different arg signatures. Try passing prompt only.
-                    response = self.model.generate_content(
-                        prompt,
-                        generation_config={"temperature": 0.0, "max_output_tokens": 60}
-                    )
-
-                # Normalize response
-                if response is not None:
-                    # prefer .text
-                    text = getattr(response, "text", None)
-
-                    # Try to extract from common container fields if .text isn't present
-                    if not text:
-                        # candidates or outputs may hold text in different SDK versions
-                        candidates = getattr(response, "candidates", None) or getattr(response, "outputs", None)
-                        if candidates and len(candidates) > 0:
-                            first = candidates[0]
-                            if isinstance(first, dict):
-                                text = first.get("content") or first.get("text") or first.get("output")
-                            else:
-                                # object with attributes
-                                text = getattr(first, "content", None) or getattr(first, "text", None)
-
-                    if text:
-                        text = text.strip()
-                        # If the model is asking for the image instead of returning a caption,
-                        # treat as a failure so fallback mechanisms run.
-                        if hasattr(self, "_is_requesting_image") and self._is_requesting_image(text):
-                            print(f"Gemini asked for the image instead of returning a caption: '{text}'")
-                        else:
-                            return text
+        # Hugging Face BLIP fallback when a key is configured
+        if HF_API_KEY:
+            try:
+                caption = self.hf_breaker.call_sync(
+                    lambda: generate_caption_from_bytes(image_bytes, data_url_mime),
+                    succeeded=_is_hf_caption
+                )
+                if _is_hf_caption(caption):
+                    return caption.strip()
+                logger.warning("Hugging Face caption unavailable: %s", caption)
             except Exception as e:
-                print(f"Gemini vision request failed: {e}")
+                logger.warning("Hugging Face caption request failed: %s", e)
 
         # Final heuristic/local Pillow fallback
         try:
             # Use local Pillow-based captioner as a robust fallback
-            return _local_image_caption(image_base64)
+            return _local_image_caption_from_bytes(image_bytes)
         except Exception:
-            return "An image of clothing or a fashion item"
+            return GENERIC_CAPTION
+
+    async def caption_image_async(self, image_bytes, content_type: Optional[str] = None) -> str:
+        """Async variant of `caption_image_from_base64` taking raw image bytes (or a memoryview).
+        Same fallback order (Gemini Vision, Hugging Face BLIP, local Pillow captioner);
+        the local captioner runs in a worker thread so it never blocks the event loop.
+        """
+        await self._ensure_model()
+        if self.model:
+            try:
+                response = await self.breaker.call(lambda: self._generate_async(
+                    _caption_contents(image_bytes, content_type), CAPTION_GENERATION_CONFIG
+                ))
+                text = _extract_text(response)
+                if text:
+                    if self._is_requesting_image(text):
+                        logger.warning("Gemini asked for the image instead of returning a caption: %r", text)
+                    else:
+                        return text
+            except Exception as e:
+                logger.warning("Gemini vision request failed: %s", e)
+
+        if HF_API_KEY:
+            try:
+                caption = await self.hf_breaker.call(
+                    lambda: generate_caption_from_bytes_async(image_bytes, content_type, client=self.hf_client),
+                    succeeded=_is_hf_caption
+                )
+                if _is_hf_caption(caption):
+                    return caption.strip()
+                logger.warning("Hugging Face caption unavailable: %s", caption)
+            except Exception as e:
+                logger.warning("Hugging Face caption request failed: %s", e)
 
+        try:
+            return await asyncio.to_thread(_local_image_caption_from_bytes, image_bytes)
+        except Exception:
+            return GENERIC_CAPTION
+
+    def _generate_async(self, contents, generation_config):
+        if self.rest_endpoint:
+            return asyncio.to_thread(self.model.generate_content, contents, generation_config=generation_config)
+        return self.model.generate_content_async(contents, generation_config=generation_config)
+
+    @staticmethod
     def _is_requesting_image(text: str) -> bool:
         """Return True if the model's response is asking the user to provide or upload an image."""
         if not text:
@@ -210,18 +263,108 @@ class GeminiService:
         ]
         return any(trigger in t for trigger in triggers)
 
+
+def _is_hf_caption(caption) -> bool:
+    """The HF helpers report failures as "Error..."/"Failed..." strings rather than raising."""
+    return bool(caption) and not caption.startswith(("Error", "Failed"))
+
+
+def _refine_prompt(raw_caption: str) -> str:
+    return f"""
+                You are refining image captions into detailed e-commerce product search queries.
+                Include: clothing type, color, sleeve length, fabric/material, and occasion (formal/casual/etc.).
+                Make it useful for searching online shops.
+                Do NOT add extra words like 'photo' or 'image'.
+
+                Raw caption: "{raw_caption}"
+
+                Refined query:
+                """
+
+
+def _heuristic_refine(raw_caption: str) -> str:
+    """Keyword-based refinement used when Gemini is unavailable (see services/attributes.py)."""
+    refined = attributes.get_extractor().refine(raw_caption)
+    logger.debug("Heuristic refinement: %s", refined)
+    return refined
+
+
+def _split_data_url(image_base64: str):
+    """Strip a `data:<mime>;base64,` prefix; returns (payload, mime or None)."""
+    if not image_base64.startswith("data:"):
+        return image_base64, None
+    try:
+        prefix, payload = image_base64.split(",", 1)
+        mime = None
+        if ";" in prefix:
+            mime = prefix.split(":", 1)[1].split(";", 1)[0]
+        return payload, mime
+    except Exception:
+        return image_base64, None
+
+
+def _caption_contents(image_bytes, content_type: Optional[str] = None) -> list:
+    """Build a Gemini multimodal request: the caption prompt plus an inline image part.
+    The SDK serializes the raw bytes itself, so no base64 happens on our side.
+    """
+    mime = content_type or _detect_content_type(image_bytes)
+    return [CAPTION_PROMPT, {"mime_type": mime, "data": bytes(image_bytes)}]
+
+
+def _extract_text(response) -> Optional[str]:
+    """Normalize the caption text out of a Gemini response across SDK versions."""
+    if response is None:
+        return None
+    # prefer .text
+    try:
+        text = getattr(response, "text", None)
+    except Exception:
+        text = None
+
+    # Try to extract from common container fields if .text isn't present
+    if not text:
+        # candidates or outputs may hold text in different SDK versions
+        candidates = getattr(response, "candidates", None) or getattr(response, "outputs", None)
+        if candidates and len(candidates) > 0:
+            first = candidates[0]
+            if isinstance(first, dict):
+                text = first.get("content") or first.get("text") or first.get("output")
+            else:
+                # object with attributes
+                text = getattr(first, "content", None) or getattr(first, "text", None)
+
+    if text and isinstance(text, str):
+        return text.strip()
+    return None
+
+
+def import_sdk():
+    """google.generativeai, imported on first use: it dominates the app's import time."""
+    import google.generativeai as genai
+    return genai
+
+
+_shared_service = None
+
+
+def _get_shared_service() -> GeminiService:
+    """Build the module-level GeminiService once so the model is configured a single time."""
+    global _shared_service
+    if _shared_service is None:
+        _shared_service = GeminiService()
+    return _shared_service
+
+
 def refine_query(raw_caption: str) -> str:
     """Module-level convenience wrapper used by other modules to refine captions.
     Keeps backward-compatible API: `from services.gemini import refine_query`.
     """
-    service = GeminiService()
-    return service.refine_query(raw_caption)
+    return _get_shared_service().refine_query(raw_caption)
 
 
 # Module-level convenience wrapper
 def caption_image_from_base64(image_base64: str) -> str:
-    service = GeminiService()
-    return service.caption_image_from_base64(image_base64)
+    return _get_shared_service().caption_image_from_base64(image_base64)
 
 
 def _local_image_caption(image_base64: str) -> str:
@@ -232,58 +375,18 @@ def _local_image_caption(image_base64: str) -> str:
         # If data URL, strip prefix
         if image_base64.startswith("data:"):
             image_base64 = image_base64.split(",", 1)[1]
-        img_bytes = base64.b64decode(image_base64)
-        img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-
-        # Resize for speed
-        thumb = img.copy()
-        thumb.thumbnail((200, 200))
-
-        # Determine dominant color by simple averaging
-        pixels = list(thumb.getdata())
-        r = sum([p[0] for p in pixels]) / len(pixels)
-        g = sum([p[1] for p in pixels]) / len(pixels)
-        b = sum([p[2] for p in pixels]) / len(pixels)
-
-        # Map to simple color names
-        def _nearest_color_name(r, g, b):
-            colors = {
-                'black': (0,0,0),
-                'white': (255,255,255),
-                'red': (220,20,60),
-                'blue': (30,144,255),
-                'green': (34,139,34),
-                'beige': (245,245,220),
-                'brown': (160,82,45),
-                'grey': (128,128,128),
-                'yellow': (255,215,0),
-                'pink': (255,105,180),
-                'purple': (128,0,128)
-            }
-            best = None
-            best_dist = None
-            for name, (cr,cg,cb) in colors.items():
-                d = (r-cr)**2 + (g-cg)**2 + (b-cb)**2
-                if best_dist is None or d < best_dist:
-                    best = name
-                    best_dist = d
-            return best
-
-        color_name = _nearest_color_name(r, g, b) or 'colored'
-
-        # Detect pattern vs solid using edge density
-        edges = thumb.convert('L').filter(ImageFilter.FIND_EDGES)
-        bbox = edges.getbbox()
-        nonzero = sum(1 for px in edges.getdata() if px > 20)
-        density = nonzero / (edges.width * edges.height)
-        pattern = 'patterned' if density > 0.04 else 'solid'
-
-        # Rough shape heuristic (aspect ratio)
-        w,h = img.size
-        aspect = h / (w + 1e-6)
-        likely = 'shirt' if aspect < 1.6 else 'dress' if aspect > 1.6 else 'garment'
-
-        caption = f"A {pattern} {color_name} {likely}"
-        return caption
+        return _local_image_caption_from_bytes(base64.b64decode(image_base64))
     except Exception as e:
-        return "An image of clothing or a fashion item"
+        return GENERIC_CAPTION
+
+
+def _local_image_caption_from_bytes(img_bytes) -> str:
+    """Bytes-based core of `_local_image_caption`; accepts bytes or a memoryview.
+    See services/local_caption.py (NumPy palette + edge density).
+    """
+    return local_caption.caption_image(img_bytes) or GENERIC_CAPTION
+
+
+def _local_image_caption_batch(images) -> list:
+    """Caption several images with one batched palette pass."""
+    return [caption or GENERIC_CAPTION for caption in local_caption.caption_batch(images)]
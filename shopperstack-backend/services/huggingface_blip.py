@@ -1,16 +1,22 @@
+import logging
 import os
 import time
+import random
+import asyncio
+import threading
 import requests
+import httpx
 import base64
-from dotenv import load_dotenv
-from typing import Optional, List
+from typing import Dict, Optional, List
 
-# Load environment variables
-load_dotenv()
+from utils import config
+from utils.rate_limit import RateLimitedError, get_limiter, retry_after_seconds
 
 # Hugging Face Access Token
 HF_API_KEY = os.getenv("HF_API_KEY")
 
+logger = logging.getLogger(__name__)
+
 # Read model from env (trim whitespace) or use default
 _env_model = (os.getenv("HF_BLIP_MODEL") or "Salesforce/blip-image-captioning-large").strip()
 
@@ -33,9 +39,11 @@ def _build_headers(content_type: Optional[str] = None) -> dict:
     return headers
 
 
-def _detect_content_type(image_bytes: bytes, data_url_mime: Optional[str] = None) -> str:
+def _detect_content_type(image_bytes, data_url_mime: Optional[str] = None) -> str:
+    """Sniff the image type from its magic bytes; accepts any bytes-like prefix."""
     if data_url_mime:
         return data_url_mime
+    image_bytes = bytes(image_bytes[:16])
     if image_bytes.startswith(b"\xff\xd8\xff"):
         return "image/jpeg"
     if image_bytes.startswith(b"\x89PNG\r\n\x1a\n"):
@@ -50,62 +58,160 @@ def _detect_content_type(image_bytes: bytes, data_url_mime: Optional[str] = None
 
 
 def _hf_url(model_id: str) -> str:
-    return f"https://api-inference.huggingface.co/models/{model_id}"
+    return f"{config.HF_INFERENCE_URL}/models/{model_id}"
+
+
+class ModelCooloff:
+    """Caption models that recently returned 404 or kept failing with 5xx.
+
+    Marked models are skipped until their cool-off ends, so every request
+    doesn't pay for the same dead endpoints. Shared by the sync and async paths.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._until: Dict[str, float] = {}
+        self._reasons: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+
+    def mark(self, model_id: str, reason: str) -> None:
+        with self._lock:
+            self._until[model_id] = time.monotonic() + self.seconds
+            self._reasons[model_id] = reason
+        logger.warning("Hugging Face model %s cooling off for %.0fs (%s)", model_id, self.seconds, reason)
+
+    def available(self, models: List[str]) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            usable = [m for m in models if self._until.get(m, 0.0) <= now]
+            self.skipped += len(models) - len(usable)
+            return usable
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "skipped": self.skipped,
+                "cooling_off": {
+                    m: {"reason": self._reasons[m], "seconds_left": round(until - now, 1)}
+                    for m, until in self._until.items() if until > now
+                },
+            }
+
+
+model_cooloff = ModelCooloff(config.HF_MODEL_COOLOFF)
+
+
+def _candidate_models() -> List[str]:
+    """HF_MODEL_CANDIDATES in order, without blanks, duplicates or cooling-off models."""
+    models = list(dict.fromkeys(m.strip() for m in HF_MODEL_CANDIDATES if m and m.strip()))
+    return model_cooloff.available(models)
 
 
-def _post_with_retries(image_bytes: bytes, content_type: str, model_id: str, max_retries: int = 3, timeout: int = 60):
+def _backoff(attempt: int) -> float:
+    # Full jitter so concurrent requests don't retry in lockstep
+    return random.uniform(0, config.HF_BACKOFF_BASE * (2 ** attempt))
+
+
+def _note_failure(model_id: str, status: int) -> None:
+    """Cool off a model that doesn't exist (404) or is persistently failing (5xx after retries)."""
+    if status == 404:
+        model_cooloff.mark(model_id, "404")
+    elif status >= 500:
+        model_cooloff.mark(model_id, f"persistent {status}")
+
+
+def _post_with_retries(image_bytes: bytes, content_type: str, model_id: str, max_retries: Optional[int] = None,
+                       timeout: Optional[float] = None, session: Optional[requests.Session] = None,
+                       deadline: Optional[float] = None):
+    """POST one model with bounded retries. `deadline` is a time.monotonic() instant
+    that caps every timeout and backoff sleep.
+
+    Every attempt takes a token from the shared Hugging Face rate limiter. A 429
+    pauses that limiter for the Retry-After, so the retry (and every other
+    caller) waits its turn there instead of sleeping on its own. Raises
+    RateLimitedError when the limiter refuses the first attempt.
+    """
     if not HF_API_KEY:
         return None, 0, "Error: Hugging Face API key not found. Set HF_API_KEY in .env.", model_id
 
+    max_retries = config.HF_MAX_RETRIES if max_retries is None else max_retries
+    timeout = config.HF_REQUEST_TIMEOUT if timeout is None else timeout
+    limiter = get_limiter("huggingface")
     last_err_text = None
+    last_status = 0
     url = _hf_url(model_id)
+    # Reuse the caller's pooled keep-alive session when provided
+    http = session or requests
     for attempt in range(max_retries):
+        remaining = timeout if deadline is None else min(timeout, deadline - time.monotonic())
+        if remaining <= 0:
+            return None, 0, last_err_text or "Deadline exceeded", model_id
+        if limiter is not None:
+            try:
+                limiter.acquire_sync(timeout=remaining)
+            except RateLimitedError:
+                if attempt == 0:
+                    raise
+                break
+            remaining = timeout if deadline is None else min(timeout, deadline - time.monotonic())
+        retry_after = None
         try:
-            resp = requests.post(url, headers=_build_headers(content_type), data=image_bytes, timeout=timeout)
+            resp = http.post(url, headers=_build_headers(content_type), data=image_bytes, timeout=remaining)
             if resp.status_code == 200:
                 return resp, resp.status_code, None, model_id
             last_err_text = resp.text
-            # retry on transient 5xx
-            if resp.status_code >= 500:
-                time.sleep(1.5 ** attempt)
-                continue
-            # otherwise stop
-            return resp, resp.status_code, last_err_text, model_id
+            last_status = resp.status_code
+            if resp.status_code == 429:
+                retry_after = retry_after_seconds(resp.headers, _backoff(attempt))
+                if limiter is not None:
+                    limiter.pause(retry_after)
+                    continue
+            # otherwise stop; only transient 5xx (and 429s) are retried
+            elif resp.status_code < 500:
+                _note_failure(model_id, resp.status_code)
+                return resp, resp.status_code, last_err_text, model_id
         except Exception as e:
             last_err_text = str(e)
-            time.sleep(1.5 ** attempt)
+        if attempt + 1 < max_retries:
+            pause = _backoff(attempt) if retry_after is None else retry_after
+            if deadline is not None:
+                pause = min(pause, max(0.0, deadline - time.monotonic()))
+            time.sleep(pause)
+    _note_failure(model_id, last_status)
     return None, 0, last_err_text or "Unknown error", model_id
 
 
-def _caption_via_models(image_bytes: bytes, content_type: str):
-    """Try each candidate model until one returns 200; return (response, status, err, model_used)."""
-    tried = []
-    for m in HF_MODEL_CANDIDATES:
-        m = m.strip()
-        if not m or m in tried:
-            continue
-        resp, status, err, used = _post_with_retries(image_bytes, content_type, m)
+def _caption_via_models(image_bytes: bytes, content_type: str, session: Optional[requests.Session] = None):
+    """Try each candidate model in turn until one returns 200, within HF_CAPTION_DEADLINE;
+    return (response, status, err, model_used). Blocking callers can't race models, so
+    this is sequential; the async path races them (see `_caption_via_models_async`).
+    """
+    models = _candidate_models()
+    if not models:
+        return None, 0, "All caption models are cooling off", None
+    deadline = time.monotonic() + config.HF_CAPTION_DEADLINE
+    err = None
+    for m in models:
+        if time.monotonic() >= deadline:
+            err = err or "Deadline exceeded"
+            break
+        try:
+            resp, status, err, used = _post_with_retries(image_bytes, content_type, m, session=session,
+                                                         deadline=deadline)
+        except RateLimitedError:
+            # Never reached Hugging Face; let the caller take its fallback
+            if err is None:
+                raise
+            break
         if resp is not None and status == 200:
             return resp, status, None, used
-        # If 404, keep trying next model automatically
-        tried.append(m)
-    return None, 0, f"All models failed. Last error: {err}", HF_MODEL_CANDIDATES[-1]
-
-
-# Public helpers
+    return None, 0, f"All models failed. Last error: {err}", models[-1]
 
-def generate_caption(image_path: str) -> str:
-    if not HF_API_KEY:
-        return "Error: Hugging Face API key not found. Set HF_API_KEY in .env."
-
-    with open(image_path, "rb") as f:
-        image_bytes = f.read()
-
-    content_type = _detect_content_type(image_bytes)
-    resp, status, err, model_used = _caption_via_models(image_bytes, content_type)
-    if not resp:
-        return f"Failed to generate caption: {err} (model tried: {model_used})"
 
+def _parse_caption_response(resp) -> str:
+    """Extract caption text from a requests or httpx response."""
     try:
         data = resp.json()
         if isinstance(data, list) and len(data) > 0:
@@ -127,7 +233,132 @@ def generate_caption(image_path: str) -> str:
         return f"Error parsing response: {e}"
 
 
-def generate_caption_from_base64(image_base64: str) -> str:
+async def _post_with_retries_async(client: httpx.AsyncClient, image_bytes: bytes, content_type: str, model_id: str,
+                                   max_retries: Optional[int] = None, timeout: Optional[float] = None,
+                                   deadline: Optional[float] = None):
+    """Async variant of `_post_with_retries`; rate-limit waits and backoff never block."""
+    if not HF_API_KEY:
+        return None, 0, "Error: Hugging Face API key not found. Set HF_API_KEY in .env.", model_id
+
+    max_retries = config.HF_MAX_RETRIES if max_retries is None else max_retries
+    timeout = config.HF_REQUEST_TIMEOUT if timeout is None else timeout
+    limiter = get_limiter("huggingface")
+    last_err_text = None
+    last_status = 0
+    url = _hf_url(model_id)
+    for attempt in range(max_retries):
+        remaining = timeout if deadline is None else min(timeout, deadline - time.monotonic())
+        if remaining <= 0:
+            return None, 0, last_err_text or "Deadline exceeded", model_id
+        if limiter is not None:
+            try:
+                await limiter.acquire(timeout=remaining)
+            except RateLimitedError:
+                if attempt == 0:
+                    raise
+                break
+            remaining = timeout if deadline is None else min(timeout, deadline - time.monotonic())
+        retry_after = None
+        try:
+            resp = await client.post(url, headers=_build_headers(content_type), content=image_bytes, timeout=remaining)
+            if resp.status_code == 200:
+                return resp, resp.status_code, None, model_id
+            last_err_text = resp.text
+            last_status = resp.status_code
+            if resp.status_code == 429:
+                retry_after = retry_after_seconds(resp.headers, _backoff(attempt))
+                if limiter is not None:
+                    limiter.pause(retry_after)
+                    continue
+            # otherwise stop; only transient 5xx (and 429s) are retried
+            elif resp.status_code < 500:
+                _note_failure(model_id, resp.status_code)
+                return resp, resp.status_code, last_err_text, model_id
+        except Exception as e:
+            last_err_text = str(e)
+        if attempt + 1 < max_retries:
+            pause = _backoff(attempt) if retry_after is None else retry_after
+            if deadline is not None:
+                pause = min(pause, max(0.0, deadline - time.monotonic()))
+            await asyncio.sleep(pause)
+    _note_failure(model_id, last_status)
+    return None, 0, last_err_text or "Unknown error", model_id
+
+
+async def _caption_via_models_async(client: httpx.AsyncClient, image_bytes: bytes, content_type: str,
+                                    budget: Optional[float] = None, hedge_delay: Optional[float] = None):
+    """Race the candidate models under one overall deadline of `budget` seconds
+    (HF_CAPTION_DEADLINE by default).
+
+    The preferred model starts first; the next candidate is launched after
+    `hedge_delay` seconds, or at once when a running model fails. The first 200
+    wins and every other in-flight request is cancelled.
+    """
+    models = _candidate_models()
+    if not models:
+        return None, 0, "All caption models are cooling off", None
+    deadline = time.monotonic() + (config.HF_CAPTION_DEADLINE if budget is None else budget)
+    hedge_delay = config.HF_HEDGE_DELAY if hedge_delay is None else hedge_delay
+
+    waiting = list(models)
+    running = set()
+    next_launch = time.monotonic()
+    err = None
+    shed = None
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                err = err or "Deadline exceeded"
+                break
+            if waiting and (not running or now >= next_launch):
+                model_id = waiting.pop(0)
+                running.add(asyncio.ensure_future(_post_with_retries_async(
+                    client, image_bytes, content_type, model_id, deadline=deadline
+                )))
+                next_launch = now + hedge_delay
+                continue
+            if not running:
+                break
+            wake_at = min(deadline, next_launch) if waiting else deadline
+            done, running = await asyncio.wait(
+                running, timeout=max(0.0, wake_at - now), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                try:
+                    resp, status, task_err, used = task.result()
+                except RateLimitedError as e:
+                    # No quota for more attempts: let the running models finish, start no more
+                    shed = e
+                    waiting.clear()
+                    continue
+                if resp is not None and status == 200:
+                    return resp, status, None, used
+                err = task_err
+                # A failure frees its slot; start the next candidate without waiting out the hedge delay
+                next_launch = now
+    finally:
+        for task in running:
+            task.cancel()
+    if shed is not None and err is None:
+        # Never reached Hugging Face; let the caller take its fallback
+        raise shed
+    return None, 0, f"All models failed. Last error: {err}", models[-1]
+
+
+# Public helpers
+
+def generate_caption(image_path: str, session: Optional[requests.Session] = None) -> str:
+    if not HF_API_KEY:
+        return "Error: Hugging Face API key not found. Set HF_API_KEY in .env."
+
+    with open(image_path, "rb") as f:
+        image_bytes = f.read()
+
+    return generate_caption_from_bytes(image_bytes, session=session)
+
+
+def generate_caption_from_base64(image_base64: str, session: Optional[requests.Session] = None) -> str:
     if not HF_API_KEY:
         return "Error: Hugging Face API key not found. Set HF_API_KEY in .env."
 
@@ -146,27 +377,43 @@ def generate_caption_from_base64(image_base64: str) -> str:
     except Exception as e:
         return f"Error decoding base64 image: {e}"
 
-    content_type = _detect_content_type(image_bytes, data_url_mime)
-    resp, status, err, model_used = _caption_via_models(image_bytes, content_type)
+    return generate_caption_from_bytes(image_bytes, _detect_content_type(image_bytes, data_url_mime), session=session)
+
+
+def generate_caption_from_bytes(image_bytes: bytes, content_type: Optional[str] = None,
+                                session: Optional[requests.Session] = None) -> str:
+    """Caption raw image bytes; the request body is the binary image, no base64 involved.
+    Raises RateLimitedError when the Hugging Face rate limiter is saturated.
+    """
+    if not HF_API_KEY:
+        return "Error: Hugging Face API key not found. Set HF_API_KEY in .env."
+
+    content_type = content_type or _detect_content_type(image_bytes)
+    resp, status, err, model_used = _caption_via_models(bytes(image_bytes), content_type, session=session)
     if not resp:
         return f"Failed to generate caption: {err} (model tried: {model_used})"
 
-    try:
-        data = resp.json()
-        if isinstance(data, list) and len(data) > 0:
-            first = data[0]
-            if isinstance(first, dict) and "generated_text" in first:
-                return first["generated_text"]
-            if isinstance(first, str):
-                return first
-        if isinstance(data, dict):
-            if "generated_text" in data:
-                return data["generated_text"]
-            if "text" in data:
-                return data["text"]
-        text = resp.text.strip()
-        if text:
-            return text
-        return "No caption generated"
-    except Exception as e:
-        return f"Error parsing response: {e}"
+    return _parse_caption_response(resp)
+
+
+async def generate_caption_from_bytes_async(image_bytes: bytes, content_type: Optional[str] = None,
+                                            client: Optional[httpx.AsyncClient] = None) -> str:
+    """Caption raw image bytes without blocking the event loop.
+    Pass the shared pooled `client`; a short-lived one is created otherwise.
+    Raises RateLimitedError when the Hugging Face rate limiter is saturated.
+    """
+    if not HF_API_KEY:
+        return "Error: Hugging Face API key not found. Set HF_API_KEY in .env."
+
+    content_type = content_type or _detect_content_type(image_bytes)
+    # httpx needs a bytes body; this is a no-op unless the caller passed a memoryview
+    image_bytes = bytes(image_bytes)
+    if client is None:
+        async with httpx.AsyncClient() as own_client:
+            resp, status, err, model_used = await _caption_via_models_async(own_client, image_bytes, content_type)
+    else:
+        resp, status, err, model_used = await _caption_via_models_async(client, image_bytes, content_type)
+    if not resp:
+        return f"Failed to generate caption: {err} (model tried: {model_used})"
+
+    return _parse_caption_response(resp)
@@ -0,0 +1,134 @@
+"""Compact image descriptors for visual similarity search.
+
+`embed_images` turns encoded images into L2-normalized float32 vectors of
+`FEATURE_DIM` values, so the cosine similarity of two images is the dot
+product of their vectors. Each vector concatenates three blocks:
+
+- color: a joint 4x4x4 RGB histogram, weighted towards the center of the
+  frame where the product usually is (square-rooted, i.e. Hellinger)
+- edges: gradient orientation histograms (8 bins) over a 2x2 grid, which
+  tells stripes from checks from plain fabric
+- layout: the mean brightness of a 4x4 grid, mean-centered, for silhouette
+
+Images are decoded at reduced scale and resampled to one fixed size, so a
+batch stacks into one array and every block is computed for the whole batch
+at once.
+
+Any callable with the same signature (encoded images in, `(n, dim)` float32
+out) can replace it; see `load_embedder`.
+"""
+import importlib
+import io
+import logging
+from typing import Callable, List, Sequence
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+SIDE = 64
+COLOR_LEVELS = 4
+ORIENTATIONS = 8
+EDGE_GRID = 2
+LAYOUT_GRID = 4
+
+COLOR_DIM = COLOR_LEVELS ** 3
+EDGE_DIM = ORIENTATIONS * EDGE_GRID * EDGE_GRID
+LAYOUT_DIM = LAYOUT_GRID * LAYOUT_GRID
+FEATURE_DIM = COLOR_DIM + EDGE_DIM + LAYOUT_DIM
+
+# Relative weight of each block in the final cosine similarity
+BLOCK_WEIGHTS = (0.7, 0.5, 0.5)
+
+Embedder = Callable[[Sequence[bytes]], np.ndarray]
+
+
+def _center_weights(side: int) -> np.ndarray:
+    axis = (np.arange(side, dtype=np.float32) + 0.5) / side - 0.5
+    return np.exp(-(axis[:, None] ** 2 + axis[None, :] ** 2) / (2 * 0.3 ** 2)).reshape(-1)
+
+
+_CENTER = _center_weights(SIDE)
+
+
+def decode(image_bytes) -> np.ndarray:
+    """Decode one image to a (SIDE, SIDE, 3) uint8 array, flattening transparency onto white."""
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        # JPEG can decode straight at a fraction of full scale
+        img.draft("RGB", (SIDE * 2, SIDE * 2))
+        if img.mode in ("RGBA", "LA", "P"):
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        return np.asarray(img.convert("RGB").resize((SIDE, SIDE), Image.BILINEAR))
+
+
+def _normalize(block: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    return block / np.maximum(norms, 1e-12)
+
+
+def features(pixels: np.ndarray) -> np.ndarray:
+    """Descriptors for a batch of decoded images shaped (n, SIDE, SIDE, 3)."""
+    pixels = np.asarray(pixels)
+    n = pixels.shape[0]
+    if n == 0:
+        return np.zeros((0, FEATURE_DIM), dtype=np.float32)
+    flat = pixels.reshape(n, -1, 3)
+
+    # Color: one bincount over (image, bin) ids fills every histogram in the batch
+    levels = (flat // (256 // COLOR_LEVELS)).astype(np.int64)
+    bins = (levels[..., 0] * COLOR_LEVELS + levels[..., 1]) * COLOR_LEVELS + levels[..., 2]
+    ids = (bins + (np.arange(n) * COLOR_DIM)[:, None]).reshape(-1)
+    color = np.bincount(ids, weights=np.tile(_CENTER, n), minlength=n * COLOR_DIM).reshape(n, COLOR_DIM)
+    color = np.sqrt(color / color.sum(axis=1, keepdims=True))
+
+    # Edges: orientation histograms of the luminance gradient, per grid cell
+    gray = pixels.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    gx = np.zeros_like(gray)
+    gy = np.zeros_like(gray)
+    gx[:, :, 1:-1] = gray[:, :, 2:] - gray[:, :, :-2]
+    gy[:, 1:-1, :] = gray[:, 2:, :] - gray[:, :-2, :]
+    magnitude = np.hypot(gx, gy)
+    # Unsigned orientation: a dark-to-light edge and a light-to-dark one look the same
+    angle = np.mod(np.arctan2(gy, gx), np.pi)
+    orientation = np.minimum((angle / np.pi * ORIENTATIONS).astype(np.int64), ORIENTATIONS - 1)
+    cell = SIDE // EDGE_GRID
+    rows = (np.arange(SIDE) // cell)[:, None] * EDGE_GRID + (np.arange(SIDE) // cell)[None, :]
+    edge_ids = (rows[None] * ORIENTATIONS + orientation + (np.arange(n) * EDGE_DIM)[:, None, None]).reshape(-1)
+    edges = np.bincount(edge_ids, weights=magnitude.reshape(-1), minlength=n * EDGE_DIM).reshape(n, EDGE_DIM)
+
+    # Layout: coarse brightness map relative to the image's own mean
+    step = SIDE // LAYOUT_GRID
+    layout = gray.reshape(n, LAYOUT_GRID, step, LAYOUT_GRID, step).mean(axis=(2, 4)).reshape(n, LAYOUT_DIM)
+    layout -= layout.mean(axis=1, keepdims=True)
+
+    blocks = [_normalize(block) * weight for block, weight in zip((color, edges, layout), BLOCK_WEIGHTS)]
+    return _normalize(np.concatenate(blocks, axis=1)).astype(np.float32)
+
+
+def embed_images(images: Sequence[bytes]) -> np.ndarray:
+    """The default embedder: descriptors for encoded images. Images Pillow cannot
+    decode get an all-zero vector, which matches nothing.
+    """
+    decoded: List[np.ndarray] = []
+    failed = []
+    for i, image_bytes in enumerate(images):
+        try:
+            decoded.append(decode(image_bytes))
+        except Exception as e:
+            logger.debug("Could not decode image %d for embedding: %s", i, e)
+            decoded.append(np.zeros((SIDE, SIDE, 3), dtype=np.uint8))
+            failed.append(i)
+    vectors = features(np.stack(decoded)) if decoded else np.zeros((0, FEATURE_DIM), dtype=np.float32)
+    vectors[failed] = 0.0
+    return vectors
+
+
+def load_embedder(spec: str = "") -> Embedder:
+    """Resolve an embedder from a `module:function` spec; empty means `embed_images`."""
+    if not spec:
+        return embed_images
+    module_name, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attribute or "embed_images")
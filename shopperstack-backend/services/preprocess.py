@@ -0,0 +1,95 @@
+import asyncio
+import io
+import logging
+import time
+from concurrent.futures import Executor
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name -> MIME type of the re-encoded image
+OUTPUT_FORMATS = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+def preprocess_image(image_bytes: bytes, max_edge: int = 1024, output_format: str = "JPEG",
+                     quality: int = 85) -> Tuple[bytes, str, Dict]:
+    """Normalize an upload for the vision providers.
+
+    Applies the EXIF orientation, drops EXIF and other metadata, shrinks the
+    longest edge to `max_edge` and re-encodes as JPEG or WebP. Returns
+    `(bytes, content_type, stats)`. If the image needed no rotation or resizing
+    and re-encoding would make it bigger, the original bytes are kept.
+
+    Runs in a worker process, so it takes and returns plain picklable values.
+    """
+    started = time.perf_counter()
+    output_format = output_format.upper()
+    if output_format not in OUTPUT_FORMATS:
+        output_format = "JPEG"
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        source_format = img.format
+        had_exif = bool(img.getexif())
+        img = ImageOps.exif_transpose(img)  # also loads the first frame of animations
+        original_size = img.size
+
+        if max_edge and max(img.size) > max_edge:
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        if img.mode not in ("RGB", "L") and not (output_format == "WEBP" and img.mode == "RGBA"):
+            if img.mode in ("RGBA", "LA", "P"):
+                # Flatten transparency onto white rather than black
+                rgba = img.convert("RGBA")
+                flat = Image.new("RGB", rgba.size, (255, 255, 255))
+                flat.paste(rgba, mask=rgba.getchannel("A"))
+                img = flat
+            else:
+                img = img.convert("RGB")
+
+        out = io.BytesIO()
+        # No exif= argument: metadata is never written back out
+        img.save(out, format=output_format, quality=quality, optimize=output_format == "JPEG")
+        processed = out.getvalue()
+        size = img.size
+
+    changed = had_exif or size != original_size
+    if not changed and len(processed) >= len(image_bytes) and source_format in OUTPUT_FORMATS:
+        processed, content_type = image_bytes, OUTPUT_FORMATS[source_format]
+    else:
+        content_type = OUTPUT_FORMATS[output_format]
+
+    return processed, content_type, {
+        "original_bytes": len(image_bytes),
+        "processed_bytes": len(processed),
+        "bytes_saved": len(image_bytes) - len(processed),
+        "original_size": list(original_size),
+        "size": list(size),
+        "content_type": content_type,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+async def preprocess_image_async(image_bytes, content_type: Optional[str] = None,
+                                 executor: Optional[Executor] = None, max_edge: int = 1024,
+                                 output_format: str = "JPEG", quality: int = 85) -> Tuple[object, Optional[str], Dict]:
+    """Run `preprocess_image` in `executor` (a process pool) without blocking the event loop.
+
+    Images Pillow cannot decode are passed through unchanged with the error in
+    the stats, so a bad preprocess never fails the caption.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        # Worker processes need a picklable bytes object, not a memoryview
+        return await loop.run_in_executor(
+            executor, preprocess_image, bytes(image_bytes), max_edge, output_format, quality
+        )
+    except Exception as e:
+        logger.warning("Image preprocessing skipped: %s", e)
+        return image_bytes, content_type, {
+            "original_bytes": len(image_bytes),
+            "processed_bytes": len(image_bytes),
+            "bytes_saved": 0,
+            "error": str(e),
+        }
@@ -0,0 +1,174 @@
+import math
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+# Query parameters that only identify the referrer/campaign, never the product
+TRACKING_PARAMS = {
+    "gclid", "gclsrc", "dclid", "fbclid", "msclkid", "yclid", "igshid", "srsltid",
+    "mc_cid", "mc_eid", "ref", "ref_", "referrer", "source", "affid", "aff_id",
+    "affiliate", "cmpid", "campaign", "_ga", "_gl", "spm", "trk", "tracking_id",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "pf_rd_", "sb_")
+
+# Words that carry no product signal in titles or queries
+STOPWORDS = {
+    "a", "an", "and", "the", "for", "of", "in", "on", "with", "to", "by", "at",
+    "from", "or", "is", "buy", "online", "shop", "new", "best", "sale",
+}
+
+# ASCII punctuation/whitespace -> space, so str.split() tokenizes at C speed
+_SEPARATORS = str.maketrans({c: " " for c in map(chr, range(128)) if not c.isalnum()})
+
+# Title tokens count this many times more than snippet tokens
+TITLE_WEIGHT = 2
+
+# Token that delimits documents when the whole batch is tokenized at once
+_DOC_SEPARATOR = "zzdocsepzz"
+
+
+@lru_cache(maxsize=16384)
+def canonicalize_url(url: str) -> str:
+    """Normalize a product URL so the same page from different referrers compares equal.
+    Memoized: cached search results hand the same links to every request.
+    """
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = []
+    if parts.query:
+        query = [
+            (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+        ]
+        query.sort()
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https" if parts.scheme in ("http", "https", "") else parts.scheme,
+                       host, path, urlencode(query), ""))
+
+
+def _split_tokens(text: str) -> List[str]:
+    return text.lower().translate(_SEPARATORS).split()
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _split_tokens(text or "") if t not in STOPWORDS]
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def score_results(query: str, items: List[Dict]) -> np.ndarray:
+    """TF-IDF cosine relevance of every item against `query`, computed over the whole batch.
+
+    The batch is lower-cased and tokenized in a single pass; documents are
+    delimited by a sentinel token, so term frequencies, document frequencies and
+    query dot products are all array reductions over the token stream.
+    """
+    n = len(items)
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    # Titles are repeated TITLE_WEIGHT times so they count more than snippets
+    texts = []
+    for item in items:
+        title = item.get("title") or ""
+        snippet = item.get("snippet") or item.get("content") or item.get("description") or ""
+        texts.append(f"{title} " * TITLE_WEIGHT + snippet)
+    tokens = _split_tokens(f" {_DOC_SEPARATOR} ".join(texts))
+
+    vocab = {tok: i for i, tok in enumerate(dict.fromkeys(tokens))}
+    query_ids = [vocab[t] for t in set(tokenize(query)) if t in vocab]
+    if not query_ids:
+        return np.zeros(n, dtype=np.float32)
+
+    ids = np.fromiter(map(vocab.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+    vocab_size = len(vocab)
+
+    # Document index of every token; separators and stopwords are then dropped
+    separator_id = vocab.get(_DOC_SEPARATOR, -1)
+    is_separator = ids == separator_id
+    doc_of_token = np.cumsum(is_separator)
+    ignored = np.zeros(vocab_size, dtype=bool)
+    ignored[[vocab[w] for w in STOPWORDS if w in vocab]] = True
+    keep = ~is_separator & ~ignored[ids]
+    ids = ids[keep]
+    doc_of_token = doc_of_token[keep]
+
+    # Collapse repeated (doc, term) pairs into term frequencies
+    uniq, tf = np.unique(doc_of_token * vocab_size + ids, return_counts=True)
+    doc = uniq // vocab_size
+    term = uniq % vocab_size
+
+    df = np.bincount(term, minlength=vocab_size).astype(np.float32)
+    idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+    tfidf = (1.0 + np.log(tf.astype(np.float32))) * idf[term]
+
+    doc_norm = np.sqrt(np.bincount(doc, weights=tfidf * tfidf, minlength=n))
+    query_weight = np.zeros(vocab_size, dtype=np.float32)
+    query_weight[query_ids] = idf[query_ids]
+    query_norm = math.sqrt(float(np.dot(query_weight, query_weight)))
+
+    dot = np.bincount(doc, weights=tfidf * query_weight[term], minlength=n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.where(doc_norm > 0, dot / (doc_norm * query_norm), 0.0)
+    return scores.astype(np.float32)
+
+
+def rank_results(query: str, items: List[Dict], top_k: int = 20, min_score: float = 0.05,
+                 duplicate_threshold: float = 0.8, seen_urls: Optional[Set[str]] = None,
+                 weights: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """Merge multi-provider results: drop duplicate links and near-duplicate titles,
+    score against the refined query and return the top-k, best first.
+
+    Returned items are shallow copies with a `score` in [0, 1]; inputs (which may be
+    shared through the search cache) are never mutated. Pass `seen_urls` to also
+    skip canonical URLs emitted earlier (it is updated in place). `weights` scales
+    the score of items by their `provider` (capped at 1).
+    """
+    items = [item for item in items if isinstance(item, dict)]
+    if not items:
+        return []
+
+    scores = score_results(query, items)
+    if weights:
+        factors = np.array([weights.get(item.get("provider"), 1.0) for item in items], dtype=np.float32)
+        scores = np.minimum(scores * factors, 1.0)
+    order = np.argsort(-scores, kind="stable")
+
+    # Only filter out irrelevant items when something relevant exists
+    if scores.size and scores[order[0]] >= min_score:
+        order = order[scores[order] >= min_score]
+
+    seen = seen_urls if seen_urls is not None else set()
+    accepted_titles: List[frozenset] = []
+    ranked: List[Dict] = []
+    for idx in order:
+        item = items[idx]
+        link = item.get("link") or item.get("url") or ""
+        canonical = canonicalize_url(link)
+        if canonical and canonical in seen:
+            continue
+
+        signature = frozenset(tokenize(item.get("title", "")))
+        if any(_jaccard(signature, other) >= duplicate_threshold for other in accepted_titles):
+            continue
+
+        if canonical:
+            seen.add(canonical)
+        accepted_titles.append(signature)
+        ranked.append({**item, "score": round(float(scores[idx]), 4)})
+        if len(ranked) >= top_k:
+            break
+    return ranked
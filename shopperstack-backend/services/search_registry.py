@@ -0,0 +1,138 @@
+"""Pluggable product search providers.
+
+A provider is an async `search(query) -> list of result dicts` registered under
+a name, with its own timeout, a weight its results' scores are scaled by when
+they are merged (see services/ranking.py) and an enabled flag. Adding a source
+(a store API, another search service) is one `register` call; the upload
+endpoints fan out to whatever is registered.
+
+`SearchRegistry.fan_out` queries every enabled provider concurrently and yields
+each provider's results as they arrive, tagged with the provider's name. In
+first-k mode it stops once enough distinct, relevant results are in and cancels
+the providers still running.
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.ranking import canonicalize_url, score_results
+from utils import config
+
+logger = logging.getLogger(__name__)
+
+SearchFn = Callable[[str], Awaitable[List[Dict]]]
+
+
+class SearchProvider:
+    """One search source and how the fan-out treats it.
+
+    `timeout` bounds each search in seconds (None for no limit of its own); a
+    provider that times out or fails contributes no results.
+    """
+
+    def __init__(self, name: str, search: SearchFn, timeout: Optional[float] = None,
+                 weight: float = 1.0, enabled: bool = True):
+        self.name = name
+        self.search = search
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.weight = weight
+        self.enabled = enabled
+
+    async def run(self, query: str) -> List[Dict]:
+        """Search with this provider's timeout; failures degrade to an empty list."""
+        try:
+            results = await asyncio.wait_for(self.search(query), self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%s search timed out after %.1fs", self.name, self.timeout)
+            return []
+        except Exception as e:
+            logger.warning("%s search failed: %s", self.name, e)
+            return []
+        if results is None:
+            return []
+        return results if isinstance(results, list) else [results]
+
+    def stats(self) -> Dict:
+        return {"enabled": self.enabled, "timeout": self.timeout, "weight": self.weight}
+
+
+class SearchRegistry:
+    """Search providers by name, in registration order."""
+
+    def __init__(self):
+        self._providers: Dict[str, SearchProvider] = {}
+
+    def register(self, name: str, search: SearchFn, timeout: Optional[float] = None,
+                 weight: float = 1.0, enabled: bool = True) -> SearchProvider:
+        """Add a provider, or replace the one registered under `name`."""
+        provider = SearchProvider(name, search, timeout=timeout, weight=weight, enabled=enabled)
+        self._providers[name] = provider
+        return provider
+
+    def register_configured(self, name: str, search: SearchFn) -> SearchProvider:
+        """Register a provider with its timeout, weight and enabled flag from config.SEARCH_PROVIDERS."""
+        return self.register(name, search, **config.SEARCH_PROVIDERS.get(name, {}))
+
+    def unregister(self, name: str) -> None:
+        self._providers.pop(name, None)
+
+    def get(self, name: str) -> Optional[SearchProvider]:
+        return self._providers.get(name)
+
+    def enabled(self) -> List[SearchProvider]:
+        return [provider for provider in self._providers.values() if provider.enabled]
+
+    def weights(self) -> Dict[str, float]:
+        """Score weights of the providers that don't use the default of 1."""
+        return {name: p.weight for name, p in self._providers.items() if p.weight != 1.0}
+
+    def stats(self) -> Dict:
+        return {name: provider.stats() for name, provider in self._providers.items()}
+
+    async def fan_out(
+        self,
+        query: str,
+        run: Optional[Callable[[SearchProvider, str], Awaitable[List[Dict]]]] = None,
+        first_k: int = 0,
+        min_score: float = 0.0,
+    ) -> AsyncIterator[Tuple[str, List[Dict]]]:
+        """Search every enabled provider at once; yield `(name, results)` in completion order.
+
+        `run(provider, query)` performs one search (default: `provider.run`, so a
+        caller can add caching or a deadline around it). Results are shallow copies
+        tagged with `provider`. With `first_k` > 0 the fan-out ends as soon as that
+        many distinct results scoring at least `min_score` against the query have
+        arrived; providers still running are cancelled. Closing the iterator early
+        cancels them too.
+        """
+        run = run or (lambda provider, q: provider.run(q))
+
+        async def search(provider: SearchProvider) -> Tuple[str, List[Dict]]:
+            return provider.name, await run(provider, query) or []
+
+        tasks = {asyncio.ensure_future(search(provider)): provider.name for provider in self.enabled()}
+        received: List[Dict] = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                name, results = await next_done
+                tagged = [{**item, "provider": name} for item in results if isinstance(item, dict)]
+                yield name, tagged
+                if first_k > 0 and tagged:
+                    # Rescored together, as the final merge will score them
+                    received.extend(tagged)
+                    scores = score_results(query, received)
+                    relevant = {
+                        canonicalize_url(item.get("link") or item.get("url") or "") or item.get("title", "")
+                        for item, score in zip(received, scores) if score >= min_score
+                    }
+                    if len(relevant) >= first_k:
+                        stragglers = [name for task, name in tasks.items() if not task.done()]
+                        if stragglers:
+                            logger.debug("First %d results in; cancelling %s", first_k, ", ".join(stragglers))
+                        break
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
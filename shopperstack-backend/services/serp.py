@@ -1,14 +1,43 @@
+import asyncio
+import json
+import logging
 import os
 import requests
+import httpx
 from typing import List, Dict, Optional
 
+from utils import config
+from utils.circuit_breaker import CircuitBreaker
+from utils.rate_limit import get_limiter, retry_after_seconds
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard decoder gives the same result, several times slower
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
 
 class SerpService:
-    def __init__(self):
+    def __init__(self, session: Optional[requests.Session] = None, async_client: Optional[httpx.AsyncClient] = None,
+                 breaker: Optional[CircuitBreaker] = None):
         self.api_key: Optional[str] = os.getenv("SERPAPI_KEY")
-        self.base_url: str = "https://serpapi.com/search"
+        self.base_url: str = config.SERPAPI_URL
+        # Reuse a pooled keep-alive session / async client when one is provided; the
+        # blocking path builds its own session on first use
+        self._session = session
+        self.async_client = async_client
+        # While the breaker is open, or its rate limiter is saturated, searches return []
+        # without waiting on SerpApi
+        self.breaker = breaker or CircuitBreaker("serp", limiter=get_limiter("serp"))
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = requests.Session()
+        return self._session
 
-    def search_products(self, query: str) -> List[Dict]:
+    def search_products(self, query: str, pages: Optional[int] = None, target: Optional[int] = None) -> List[Dict]:
         """
         Fetch shopping results using SerpApi (google_shopping engine).
 
@@ -19,37 +48,139 @@ class SerpService:
         - source (str)
         - snippet (str)
 
+        Up to `pages` result pages (SERP_PAGES) are fetched in order, stopping once
+        `target` products (SERP_TARGET_RESULTS, 0 for no limit) have been found.
         If API key is missing or request fails, returns an empty list.
         """
         if not self.api_key:
-            print("⚠️ SERPAPI_KEY not set in environment.")
+            logger.debug("SERPAPI_KEY not set in environment")
+            return []
+        pages, target = self._pagination(pages, target)
+
+        def fetch(page: int) -> bytes:
+            response = self.session.get(self.base_url, params=self._params(query, page), timeout=10)
+            self._note_quota(response)
+            response.raise_for_status()
+            return response.content
+
+        results = []
+        for page in range(pages):
+            try:
+                products = parse_response(self.breaker.call_sync(lambda: fetch(page)))
+            except Exception as e:
+                logger.warning("SerpApi request failed: %s", e)
+                break
+            results.extend(products)
+            if not products or (target and len(results) >= target):
+                break
+        return results
+
+    async def search_products_async(self, query: str, pages: Optional[int] = None,
+                                    target: Optional[int] = None) -> List[Dict]:
+        """Async variant of `search_products` over the shared httpx client; the pages
+        are requested concurrently and the ones still pending are cancelled once
+        `target` products have arrived.
+        """
+        if not self.api_key:
+            logger.debug("SERPAPI_KEY not set in environment")
             return []
+        pages, target = self._pagination(pages, target)
+
+        if self.async_client is not None:
+            return await self._fetch_pages(self.async_client, query, pages, target)
+        async with httpx.AsyncClient() as client:
+            return await self._fetch_pages(client, query, pages, target)
+
+    async def _fetch_pages(self, client: httpx.AsyncClient, query: str, pages: int, target: int) -> List[Dict]:
+        async def fetch(page: int) -> List[Dict]:
+            async def get() -> bytes:
+                response = await client.get(self.base_url, params=self._params(query, page), timeout=10)
+                self._note_quota(response)
+                response.raise_for_status()
+                return response.content
+
+            try:
+                body = await self.breaker.call(get)
+            except Exception as e:
+                logger.warning("SerpApi request failed (page %d): %s", page + 1, e)
+                return []
+            return parse_response(body)
 
+        if pages == 1:
+            return await fetch(0)
+
+        tasks = [asyncio.ensure_future(fetch(page)) for page in range(pages)]
+        results = []
+        try:
+            # Pages are consumed in order, so an early stop keeps the best-ranked ones
+            for task in tasks:
+                products = await task
+                results.extend(products)
+                if not products or (target and len(results) >= target):
+                    break
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        return results
+
+    @staticmethod
+    def _pagination(pages: Optional[int], target: Optional[int]):
+        pages = config.SERP_PAGES if pages is None else pages
+        target = config.SERP_TARGET_RESULTS if target is None else target
+        return max(1, pages), max(0, target)
+
+    def _note_quota(self, response) -> None:
+        # Out of quota: hold every SerpApi caller back until Retry-After instead of retrying into it
+        limiter = self.breaker.limiter
+        if response.status_code == 429 and limiter is not None:
+            # Without a Retry-After, wait out one refill interval
+            limiter.pause(retry_after_seconds(response.headers, 1.0 / limiter.rate))
+
+    def _params(self, query: str, page: int = 0) -> Dict:
         params = {
             "q": query,
             "engine": "google_shopping",
             "api_key": self.api_key
         }
+        if page:
+            params["start"] = page * config.SERP_PAGE_SIZE
+        if config.SERP_JSON_RESTRICTOR:
+            params["json_restrictor"] = config.SERP_JSON_RESTRICTOR
+        return params
 
-        try:
-            response = requests.get(self.base_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-        except Exception as e:
-            print(f"⚠️ SERPAPI request failed: {e}")
-            return []
-
+    @staticmethod
+    def _parse_results(data: Dict) -> List[Dict]:
         results = []
-        for item in data.get("shopping_results", []):
-            product = {
-                "title": item.get("title", "").strip(),
-                "price": item.get("price", "").strip(),
-                "link": item.get("link", ""),
+        for item in data.get("shopping_results") or ():
+            if not isinstance(item, dict):
+                continue
+            title = item.get("title") or ""
+            link = item.get("link") or ""
+            # Only include items that at least have a title and link; the rest of the
+            # (large) item is never read
+            if not link or not isinstance(title, str) or not (title := title.strip()):
+                continue
+            price = item.get("price") or ""
+            results.append({
+                "title": title,
+                "price": price.strip() if isinstance(price, str) else str(price),
+                "link": link,
                 "source": item.get("source", ""),
                 "snippet": item.get("snippet") or item.get("description", "")
-            }
-            # Only include items that at least have a title and link
-            if product["title"] and product["link"]:
-                results.append(product)
+            })
 
         return results
+
+
+def decode_json(body: bytes):
+    """Decode a JSON response body with orjson when it is installed."""
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def parse_response(body: bytes) -> List[Dict]:
+    """Products from a raw google_shopping response body."""
+    data = decode_json(body)
+    return SerpService._parse_results(data) if isinstance(data, dict) else []
@@ -0,0 +1,352 @@
+"""Local nearest-neighbour index over product image vectors.
+
+Vectors are L2-normalized, so similarity is a dot product. Three layouts,
+chosen when the index is built:
+
+- flat: every vector as float32, scanned in blocks with one matrix product per
+  block for the whole query batch (exact)
+- int8: the same scan over vectors quantized to int8 with one scale per
+  dimension, a quarter of the memory for a small loss in precision
+- IVF (`nlist` > 0, with or without int8): vectors are clustered around
+  `nlist` k-means centroids and stored grouped by cluster; a query scans only
+  the `nprobe` clusters whose centroids are closest
+
+The index keeps the JSON record of every product next to its vector and is
+saved with utils/snapshot.py, so the service maps it read-only at startup.
+
+Build one from a catalog whose products carry a local `image_path` (relative
+to the catalog file):
+
+    python -m services.vector_index --catalog data/catalog.jsonl --out .cache/visual-index [--int8] [--ivf-lists 1024]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.image_features import Embedder, load_embedder
+from utils import config
+from utils.snapshot import load_snapshot, save_snapshot
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT = 1
+_ARRAYS = ("vectors", "scales", "ids", "centroids", "list_ptr", "rec_ptr", "records")
+# Rows per matrix product in a flat scan; bounds the temporary score and float32 buffers
+SCAN_BLOCK = 8192
+KMEANS_ITERATIONS = 10
+# Vectors sampled per centroid to train the IVF clustering, up to a fixed cap
+KMEANS_SAMPLE = 64
+KMEANS_MAX_SAMPLE = 65536
+
+
+def _spherical_kmeans(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """`nlist` unit-length centroids, trained on a sample of `vectors`."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[np.sort(rng.choice(len(vectors), min(len(vectors), max(nlist, min(nlist * KMEANS_SAMPLE, KMEANS_MAX_SAMPLE))), replace=False))]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].astype(np.float32)
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        filled = counts > 0
+        # reduceat over the cluster-sorted sample sums every cluster in one call
+        sums = np.add.reduceat(sample[order], starts[filled], axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Empty clusters keep their previous centroid
+        centroids[filled] = sums / np.maximum(norms, 1e-12)
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.concatenate([
+        np.argmax(vectors[start:start + SCAN_BLOCK] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), SCAN_BLOCK)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+
+class VectorIndex:
+    """An immutable set of product vectors with their records."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict):
+        self.meta = meta
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self.size = len(self.ids)
+        self.dim = int(meta["dim"])
+        self.nlist = len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, records: Sequence[bytes], nlist: int = 0, quantize: bool = False,
+              meta: Optional[Dict] = None) -> "VectorIndex":
+        """Index `vectors` (n, dim), normalizing them, with `records[i]` the JSON for row i."""
+        started = time.perf_counter()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        n, dim = vectors.shape
+        ids = np.arange(n, dtype=np.int32)
+
+        nlist = min(nlist, n)
+        if nlist > 0:
+            centroids = _spherical_kmeans(vectors, nlist)
+            lists = _assign(vectors, centroids)
+            ids = np.argsort(lists, kind="stable").astype(np.int32)
+            vectors = vectors[ids]
+            list_ptr = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=nlist)))).astype(np.int64)
+        else:
+            centroids = np.zeros((0, dim), dtype=np.float32)
+            list_ptr = np.zeros(1, dtype=np.int64)
+
+        if quantize:
+            # Symmetric per-dimension scale: score = x_int8 . (query * scales)
+            scales = np.maximum(np.abs(vectors).max(axis=0) if n else np.ones(dim), 1e-12) / 127.0
+            vectors = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+        else:
+            scales = np.ones(dim)
+
+        encoded = [bytes(record) for record in records]
+        arrays = {
+            "vectors": vectors,
+            "scales": scales.astype(np.float32),
+            "ids": ids,
+            "centroids": centroids,
+            "list_ptr": list_ptr,
+            "rec_ptr": np.concatenate(([0], np.cumsum([len(r) for r in encoded], dtype=np.int64))).astype(np.int64),
+            "records": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        }
+        meta = {
+            **(meta or {}),
+            "format": INDEX_FORMAT,
+            "dim": dim,
+            "vectors": n,
+            "nlist": nlist,
+            "quantized": bool(quantize),
+            "build_seconds": round(time.perf_counter() - started, 3),
+        }
+        return cls(arrays, meta)
+
+    def save(self, index_dir: str) -> str:
+        return save_snapshot(index_dir, {name: getattr(self, name) for name in _ARRAYS}, {"meta": self.meta})
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["VectorIndex"]:
+        snapshot = load_snapshot(index_dir, _ARRAYS, ("meta",))
+        if snapshot is None:
+            return None
+        arrays, documents = snapshot
+        if documents["meta"].get("format") != INDEX_FORMAT:
+            return None
+        return cls(arrays, documents["meta"])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    def record(self, row: int) -> Dict:
+        doc = int(self.ids[row])
+        start, end = int(self.rec_ptr[doc]), int(self.rec_ptr[doc + 1])
+        return json.loads(self.records[start:end].tobytes())
+
+    def search(self, queries: np.ndarray, k: int, nprobe: int = 8) -> List[List[Tuple[int, float]]]:
+        """Top `k` (row, similarity) pairs per query vector, best first.
+
+        Rows are positions in this index; pass them to `record`. An IVF index
+        scans the `nprobe` nearest clusters of each query, a flat one every row.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.size == 0 or k <= 0:
+            return [[] for _ in queries]
+        scaled = queries * self.scales
+        if self.nlist:
+            return [self._search_lists(query, scaled[i], k, nprobe) for i, query in enumerate(queries)]
+        return self._scan(scaled, k)
+
+    def _block_scores(self, start: int, end: int, scaled: np.ndarray) -> np.ndarray:
+        """(queries, rows) similarities of `scaled` queries to rows [start, end)."""
+        block = self.vectors[start:end]
+        if block.dtype != np.float32:
+            block = block.astype(np.float32)
+        return scaled @ block.T
+
+    def _scan(self, scaled: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        rows, scores = [], []
+        for start in range(0, self.size, SCAN_BLOCK):
+            block = self._block_scores(start, min(start + SCAN_BLOCK, self.size), scaled)
+            kk = min(k, block.shape[1])
+            best = np.argpartition(-block, kk - 1, axis=1)[:, :kk]
+            rows.append(best + start)
+            scores.append(np.take_along_axis(block, best, axis=1))
+        rows, scores = np.concatenate(rows, axis=1), np.concatenate(scores, axis=1)
+        results = []
+        for q in range(scaled.shape[0]):
+            order = np.argsort(-scores[q], kind="stable")[:k]
+            results.append([(int(rows[q, i]), float(scores[q, i])) for i in order])
+        return results
+
+    def _search_lists(self, query: np.ndarray, scaled: np.ndarray, k: int, nprobe: int) -> List[Tuple[int, float]]:
+        nprobe = max(1, min(nprobe, self.nlist))
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows, scores = [], []
+        for cluster in probes:
+            start, end = int(self.list_ptr[cluster]), int(self.list_ptr[cluster + 1])
+            if end > start:
+                rows.append(np.arange(start, end))
+                scores.append(self._block_scores(start, end, scaled[None, :])[0])
+        if not rows:
+            return []
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        kk = min(k, len(scores))
+        best = np.argpartition(-scores, kk - 1)[:kk]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+
+class VisualSearch:
+    """Image-to-product similarity over a saved VectorIndex.
+
+    Loads the index from `index_dir` (if one has been built) and reloads it
+    when a newer version is saved there. Without an index every search returns
+    no matches.
+    """
+
+    def __init__(self, index_dir: Optional[str], embedder: str = "", top_k: int = 5,
+                 min_score: float = 0.0, nprobe: int = 8):
+        self.index_dir = index_dir
+        self.embedder_name = embedder or "default"
+        self.embed: Embedder = load_embedder(embedder)
+        self.top_k = top_k
+        self.min_score = min_score
+        self.nprobe = nprobe
+        self._index: Optional[VectorIndex] = None
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.searches = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def _current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.index_dir, "CURRENT")) as f:
+                return f.read().strip()
+        except (OSError, TypeError):
+            return None
+
+    def reload_if_changed(self) -> bool:
+        """Map the index's CURRENT version if it isn't the one loaded. Returns True on a swap."""
+        with self._lock:
+            version = self._current_version()
+            if version is None or version == self._version:
+                return False
+            index = VectorIndex.load(self.index_dir)
+            if index is None:
+                return False
+            if index.meta.get("embedder", "default") != self.embedder_name:
+                logger.warning("Visual index in %s was built with embedder %r, not %r; ignoring it",
+                               self.index_dir, index.meta.get("embedder"), self.embedder_name)
+                self._version = version
+                return False
+            self._index, self._version = index, version
+            logger.info("Visual index loaded", extra={
+                "vectors": index.size, "nlist": index.nlist, "quantized": index.meta.get("quantized"),
+            })
+            return True
+
+    def search(self, image_bytes, k: Optional[int] = None) -> List[Dict]:
+        """Products that look most like `image_bytes`, each with a `visual_score`."""
+        return self.search_batch([image_bytes], k)[0]
+
+    def search_batch(self, images: Sequence, k: Optional[int] = None) -> List[List[Dict]]:
+        index = self._index
+        if index is None or not images:
+            return [[] for _ in images]
+        self.searches += len(images)
+        vectors = self.embed(images)
+        results = []
+        for matches in index.search(vectors, k or self.top_k, self.nprobe):
+            found = []
+            for row, score in matches:
+                if score < self.min_score:
+                    break
+                product = index.record(row)
+                product["visual_score"] = round(score, 4)
+                found.append(product)
+            results.append(found)
+        return results
+
+    def stats(self) -> Dict:
+        index = self._index
+        return {
+            "loaded": index is not None,
+            "vectors": index.size if index else 0,
+            "nlist": index.nlist if index else 0,
+            "quantized": bool(index.meta.get("quantized")) if index else False,
+            "searches": self.searches,
+        }
+
+
+def build_from_catalog(catalog_path: str, index_dir: str, embedder: str = "", nlist: int = 0,
+                       quantize: bool = False, batch_size: int = 256) -> VectorIndex:
+    """Embed the local image of every catalog product that has one and save the index."""
+    embed = load_embedder(embedder)
+    base = os.path.dirname(os.path.abspath(catalog_path))
+    vectors, records = [], []
+    images, pending = [], []
+
+    def flush():
+        if images:
+            vectors.append(embed(images))
+            records.extend(pending)
+            images.clear()
+            pending.clear()
+
+    skipped = 0
+    with open(catalog_path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            product = json.loads(line)
+            image_path = product.get("image_path")
+            if not image_path:
+                skipped += 1
+                continue
+            try:
+                with open(os.path.join(base, image_path), "rb") as image:
+                    images.append(image.read())
+            except OSError as e:
+                logger.warning("Skipping %s: %s", product.get("link"), e)
+                skipped += 1
+                continue
+            pending.append(line)
+            if len(images) >= batch_size:
+                flush()
+    flush()
+
+    matrix = np.concatenate(vectors) if vectors else np.zeros((0, 1), dtype=np.float32)
+    index = VectorIndex.build(matrix, records, nlist=nlist, quantize=quantize, meta={
+        "embedder": embedder or "default", "source": os.path.abspath(catalog_path),
+    })
+    index.save(index_dir)
+    logger.info("Visual index built: %d products (%d without a local image)", index.size, skipped)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default=config.CATALOG_PATH)
+    parser.add_argument("--out", default=config.VISUAL_INDEX_DIR)
+    parser.add_argument("--embedder", default=config.VISUAL_EMBEDDER, help="module:function (default: built-in)")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="IVF clusters (0 = flat scan)")
+    parser.add_argument("--int8", action="store_true", help="store int8-quantized vectors")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    built = build_from_catalog(args.catalog, args.out, args.embedder, args.ivf_lists, args.int8)
+    print(json.dumps(built.meta, indent=2))
@@ -9,6 +9,6 @@ echo Starting server on http://127.0.0.1:8000
 echo Press Ctrl+C to stop
 echo.
 
-.venv\Scripts\python main.py
+.venv\Scripts\python run.py
 
 pause 
\ No newline at end of file
@@ -0,0 +1,74 @@
+import asyncio
+
+from services import gemini
+from services.attributes import AttributeExtractor, get_extractor
+from utils.circuit_breaker import CircuitBreaker
+
+VOCABULARY = {
+    "order": ["color", "type", "sleeve"],
+    "min_parts": 2,
+    "filler": ["clothing"],
+    "attributes": {
+        "type": {
+            "default": "clothing item",
+            "values": {
+                "shirt": ["shirt", "blouse"],
+                "button-up shirt": ["dress shirt"],
+                "dress": ["dress", "gown"],
+            },
+            "upgrades": {"shirt": {"button-up shirt": ["buttons"]}},
+        },
+        "color": {"values": {"navy": ["navy", "navy blue"], "blue": ["blue"], "white": ["white"]}},
+        "sleeve": {"values": {"long sleeve": ["long sleeved"], "premium": {"terms": ["sleeve"], "weight": 0.5}}},
+    },
+}
+
+
+def test_longest_phrase_wins_and_separators_are_equivalent():
+    extractor = AttributeExtractor(VOCABULARY)
+    found = extractor.extract("A Navy-Blue long_sleeved dress shirt")
+
+    assert found["color"] == {"value": "navy", "confidence": 1.0}
+    assert found["type"] == {"value": "button-up shirt", "confidence": 1.0}
+    assert found["sleeve"] == {"value": "long sleeve", "confidence": 1.0}
+    assert extractor.refine("A Navy-Blue long_sleeved dress shirt") == "navy button-up shirt long sleeve"
+
+
+def test_confidence_reflects_competing_and_weak_evidence():
+    extractor = AttributeExtractor(VOCABULARY)
+    found = extractor.extract("a white blouse with a blue collar and a sleeve")
+
+    # Two colors: the first mention wins with 1 / (1 + 1/2) of the evidence
+    assert found["color"] == {"value": "white", "confidence": 0.67}
+    assert found["sleeve"] == {"value": "premium", "confidence": 0.5}
+    # Words inside other words never match
+    assert extractor.extract("a redressed shirtless model") == {"type": {"value": "clothing item", "confidence": 0.0}}
+
+
+def test_upgrades_defaults_and_filler():
+    extractor = AttributeExtractor(VOCABULARY)
+    assert extractor.refine("a blouse with buttons") == "button-up shirt clothing"
+    assert extractor.refine("buttons on a gown") == "dress clothing"
+    assert extractor.refine("something") == "clothing item clothing"
+    assert extractor.refine_batch(["blue gown", "something", "blue gown"]) == [
+        "blue dress", "clothing item clothing", "blue dress"
+    ]
+
+
+def test_shipped_vocabulary_keeps_the_old_heuristic_queries():
+    extractor = get_extractor()
+    assert extractor.refine(
+        "A black long-sleeved button-up shirt in smooth fabric, suitable for formal office wear"
+    ) == "black button-up shirt long sleeve premium fabric formal office wear"
+    assert extractor.refine("A red dress") == "red dress fashion clothing style"
+
+
+def test_refine_batch_uses_the_extractor_while_gemini_is_unavailable():
+    service = gemini.GeminiService(breaker=CircuitBreaker("gemini-test"))
+    service.model = None
+    captions = ["A black shirt with buttons", "a blue denim jacket", "A black shirt with buttons"]
+
+    expected = ["black button-up shirt fashion clothing style", "blue jacket denim",
+                "black button-up shirt fashion clothing style"]
+    assert service.refine_batch(captions) == expected
+    assert asyncio.run(service.refine_batch_async(captions)) == expected
@@ -0,0 +1,181 @@
+import asyncio
+import sqlite3
+import types
+
+import pytest
+
+from utils import cache
+from utils.cache import CaptionCache, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable clock standing in for both wall-clock and monotonic time in utils/cache.py."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(time=lambda: now[0], monotonic=lambda: now[0]))
+    return now
+
+
+def test_caption_cache_promotes_disk_hits_and_survives_reopening(tmp_path, clock):
+    path = str(tmp_path / "captions.sqlite3")
+    key = CaptionCache.key_for(b"image bytes")
+    assert key == CaptionCache.key_for(b"image bytes") != CaptionCache.key_for(b"other bytes")
+
+    first = CaptionCache(path)
+    assert first.get(key) is None
+    first.set(key, "A black shirt")
+    assert first.get(key) == "A black shirt"
+    first.close()
+
+    # A new process (or worker) opening the same file finds it on disk, then in memory
+    second = CaptionCache(path)
+    assert second.get(key) == "A black shirt"
+    assert second.get(key) == "A black shirt"
+    stats = second.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+    assert stats["memory_entries"] == 1 and stats["disk_enabled"]
+    second.close()
+
+
+def test_caption_cache_memory_tier_is_a_bounded_lru(tmp_path, clock):
+    captions = CaptionCache(str(tmp_path / "captions.sqlite3"), max_entries=2)
+    captions.set("a", "caption a")
+    captions.set("b", "caption b")
+    assert captions.get("a") == "caption a"  # "a" is now the most recently used
+    captions.set("c", "caption c")           # evicts "b" from memory
+
+    assert captions.stats()["memory_entries"] == 2
+    assert captions.get("b") == "caption b"  # still on disk; promoting it evicts "a"
+    assert captions.get("c") == "caption c"
+    assert captions.get("a") == "caption a"
+    stats = captions.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["memory_entries"]) == (2, 2, 2)
+    captions.close()
+
+
+def test_caption_cache_expires_memory_then_disk_entries(tmp_path, clock):
+    captions = CaptionCache(str(tmp_path / "captions.sqlite3"), memory_ttl=10.0, disk_ttl=100.0)
+    captions.set("key", "A black shirt")
+
+    clock[0] += 11  # past the memory TTL: re-read from disk
+    assert captions.get("key") == "A black shirt"
+    assert captions.stats()["disk_hits"] == 1
+
+    clock[0] += 100  # past the disk TTL as well: a miss, and the row is deleted
+    assert captions.get("key") is None
+    assert captions.stats()["misses"] == 1
+    reopened = CaptionCache(captions.path, disk_ttl=1e9)
+    assert reopened.get("key") is None
+    captions.close()
+    reopened.close()
+
+
+def test_caption_cache_treats_a_locked_file_on_cleanup_as_a_miss(tmp_path, clock):
+    captions = CaptionCache(str(tmp_path / "captions.sqlite3"), memory_ttl=10.0, disk_ttl=100.0)
+    captions.set("key", "A black shirt")
+    clock[0] += 101
+
+    class LockedForWrites:
+        """Reads work; writes fail as when another worker holds the write lock."""
+
+        def __init__(self, db):
+            self.db = db
+
+        def execute(self, sql, *args):
+            if not sql.startswith("SELECT"):
+                raise sqlite3.OperationalError("database is locked")
+            return self.db.execute(sql, *args)
+
+        def commit(self):
+            raise sqlite3.OperationalError("database is locked")
+
+    db, captions._db = captions._db, LockedForWrites(captions._db)
+    assert captions.get("key") is None
+    captions._db = db
+    captions.close()
+
+
+def test_caption_cache_without_a_disk_tier_serves_from_memory(tmp_path, clock):
+    # The parent "directory" is a file, so the SQLite file can't be created
+    (tmp_path / "blocker").write_text("")
+    captions = CaptionCache(str(tmp_path / "blocker" / "captions.sqlite3"))
+    assert not captions.stats()["disk_enabled"]
+    captions.set("key", "A black shirt")
+    assert captions.get("key") == "A black shirt"
+
+
+def _counting_loader(values):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return values[min(len(calls), len(values)) - 1]
+    return load, calls
+
+
+def test_ttl_cache_serves_fresh_entries_without_loading(clock):
+    results = TTLCache("search", ttl=60.0, stale_ttl=60.0)
+    load, calls = _counting_loader(["first"])
+
+    async def scenario():
+        return [await results.get_or_load("query", load) for _ in range(3)]
+
+    assert asyncio.run(scenario()) == ["first"] * 3
+    assert len(calls) == 1
+    stats = results.stats()
+    assert (stats["hits"], stats["misses"], stats["stale_hits"]) == (2, 1, 0)
+
+
+def test_ttl_cache_serves_stale_entries_while_one_refresh_runs(clock):
+    results = TTLCache("search", ttl=60.0, stale_ttl=60.0)
+    load, calls = _counting_loader(["first", "second"])
+
+    async def scenario():
+        await results.get_or_load("query", load)
+        clock[0] += 90  # stale, but within stale_ttl
+        stale = [await results.get_or_load("query", load) for _ in range(3)]
+        await asyncio.sleep(0)  # let the background refresh run
+        await asyncio.sleep(0)
+        fresh = await results.get_or_load("query", load)
+        await results.aclose()
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale == ["first"] * 3
+    assert fresh == "second"
+    # Three stale reads, one refresh
+    assert len(calls) == 2
+    stats = results.stats()
+    assert (stats["stale_hits"], stats["refreshes"], stats["hits"]) == (3, 1, 1)
+
+
+def test_ttl_cache_reloads_after_the_stale_window(clock):
+    results = TTLCache("search", ttl=60.0, stale_ttl=60.0)
+    load, calls = _counting_loader(["first", "second"])
+
+    async def scenario():
+        await results.get_or_load("query", load)
+        clock[0] += 121  # past ttl + stale_ttl: the caller waits for a new load
+        return await results.get_or_load("query", load)
+
+    assert asyncio.run(scenario()) == "second"
+    assert results.stats()["misses"] == 2 and results.stats()["stale_hits"] == 0
+
+
+def test_ttl_cache_does_not_store_values_rejected_by_cacheable(clock):
+    results = TTLCache("search", ttl=60.0)
+    load, calls = _counting_loader([[], [], [{"title": "Black shirt"}]])
+
+    async def scenario():
+        return [await results.get_or_load("query", load, cacheable=bool) for _ in range(4)]
+
+    # Empty responses are returned but loaded again next time; the first non-empty one sticks
+    assert asyncio.run(scenario()) == [[], [], [{"title": "Black shirt"}], [{"title": "Black shirt"}]]
+    assert len(calls) == 3
+    assert results.stats()["entries"] == 1
+
+
+def test_shared_store_is_disabled_when_its_file_cannot_be_created(tmp_path):
+    (tmp_path / "blocker").write_text("")
+    store = cache.SharedStore(str(tmp_path / "blocker" / "captions.sqlite3"))
+    assert not store.enabled
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from services import tavily
+from services.catalog import CatalogIndex, ProductCatalog, tokenize
+
+PRODUCTS = [
+    {"title": "Black Button-Up Shirt - Cotton", "link": "https://example.com/1",
+     "snippet": "Long sleeve black cotton shirt for office wear."},
+    {"title": "White Linen Kurta", "link": "https://example.com/2",
+     "snippet": "Breathable summer kurta in white linen."},
+    {"title": "Blue Slim Fit Jeans", "link": "https://example.com/3",
+     "snippet": "Stretch denim jeans with a slim fit."},
+    {"title": "Black Leather Jacket", "link": "https://example.com/4",
+     "snippet": "Faux leather biker jacket in black."},
+    {"title": "Maroon Silk Saree", "link": "https://example.com/5",
+     "snippet": "Festive silk saree with a zari border."},
+    {"snippet": "No title or link, skipped"},
+]
+
+
+def _write(path, products):
+    with open(path, "w") as f:
+        for product in products:
+            f.write(json.dumps(product) + "\n")
+
+
+def test_tokenize_folds_plurals_and_drops_stopwords():
+    assert tokenize("Shirts and Dresses for the Office") == ["shirt", "dress", "office"]
+
+
+def test_bm25_ranks_matching_products_first(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    _write(path, PRODUCTS)
+    index = CatalogIndex.build(str(path))
+
+    assert index.size == 5
+    top = index.search("black cotton shirts", k=3)
+    assert [index.record(doc)["link"] for doc, _ in top][:2] == ["https://example.com/1", "https://example.com/4"]
+    assert top[0][1] > top[1][1]
+    assert index.search("tuxedo", k=3) == []
+
+
+def test_saved_index_maps_back_in_with_identical_results(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    _write(path, PRODUCTS * 40)
+    built = CatalogIndex.build(str(path))
+    built.save(str(tmp_path / "index"))
+
+    loaded = CatalogIndex.load(str(tmp_path / "index"))
+    assert loaded.matches(str(path))
+    assert not loaded.post_doc.flags.writeable
+    for query in ("black shirt", "silk saree festive", "slim jeans"):
+        assert loaded.search(query, 5) == built.search(query, 5)
+        # A budget the query's postings fit in doesn't change the answer
+        assert loaded.search(query, 5, postings_budget=10_000) == built.search(query, 5)
+        budgeted = loaded.search(query, 5, postings_budget=30)
+        assert budgeted[0][1] == pytest.approx(built.search(query, 1)[0][1])
+
+
+def _build_and_save(path, index_dir, rounds):
+    for _ in range(rounds):
+        CatalogIndex.build(path).save(index_dir)
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_workers_saving_at_once_leave_a_loadable_current_version(tmp_path):
+    path, index_dir = str(tmp_path / "catalog.jsonl"), str(tmp_path / "index")
+    _write(path, PRODUCTS * 40)
+
+    # What each run.py worker does when it finds no usable index
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_build_and_save, args=(path, index_dir, 5)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+
+    with open(os.path.join(index_dir, "CURRENT")) as f:
+        current = f.read().strip()
+    versions = [entry for entry in os.listdir(index_dir) if entry.startswith("v")]
+    assert current in versions and len(versions) <= 2
+    assert CatalogIndex.load(index_dir).matches(path)
+
+
+def test_catalog_reloads_when_the_file_changes(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    _write(path, PRODUCTS[:3])
+    catalog = ProductCatalog(str(path), index_dir=str(tmp_path / "index"), top_k=2)
+
+    assert catalog.search("jacket") == []
+    assert catalog.reload_if_changed() is False
+
+    _write(path, PRODUCTS)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+    assert catalog.reload_if_changed() is True
+    assert catalog.search("jacket")[0]["link"] == "https://example.com/4"
+    # The live version and the one it replaced (a reader may have just read the old CURRENT)
+    assert len([entry for entry in os.listdir(tmp_path / "index") if entry.startswith("v")]) == 2
+
+    # A restart maps the saved index instead of rebuilding it
+    restarted = ProductCatalog(str(path), index_dir=str(tmp_path / "index"))
+    assert restarted.load()
+    assert restarted._index.meta == catalog._index.meta
+    assert restarted.stats()["documents"] == 5
+
+
+def test_tavily_falls_back_to_the_catalog(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    _write(path, PRODUCTS)
+    catalog = ProductCatalog(str(path), top_k=1)
+
+    results = asyncio.run(tavily.search_async("red silk saree", tavily_client=None, catalog=catalog))
+    assert [r["link"] for r in results] == ["https://example.com/5"]
+    assert results[0]["catalog_score"] > 0
+    assert tavily.search("white kurta", tavily_client=None, catalog=catalog)[0]["link"] == "https://example.com/2"
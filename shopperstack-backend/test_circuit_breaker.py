@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import main
+from services.serp import SerpService
+from utils import config
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def _breaker(**overrides):
+    settings = dict(window_seconds=60, min_calls=3, failure_rate=0.5, slow_call_seconds=0.2,
+                    slow_call_rate=0.8, open_seconds=0.1, half_open_probes=1)
+    settings.update(overrides)
+    return CircuitBreaker("test", **settings)
+
+
+async def _fail():
+    raise RuntimeError("provider down")
+
+
+async def _ok():
+    return "ok"
+
+
+def test_breaker_opens_on_errors_and_recovers_through_half_open():
+    breaker = _breaker()
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                await breaker.call(_fail)
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(_ok)
+
+        await asyncio.sleep(0.15)
+        assert breaker.state == HALF_OPEN
+        assert await breaker.call(_ok) == "ok"
+        assert breaker.state == CLOSED
+
+    asyncio.run(scenario())
+    stats = breaker.stats()
+    assert stats["times_opened"] == 1 and stats["rejected"] == 1
+    assert stats["p50_ms"] is not None
+
+
+def test_breaker_opens_on_slow_calls_and_failed_probe_reopens():
+    breaker = _breaker(slow_call_seconds=0.01)
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "late"
+
+    async def scenario():
+        for _ in range(3):
+            await breaker.call(slow)
+        assert breaker.state == OPEN
+        await asyncio.sleep(0.15)
+        with pytest.raises(RuntimeError):
+            await breaker.call(_fail)
+        assert breaker.state == OPEN
+
+    asyncio.run(scenario())
+
+
+def test_open_serp_breaker_falls_back_without_calling_the_provider(monkeypatch):
+    requests_seen = []
+
+    async def handler(request):
+        requests_seen.append(request)
+        await asyncio.sleep(0.5)
+        return httpx.Response(503)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            serp = SerpService(async_client=client, breaker=_breaker(open_seconds=60))
+            serp.api_key = "test-key"
+            for _ in range(3):
+                assert await serp.search_products_async("black shirt") == []
+            start = time.perf_counter()
+            assert await serp.search_products_async("black shirt") == []
+            return time.perf_counter() - start, serp.breaker.stats()
+
+    elapsed, stats = asyncio.run(scenario())
+    assert len(requests_seen) == 3
+    assert elapsed < 0.05
+    assert stats["state"] == OPEN and stats["error_rate"] == 1.0
+
+
+def test_health_reports_breaker_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CAPTION_CACHE_PATH", str(tmp_path / "captions.sqlite3"))
+
+    async def scenario():
+        async with main.lifespan(main.app):
+            main.app.state.services.breakers["serp"]._open(time.monotonic())
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return (await client.get("/health")).json()
+
+    body = asyncio.run(scenario())
+    assert set(body["providers"]) == {"gemini", "huggingface", "serp", "tavily"}
+    assert body["providers"]["serp"]["state"] == OPEN
+    assert body["timestamp"] != "2024-01-01T00:00:00Z"
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import httpx
+
+from services import huggingface_blip as hf
+from utils import config
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def _client(behaviour, calls, cancelled):
+    """Mock HF inference API; `behaviour` maps model id -> (delay seconds, status)."""
+
+    async def handler(request: httpx.Request):
+        model_id = request.url.path.split("/models/", 1)[1]
+        calls.append(model_id)
+        delay, status = behaviour[model_id]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(model_id)
+            raise
+        return httpx.Response(status, json=[{"generated_text": f"caption from {model_id}"}])
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def _setup(monkeypatch, models):
+    monkeypatch.setattr(hf, "HF_API_KEY", "test-key")
+    monkeypatch.setattr(hf, "HF_MODEL_CANDIDATES", models)
+    monkeypatch.setattr(hf, "model_cooloff", hf.ModelCooloff(60.0))
+    monkeypatch.setattr(config, "HF_BACKOFF_BASE", 0.01)
+
+
+async def _race(behaviour, budget=2.0, hedge_delay=0.05):
+    calls, cancelled = [], []
+    async with _client(behaviour, calls, cancelled) as client:
+        start = time.perf_counter()
+        result = await hf._caption_via_models_async(client, PNG_BYTES, "image/png", budget=budget, hedge_delay=hedge_delay)
+        return result, time.perf_counter() - start, calls, cancelled
+
+
+def test_hedged_model_wins_and_slow_model_is_cancelled(monkeypatch):
+    _setup(monkeypatch, ["slow", "fast"])
+    (resp, status, err, used), elapsed, calls, cancelled = asyncio.run(_race({"slow": (5.0, 200), "fast": (0.05, 200)}))
+
+    assert status == 200 and used == "fast"
+    assert hf._parse_caption_response(resp) == "caption from fast"
+    assert elapsed < 1.0
+    assert cancelled == ["slow"]
+
+
+def test_overall_deadline_bounds_the_race(monkeypatch):
+    _setup(monkeypatch, ["a", "b"])
+    (resp, status, err, used), elapsed, calls, _ = asyncio.run(
+        _race({"a": (5.0, 200), "b": (5.0, 200)}, budget=0.3)
+    )
+
+    assert resp is None and status == 0
+    assert elapsed < 1.0
+    assert sorted(calls) == ["a", "b"]
+
+
+def test_404_and_persistent_5xx_models_cool_off(monkeypatch):
+    _setup(monkeypatch, ["missing", "broken", "good"])
+    monkeypatch.setattr(config, "HF_MAX_RETRIES", 2)
+    behaviour = {"missing": (0.0, 404), "broken": (0.0, 503), "good": (0.2, 200)}
+
+    (_, status, _, used), _, calls, _ = asyncio.run(_race(behaviour, hedge_delay=0.0))
+    assert status == 200 and used == "good"
+    assert calls.count("broken") == 2
+    assert set(hf.model_cooloff.stats()["cooling_off"]) == {"missing", "broken"}
+
+    # The next request only asks the healthy model
+    (_, status, _, used), _, calls, _ = asyncio.run(_race(behaviour, hedge_delay=0.0))
+    assert status == 200 and calls == ["good"]
@@ -0,0 +1,62 @@
+import asyncio
+import base64
+import random
+
+import httpx
+import pytest
+
+from benchmarks import loadtest, stubs
+
+
+async def _call_stubs(app):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://stubs") as client:
+        image = {"inline_data": {"mime_type": "image/jpeg", "data": base64.b64encode(b"jpeg-bytes").decode()}}
+        caption = await client.post("/v1beta/models/gemini-1.5-flash:generateContent",
+                                    json={"contents": [{"parts": [{"text": "Caption this"}, image]}]})
+        serp = await client.get("/serpapi/search", params={"q": "black shirt", "engine": "google_shopping"})
+        tavily = await client.post("/tavily/search", json={"query": "black shirt"})
+        hf = await client.post("/hf/models/Salesforce/blip-image-captioning-large", content=b"jpeg-bytes")
+        return caption, serp, tavily, hf
+
+
+def test_stubs_answer_in_each_provider_format():
+    app = stubs.create_app(latency={name: "fixed:0" for name in stubs.PROVIDERS}, serp_results=3)
+    caption, serp, tavily, hf = asyncio.run(_call_stubs(app))
+
+    text = caption.json()["candidates"][0]["content"]["parts"][0]["text"]
+    # Gemini and HF describe the same image the same way
+    assert text.lower() == hf.json()[0]["generated_text"]
+    assert len(serp.json()["shopping_results"]) == 3
+    assert all(r["title"] and r["link"] for r in tavily.json()["results"])
+
+
+def test_stub_error_rate_returns_503s():
+    app = stubs.create_app(latency={name: "0" for name in stubs.PROVIDERS}, error_rate={"serp": 1.0})
+    _, serp, tavily, _ = asyncio.run(_call_stubs(app))
+
+    assert serp.status_code == 503 and tavily.status_code == 200
+    assert app.state.stubs["serp"].errors == 1
+
+
+def test_latency_profiles():
+    rng = random.Random(1)
+    assert stubs.LatencyProfile("0.25").sample(rng) == 0.25
+    assert 0.1 <= stubs.LatencyProfile("uniform:0.1,0.2").sample(rng) <= 0.2
+    samples = sorted(stubs.LatencyProfile("lognormal:0.5,0.3").sample(rng) for _ in range(2001))
+    assert 0.45 < samples[1000] < 0.55
+    with pytest.raises(ValueError):
+        stubs.LatencyProfile("gamma:1,2")
+
+
+def test_summary_and_regression_check():
+    run = {"latencies": [i / 100 for i in range(1, 101)], "statuses": {"200": 99, "503": 1},
+           "partial": 2, "elapsed": 5.0}
+    report = loadtest.summarize(run)
+    assert (report["p50_ms"], report["p95_ms"], report["p99_ms"]) == (500.0, 950.0, 990.0)
+    assert report["throughput_rps"] == 20.0 and report["error_rate"] == 0.01
+
+    assert loadtest.compare(report, dict(report), tolerance=0.1) == []
+    slower = {**report, "p95_ms": 1200.0, "throughput_rps": 15.0}
+    regressions = loadtest.compare(slower, report, tolerance=0.1)
+    assert [line.split(":")[0] for line in regressions] == ["throughput_rps", "p95_ms"]
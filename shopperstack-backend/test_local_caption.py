@@ -0,0 +1,45 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from services import local_caption
+
+
+def _png(img):
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+def _solid(color, size=(120, 150)):
+    return _png(Image.new("RGB", size, color))
+
+
+def _stripes(first, second, size=(120, 150), width=6):
+    img = Image.new("RGB", size, first)
+    draw = ImageDraw.Draw(img)
+    for x in range(0, size[0], width * 2):
+        draw.rectangle([x, 0, x + width - 1, size[1]], fill=second)
+    return _png(img)
+
+
+def test_solid_images_are_named_by_their_colour():
+    assert local_caption.caption_image(_solid((20, 20, 20))) == "A solid black shirt"
+    assert local_caption.caption_image(_solid((200, 30, 50))) == "A solid red shirt"
+    # Tall images read as dresses
+    assert local_caption.caption_image(_solid((25, 35, 90), size=(80, 200))) == "A solid navy dress"
+
+
+def test_patterned_images_name_both_colours():
+    caption = local_caption.caption_image(_stripes((255, 255, 255), (25, 35, 90)))
+    assert caption.startswith("A patterned ")
+    assert set(caption.split()) >= {"white", "navy", "and"}
+
+
+def test_caption_batch_matches_single_captions_and_skips_undecodable_images():
+    images = [_solid((20, 20, 20)), b"not an image", _stripes((255, 255, 255), (200, 30, 50))]
+    captions = local_caption.caption_batch(images)
+    assert captions[1] is None
+    assert captions[0] == local_caption.caption_image(images[0])
+    assert captions[2] == local_caption.caption_image(images[2])
+    assert local_caption.caption_batch([]) == []
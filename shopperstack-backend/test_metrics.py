@@ -0,0 +1,65 @@
+import asyncio
+import json
+import logging
+
+from conftest import PNG_BYTES
+from utils.log import JsonFormatter, RequestIdFilter, request_id_var
+
+
+async def _upload_twice_then_scrape(backend):
+    async with backend() as (client, _):
+        files = {"file": ("shirt.png", PNG_BYTES, "image/png")}
+        first = await client.post("/upload", files=files, headers={"X-Request-ID": "trace-me"})
+        second = await client.post("/upload", files=files)
+        scrape = await client.get("/metrics")
+        return first, second, scrape
+
+
+def test_metrics_expose_requests_stages_providers_and_caches(backend):
+    first, second, scrape = asyncio.run(_upload_twice_then_scrape(backend))
+
+    assert first.headers["X-Request-ID"] == "trace-me"
+    assert second.headers["X-Request-ID"] and second.headers["X-Request-ID"] != "trace-me"
+
+    assert scrape.status_code == 200
+    text = scrape.text
+    assert 'shopperstack_requests_total{endpoint="/upload",method="POST",status="200"}' in text
+    for stage in ("encode", "caption", "refine", "search"):
+        assert f'shopperstack_stage_duration_seconds_count{{stage="{stage}"}}' in text
+    for provider in ("tavily", "serp"):
+        assert f'shopperstack_search_provider_duration_seconds_count{{provider="{provider}"}}' in text
+    # The second upload is served from the caption, refine and search caches
+    assert 'shopperstack_cache_hit_ratio{cache="caption"} 0.5' in text
+    assert 'shopperstack_requests_in_flight{endpoint="/upload"} 0.0' in text
+
+
+def test_json_log_lines_carry_the_request_id():
+    record = logging.LogRecord("shopperstack", logging.INFO, __file__, 1, "stage %s", ("caption",), None)
+    record.ms = 12.5
+    token = request_id_var.set("abc123")
+    try:
+        RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+
+    event = json.loads(JsonFormatter().format(record))
+    assert event["request_id"] == "abc123"
+    assert event["msg"] == "stage caption"
+    assert event["ms"] == 12.5
+
+
+def test_streamed_responses_are_timed_until_the_last_chunk(backend):
+    async def upload_then_scrape():
+        async with backend(delays={"serp": 0.3}) as (client, _):
+            files = {"file": ("shirt.png", PNG_BYTES, "image/png")}
+            response = await client.post("/upload/stream", files=files)
+            return response, (await client.get("/metrics")).text
+
+    response, text = asyncio.run(upload_then_scrape())
+
+    assert response.headers["X-Request-ID"]
+    assert json.loads(response.text.splitlines()[-1])["event"] == "summary"
+    assert 'shopperstack_requests_in_flight{endpoint="/upload/stream"} 0.0' in text
+    seconds = [line for line in text.splitlines()
+               if line.startswith('shopperstack_request_duration_seconds_sum{endpoint="/upload/stream"}')]
+    assert float(seconds[0].split()[-1]) >= 0.3
@@ -0,0 +1,74 @@
+import asyncio
+import io
+
+from PIL import Image
+
+from services.preprocess import preprocess_image, preprocess_image_async
+
+
+def _encode(img, fmt, **params):
+    out = io.BytesIO()
+    img.save(out, format=fmt, **params)
+    return out.getvalue()
+
+
+def _open(data):
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+def test_exif_orientation_is_applied_and_metadata_stripped():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # stored sideways: rotate 90° clockwise to display
+    exif[0x010F] = "Camera Maker"
+    original = _encode(Image.new("RGB", (40, 20), "red"), "JPEG", exif=exif)
+
+    processed, content_type, stats = preprocess_image(original)
+
+    img = _open(processed)
+    assert img.size == (20, 40)
+    assert not img.getexif()
+    assert content_type == "image/jpeg"
+    assert stats["original_size"] == [20, 40] and stats["size"] == [20, 40]
+
+
+def test_longest_edge_is_shrunk_to_max_edge():
+    original = _encode(Image.effect_noise((800, 400), 64).convert("RGB"), "PNG")
+
+    processed, content_type, stats = preprocess_image(original, max_edge=200, output_format="webp")
+
+    assert _open(processed).size == (200, 100)
+    assert content_type == "image/webp"
+    assert stats["original_size"] == [800, 400] and stats["size"] == [200, 100]
+    assert stats["bytes_saved"] == len(original) - len(processed) > 0
+
+
+def test_transparency_is_flattened_onto_white():
+    rgba = Image.new("RGBA", (16, 16), (0, 0, 0, 0))
+    palette = Image.new("RGBA", (16, 16), (0, 0, 0, 0)).convert("P")
+    for source in (rgba, palette):
+        processed, content_type, _ = preprocess_image(_encode(source, "PNG"))
+        img = _open(processed)
+        assert content_type == "image/jpeg" and img.mode == "RGB"
+        assert all(channel >= 250 for channel in img.getpixel((8, 8)))
+
+
+def test_small_jpeg_is_kept_when_reencoding_would_not_help():
+    original = _encode(Image.effect_noise((64, 64), 64).convert("RGB"), "JPEG", quality=30)
+
+    processed, content_type, stats = preprocess_image(original, quality=95)
+
+    assert processed is original
+    assert content_type == "image/jpeg"
+    assert stats["bytes_saved"] == 0
+
+
+def test_undecodable_bytes_pass_through_unchanged():
+    data = memoryview(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64)
+
+    processed, content_type, stats = asyncio.run(preprocess_image_async(data, "image/png"))
+
+    assert processed is data
+    assert content_type == "image/png"
+    assert stats["bytes_saved"] == 0 and "error" in stats
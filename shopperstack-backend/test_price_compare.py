@@ -0,0 +1,72 @@
+import pytest
+
+from agents.price_compare_agent import PriceCompareAgent, parse_price
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("$49.99", (49.99, "USD")),
+    ("US$ 1,299.50", (1299.5, "USD")),
+    ("₹1,299", (1299.0, "INR")),
+    ("Rs. 1,29,999", (129999.0, "INR")),
+    ("39,99 €", (39.99, "EUR")),
+    ("1.299,00 €", (1299.0, "EUR")),
+    ("£12", (12.0, "GBP")),
+    ("$20 - $30", (20.0, "USD")),
+    (24.5, (24.5, None)),
+    ("", (None, None)),
+    ("Out of stock", (None, None)),
+])
+def test_parse_price_formats(text, expected):
+    assert parse_price(text) == expected
+
+
+def test_euro_dot_is_grouping_only_before_exactly_three_digits():
+    assert parse_price("€ 1.299") == (1299.0, "EUR")
+    assert parse_price("€ 12.345.678") == (12345678.0, "EUR")
+    assert parse_price("€ 12.99") == (12.99, "EUR")
+    assert parse_price("€ 1.2999") == (1.2999, "EUR")
+    # Without a euro marker a single dot stays a decimal point
+    assert parse_price("$1.299") == (1.299, "USD")
+
+
+def test_currency_markers_must_be_whole_words():
+    # The "rs" ending "Covers" is not a rupee sign
+    assert parse_price("Covers 2 for $50") == (50.0, "USD")
+    assert parse_price("Shirts 2 for $50") == (50.0, "USD")
+    assert parse_price("Pack of 3 - Rs. 499") == (499.0, "INR")
+    assert parse_price("12 usda") == (12.0, None)
+
+
+def _offer(title, price, link, store):
+    return {"title": title, "price": price, "link": link, "source": store}
+
+
+def test_compare_dedupes_links_and_summarizes_each_product():
+    results = [
+        _offer("Black Cotton Shirt - Myntra", "₹1,299", "https://www.myntra.com/p/1?utm_source=a", "Myntra"),
+        _offer("Black Cotton Shirt", "₹1,299", "https://myntra.com/p/1", "Myntra"),  # same page again
+        _offer("Cotton Shirt Black | Ajio", "₹999", "https://ajio.com/p/7", "Ajio"),
+        _offer("Black Cotton Shirt", "₹1,499", "https://amazon.in/p/3", "Amazon"),
+        _offer("Black Cotton Shirt", "₹1,999", "https://flipkart.com/p/4", "Flipkart"),
+        _offer("Navy Denim Jacket", "₹2,499", "https://ajio.com/p/8", "Ajio"),
+        _offer("Black Cotton Shirt", None, "https://example.com/no-price", "Example"),
+    ]
+    products = PriceCompareAgent().compare(results)
+
+    assert len(products) == 2
+    shirt, jacket = products
+    assert (shirt["min_price"], shirt["median_price"], shirt["max_price"]) == (999.0, 1399.0, 1999.0)
+    assert shirt["currency"] == "INR"
+    assert (shirt["offer_count"], shirt["store_count"]) == (4, 4)
+    assert [o["amount"] for o in shirt["offers"]] == [999.0, 1299.0, 1499.0, 1999.0]
+    assert (jacket["min_price"], jacket["median_price"], jacket["max_price"], jacket["offer_count"]) == (2499.0, 2499.0, 2499.0, 1)
+
+
+def test_compare_keeps_currencies_apart():
+    results = [
+        _offer("Black Cotton Shirt", "$30", "https://shop.com/us", "Shop US"),
+        _offer("Black Cotton Shirt", "€ 28", "https://shop.com/eu", "Shop EU"),
+    ]
+    products = PriceCompareAgent().compare(results)
+    assert sorted(p["currency"] for p in products) == ["EUR", "USD"]
+    assert PriceCompareAgent().compare([]) == []
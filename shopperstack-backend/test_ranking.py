@@ -0,0 +1,45 @@
+from services.ranking import canonicalize_url, rank_results
+
+
+def test_canonical_urls_ignore_tracking_fragments_scheme_and_www():
+    canonical = "https://myntra.com/p/123?color=black&size=m"
+    for url in (
+        "https://www.myntra.com/p/123?size=m&color=black",
+        "http://WWW.Myntra.com/p/123/?color=black&size=m&utm_source=google&gclid=abc",
+        "https://myntra.com/p/123?srsltid=xyz&color=black&ref=home&size=m#reviews",
+    ):
+        assert canonicalize_url(url) == canonical
+    # Parameters that identify the product are kept
+    assert canonicalize_url("https://myntra.com/p/123?color=red&size=m") != canonical
+    assert canonicalize_url("") == ""
+
+
+def test_duplicate_links_and_near_duplicate_titles_collapse():
+    items = [
+        {"title": "Black Cotton Shirt", "link": "https://www.shop.com/p/1?utm_source=a"},
+        {"title": "Black Cotton Shirt", "link": "https://shop.com/p/1"},            # same page
+        {"title": "Black cotton shirt!", "link": "https://other.com/p/9"},         # same title
+        {"title": "Black Linen Formal Shirt", "link": "https://third.com/p/2"},
+        "not a result",
+    ]
+    ranked = rank_results("black cotton shirt", items)
+    assert [item["link"] for item in ranked] == [
+        "https://www.shop.com/p/1?utm_source=a", "https://third.com/p/2"
+    ]
+    # Inputs are never mutated; scores are added to copies
+    assert "score" not in items[0] and 0 < ranked[1]["score"] <= ranked[0]["score"] <= 1
+
+
+def test_min_score_and_top_k_cut_offs():
+    items = [{"title": f"Black Cotton Shirt Style {i}", "link": f"https://shop.com/{i}",
+              "snippet": f"variant {i} pattern {i * 7}"} for i in range(10)]
+    items.append({"title": "Garden Hose", "link": "https://shop.com/hose"})
+
+    ranked = rank_results("black cotton shirt", items, duplicate_threshold=1.1)
+    assert "https://shop.com/hose" not in [item["link"] for item in ranked]
+    assert len(ranked) == 10
+    assert len(rank_results("black cotton shirt", items, top_k=3, duplicate_threshold=1.1)) == 3
+
+    # With nothing relevant at all, results are kept rather than filtering to nothing
+    unrelated = rank_results("leather boots", items[-1:])
+    assert [item["link"] for item in unrelated] == ["https://shop.com/hose"]
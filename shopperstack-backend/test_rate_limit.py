@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from services import huggingface_blip as hf
+from services.serp import SerpService
+from utils import config, rate_limit
+from utils.cache import TTLCache
+from utils.circuit_breaker import CircuitBreaker
+from utils.rate_limit import BACKGROUND, INTERACTIVE, RateLimitedError, RateLimiter, get_limiter, priority_var
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def test_burst_then_paced_with_uploads_ahead_of_background():
+    # 20 tokens a second, 2 at once
+    limiter = RateLimiter("test", per_minute=1200, burst=2, max_queue=8, max_wait=1.0)
+    order = []
+
+    async def take(label, priority):
+        await limiter.acquire(priority=priority)
+        order.append(label)
+
+    async def scenario():
+        start = time.perf_counter()
+        await limiter.acquire()
+        await limiter.acquire()
+        burst = time.perf_counter() - start
+        background = asyncio.create_task(take("background", BACKGROUND))
+        await asyncio.sleep(0.01)
+        # Arrives later but is served first
+        await asyncio.gather(take("upload", INTERACTIVE), background)
+        return burst, time.perf_counter() - start
+
+    burst, elapsed = asyncio.run(scenario())
+    assert burst < 0.01
+    assert order == ["upload", "background"]
+    assert 0.08 <= elapsed < 0.5
+    assert limiter.stats()["granted"] == 4 and limiter.stats()["waiting"] == 0
+
+
+def test_saturated_limiter_sheds_instead_of_queueing():
+    limiter = RateLimiter("test", per_minute=60, burst=1, max_queue=1, max_wait=5.0)
+    limiter.acquire_sync()
+
+    async def scenario():
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        with pytest.raises(RateLimitedError):
+            await limiter.acquire()
+        shed_in = time.perf_counter() - start
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return shed_in
+
+    assert asyncio.run(scenario()) < 0.01
+    # Cancelled waiters leave the queue; a wait longer than the budget is refused up front
+    assert limiter.stats()["waiting"] == 0
+    with pytest.raises(RateLimitedError):
+        limiter.acquire_sync(timeout=0.1)
+    assert limiter.stats()["rejected"] == 2
+
+
+def test_rate_limited_serp_falls_back_without_counting_a_failure():
+    requests_seen = []
+
+    async def handler(request):
+        requests_seen.append(request)
+        return httpx.Response(200, json={"shopping_results": [{"title": "Shirt", "link": "https://x/1"}]})
+
+    limiter = RateLimiter("serp-test", per_minute=60, burst=1, max_queue=4, max_wait=0.1)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            serp = SerpService(async_client=client, breaker=CircuitBreaker("serp-test", limiter=limiter))
+            serp.api_key = "test-key"
+            first = await serp.search_products_async("black shirt")
+            start = time.perf_counter()
+            second = await serp.search_products_async("black shirt")
+            return first, second, time.perf_counter() - start, serp.breaker.stats()
+
+    first, second, elapsed, stats = asyncio.run(scenario())
+    assert len(first) == 1 and second == []
+    assert len(requests_seen) == 1
+    assert elapsed < 0.05
+    assert stats["calls"] == 1 and stats["failures"] == 0
+
+
+def test_hf_429_pauses_the_shared_limiter_and_retries_through_it(monkeypatch):
+    limiter = RateLimiter("huggingface", per_minute=6000, burst=5, max_wait=1.0)
+    monkeypatch.setattr(hf, "HF_API_KEY", "test-key")
+    monkeypatch.setattr(hf, "HF_MODEL_CANDIDATES", ["model"])
+    monkeypatch.setattr(hf, "model_cooloff", hf.ModelCooloff(60.0))
+    monkeypatch.setattr(hf, "get_limiter", lambda name: limiter)
+    monkeypatch.setattr(config, "HF_MAX_RETRIES", 2)
+    calls = []
+
+    async def handler(request):
+        calls.append(time.perf_counter())
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0.2"}, text="quota")
+        return httpx.Response(200, json=[{"generated_text": "a red dress"}])
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await hf.generate_caption_from_bytes_async(PNG_BYTES, "image/png", client=client)
+
+    assert asyncio.run(scenario()) == "a red dress"
+    assert calls[1] - calls[0] >= 0.2
+    assert limiter.stats()["pauses"] == 1
+
+    # With the bucket paused past the wait budget, Hugging Face is skipped outright
+    limiter.pause(5.0)
+    with pytest.raises(RateLimitedError):
+        asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_cache_refreshes_run_at_background_priority():
+    cache = TTLCache("test", ttl=0.0, stale_ttl=60.0)
+    seen = []
+
+    async def loader():
+        seen.append(priority_var.get())
+        return "value"
+
+    async def scenario():
+        await cache.get_or_load("key", loader)
+        # Stale: served at once and reloaded by a background task
+        await cache.get_or_load("key", loader)
+        await asyncio.sleep(0.01)
+        await cache.aclose()
+        return priority_var.get()
+
+    assert asyncio.run(scenario()) == INTERACTIVE
+    assert seen == [INTERACTIVE, BACKGROUND]
+
+
+def test_workers_split_each_provider_quota(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    monkeypatch.setattr(config, "RATE_LIMITS", {"serp": (60.0, 10), "gemini": (60.0, 2), "tavily": (0.0, 5)})
+    monkeypatch.setattr(config, "RATE_LIMIT_WORKERS", 4)
+
+    serp = get_limiter("serp").stats()
+    assert (serp["per_minute"], serp["burst"]) == (15.0, 2)
+    # Every worker can still make one call at once
+    assert get_limiter("gemini").stats()["burst"] == 1
+    assert get_limiter("tavily") is None
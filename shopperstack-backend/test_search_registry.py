@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import main
+from services.ranking import rank_results
+from services.search_registry import SearchRegistry
+from utils import config
+
+
+def _stub(name, delay, titles, calls=None, cancelled=None):
+    async def search(query):
+        if calls is not None:
+            calls.append(name)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(name)
+            raise
+        return [{"title": title, "link": f"https://{name}.example.com/{i}"} for i, title in enumerate(titles)]
+    return search
+
+
+async def _collect(registry, query, **options):
+    started = time.perf_counter()
+    arrived = [item async for item in registry.fan_out(query, **options)]
+    return arrived, time.perf_counter() - started
+
+
+def test_fan_out_queries_providers_concurrently_in_completion_order():
+    registry = SearchRegistry()
+    calls = []
+    registry.register("slow", _stub("slow", 0.3, ["Black shirt"], calls))
+    registry.register("fast", _stub("fast", 0.05, ["Black cotton shirt"], calls))
+    registry.register("medium", _stub("medium", 0.15, ["Black linen shirt"], calls))
+    registry.register("off", _stub("off", 0.0, ["Black shirt"], calls), enabled=False)
+
+    arrived, elapsed = asyncio.run(_collect(registry, "black shirt"))
+    assert [name for name, _ in arrived] == ["fast", "medium", "slow"]
+    assert all(item["provider"] == name for name, results in arrived for item in results)
+    # Concurrent: about the slowest provider, not the sum of all three
+    assert elapsed < 0.45
+    assert "off" not in calls
+
+
+def test_provider_timeout_and_failure_contribute_nothing():
+    registry = SearchRegistry()
+
+    async def broken(query):
+        raise RuntimeError("store API down")
+
+    registry.register("hung", _stub("hung", 5.0, ["Black shirt"]), timeout=0.05)
+    registry.register("broken", broken)
+    registry.register("ok", _stub("ok", 0.01, ["Black shirt"]))
+
+    arrived, elapsed = asyncio.run(_collect(registry, "black shirt"))
+    assert dict(arrived) == {"ok": [{"title": "Black shirt", "link": "https://ok.example.com/0", "provider": "ok"}],
+                             "broken": [], "hung": []}
+    assert elapsed < 1.0
+
+
+def test_first_k_returns_early_and_cancels_stragglers():
+    registry = SearchRegistry()
+    cancelled = []
+    registry.register("fast", _stub("fast", 0.02, ["Black cotton shirt", "Black slim shirt"], cancelled=cancelled))
+    registry.register("medium", _stub("medium", 0.08, ["Black linen shirt", "Red dress"], cancelled=cancelled))
+    registry.register("slow", _stub("slow", 2.0, ["Black shirt"], cancelled=cancelled))
+
+    arrived, elapsed = asyncio.run(_collect(registry, "black shirt", first_k=3, min_score=0.2))
+    assert [name for name, _ in arrived] == ["fast", "medium"]
+    assert elapsed < 1.0
+    assert cancelled == ["slow"]
+
+    # Irrelevant results don't count towards k: everything is waited for
+    arrived, _ = asyncio.run(_collect(registry, "leather boots", first_k=3, min_score=0.2))
+    assert [name for name, _ in arrived] == ["fast", "medium", "slow"]
+
+
+def test_weights_scale_scores_by_provider():
+    items = [
+        {"title": "Black cotton shirt", "link": "https://a/1", "provider": "generic"},
+        {"title": "Black shirt by store", "link": "https://b/1", "provider": "store"},
+    ]
+    assert rank_results("black cotton shirt", items)[0]["provider"] == "generic"
+    ranked = rank_results("black cotton shirt", items, weights={"generic": 0.3, "store": 3.0})
+    assert [item["provider"] for item in ranked] == ["store", "generic"]
+    assert ranked[0]["score"] <= 1.0
+
+
+def test_registered_store_joins_the_upload_search(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CAPTION_CACHE_PATH", str(tmp_path / "captions.sqlite3"))
+
+    async def scenario():
+        async with main.lifespan(main.app):
+            services = main.app.state.services
+            services.search_providers.register("tavily", _stub("tavily", 0.01, ["Black cotton shirt tee"]))
+            services.search_providers.register("serp", _stub("serp", 0.01, []), enabled=False)
+            services.search_providers.register("myntra", _stub("myntra", 0.02, ["Black shirt"]), weight=2.0)
+            return await main.search_products("black cotton shirt", services)
+
+    results = asyncio.run(scenario())
+    assert [item["provider"] for item in results] == ["myntra", "tavily"]
+
+
+def test_boolean_switches_accept_off_and_empty(monkeypatch):
+    for value, expected in [("off", False), ("", False), ("No", False), ("0", False),
+                            ("on", True), ("true", True), ("1", True)]:
+        monkeypatch.setenv("PROVIDER_WARMUP", value)
+        assert config._bool_env("PROVIDER_WARMUP", True) is expected
+    monkeypatch.delenv("PROVIDER_WARMUP")
+    assert config._bool_env("PROVIDER_WARMUP", True) is True
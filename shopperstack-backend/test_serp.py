@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.bench_serp_parse import legacy_parse, make_response
+from services import serp
+from services.serp import SerpService, parse_response
+from utils.circuit_breaker import CircuitBreaker
+
+PAGE_SIZE = 20
+
+
+def _service(handler) -> SerpService:
+    service = SerpService(async_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                          breaker=CircuitBreaker("serp"))
+    service.api_key = "test-key"
+    return service
+
+
+def _paged_handler(delays, requested, pages_available=10):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params.get("start", 0)) // serp.config.SERP_PAGE_SIZE
+        requested.append(page)
+        await asyncio.sleep(delays.get(page, 0.01))
+        items = [{"title": f"Black shirt {page}-{i}", "link": f"https://example.com/{page}/{i}", "price": "$10"}
+                 for i in range(PAGE_SIZE)] if page < pages_available else []
+        return httpx.Response(200, content=json.dumps({"shopping_results": items}).encode())
+    return handler
+
+
+def _search(service, **options):
+    async def scenario():
+        started = time.perf_counter()
+        results = await service.search_products_async("black shirt", **options)
+        await service.async_client.aclose()
+        return results, time.perf_counter() - started
+    return asyncio.run(scenario())
+
+
+def test_pages_are_fetched_concurrently_and_returned_in_order():
+    requested = []
+    service = _service(_paged_handler({0: 0.15, 1: 0.05, 2: 0.1}, requested))
+    results, elapsed = _search(service, pages=3, target=0)
+    assert sorted(requested) == [0, 1, 2]
+    assert [item["link"] for item in results[::PAGE_SIZE]] == [f"https://example.com/{p}/0" for p in range(3)]
+    assert elapsed < 0.28  # about the slowest page, not the sum
+
+
+def test_fetching_stops_at_the_target_and_cancels_later_pages():
+    requested = []
+    service = _service(_paged_handler({0: 0.02, 1: 0.05, 2: 2.0, 3: 2.0}, requested))
+    results, elapsed = _search(service, pages=4, target=30)
+    assert len(results) == 40
+    assert {item["link"].split("/")[3] for item in results} == {"0", "1"}
+    assert elapsed < 1.0
+
+
+def test_an_empty_page_ends_the_results():
+    requested = []
+    service = _service(_paged_handler({}, requested, pages_available=1))
+    results, _ = _search(service, pages=3, target=0)
+    assert len(results) == PAGE_SIZE
+
+
+def test_lean_parsing_matches_the_full_parse():
+    body = json.dumps(make_response(60)).encode()
+    assert parse_response(body) == legacy_parse(body)
+
+    odd = json.dumps({"shopping_results": [
+        {"title": "  Black shirt ", "link": "https://a/1", "price": None, "extracted_price": 9.99},
+        {"title": None, "link": "https://a/2"},
+        {"title": "No link"},
+        "not a product",
+    ]}).encode()
+    expected = [{"title": "Black shirt", "price": "", "link": "https://a/1", "source": "", "snippet": ""}]
+    assert parse_response(odd) == expected
+    # The standard library decoder is the fallback without orjson
+    orjson, serp.orjson = serp.orjson, None
+    try:
+        assert parse_response(odd) == expected
+    finally:
+        serp.orjson = orjson
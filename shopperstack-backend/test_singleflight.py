@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def _slow_call(calls, result="caption", delay=0.05, error=None):
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+    return call
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight("caption")
+    calls = []
+
+    async def scenario():
+        same = await asyncio.gather(*(flight.do("image", _slow_call(calls)) for _ in range(5)))
+        other = await flight.do("other image", _slow_call(calls, result="other"))
+        return same, other
+
+    same, other = asyncio.run(scenario())
+    assert same == ["caption"] * 5 and other == "other"
+    assert len(calls) == 2
+    assert flight.stats() == {"calls": 2, "coalesced": 4, "in_flight": 0}
+
+
+def test_a_failure_reaches_every_waiter():
+    flight = SingleFlight("search")
+    calls = []
+
+    async def scenario():
+        return await asyncio.gather(
+            *(flight.do("query", _slow_call(calls, error=RuntimeError("provider down"))) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    outcomes = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(isinstance(outcome, RuntimeError) and str(outcome) == "provider down" for outcome in outcomes)
+    # Nothing is left behind, so the next call tries again
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_one_cancelled_caller_does_not_cancel_the_shared_call():
+    flight = SingleFlight("refine")
+    calls = []
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.do("caption", _slow_call(calls, result="query")))
+        second = asyncio.ensure_future(flight.do("caption", _slow_call(calls, result="query")))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "query"
+    assert len(calls) == 1
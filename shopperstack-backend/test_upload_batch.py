@@ -0,0 +1,100 @@
+import asyncio
+from collections import Counter
+
+from conftest import PNG_BYTES
+from utils import config
+
+LATENCY = 0.05
+
+# Upload payload -> caption; "b" differs from "a" only in case, so both refine to one query
+CAPTIONS = {b"a": "A black shirt", b"b": "A BLACK shirt", b"c": "A red dress"}
+
+
+def _image(tag: bytes) -> bytes:
+    return PNG_BYTES + tag
+
+
+def _counting_stubs(calls: Counter, peak: Counter):
+    """Counting, fixed-latency provider stubs for the `backend` fixture."""
+    running = Counter()
+
+    def tracked(stage, answer):
+        async def call(value):
+            calls[stage] += 1
+            running[stage] += 1
+            peak[stage] = max(peak[stage], running[stage])
+            await asyncio.sleep(LATENCY)
+            running[stage] -= 1
+            return answer(value)
+        return call
+
+    return {
+        "caption": tracked("caption", lambda image: CAPTIONS[bytes(image[len(PNG_BYTES):])]),
+        "refine": tracked("refine", lambda caption: caption.lower() + " cotton"),
+        "tavily": tracked("tavily", lambda query: [
+            {"title": query.title(), "link": f"https://example.com/tavily/{query.replace(' ', '-')}"}]),
+        "serp": tracked("serp", lambda query: [
+            {"title": query.title(), "link": f"https://example.com/serp/{query.replace(' ', '-')}"}]),
+    }
+
+
+def _batch_upload(backend, files, calls: Counter, peak: Counter):
+    async def upload():
+        async with backend(**_counting_stubs(calls, peak)) as (client, _):
+            return await client.post("/upload/batch", files=files)
+    return asyncio.run(upload())
+
+
+def test_batch_dedupes_images_and_shares_searches(backend):
+    files = [
+        ("files", ("a.png", _image(b"a"), "image/png")),
+        ("files", ("a-again.png", _image(b"a"), "image/png")),
+        ("files", ("b.png", _image(b"b"), "image/png")),
+        ("files", ("c.png", _image(b"c"), "image/png")),
+        ("files", ("notes.png", b"plain text, not an image", "image/png")),
+    ]
+    calls, peak = Counter(), Counter()
+    response = _batch_upload(backend, files, calls, peak)
+
+    assert response.status_code == 200
+    body = response.json()
+    results = body["results"]
+    assert [r["filename"] for r in results] == ["a.png", "a-again.png", "b.png", "c.png", "notes.png"]
+
+    # Three distinct images, two distinct refined queries
+    assert calls == Counter({"caption": 3, "refine": 2, "tavily": 2, "serp": 2})
+    assert body["batch_info"] == {"files": 5, "unique_images": 3, "unique_queries": 2, "failed": 1}
+
+    assert results[1]["duplicate_of"] == 0
+    assert results[1]["raw_caption"] == results[0]["raw_caption"] == "A black shirt"
+    assert results[2]["refined_query"] == results[0]["refined_query"] == "a black shirt cotton"
+    assert results[3]["refined_query"] == "a red dress cotton"
+    assert results[3]["results"]
+
+    assert results[4]["success"] is False
+    assert results[4]["status_code"] == 415
+
+
+def test_batch_respects_per_stage_concurrency(monkeypatch, backend):
+    monkeypatch.setattr(config, "BATCH_CAPTION_CONCURRENCY", 2)
+    monkeypatch.setattr(config, "BATCH_SEARCH_CONCURRENCY", 1)
+    tags = [b"img%d" % i for i in range(8)]
+    for i, tag in enumerate(tags):
+        monkeypatch.setitem(CAPTIONS, tag, f"A shirt number {i}")
+
+    files = [("files", (f"{tag.decode()}.png", _image(tag), "image/png")) for tag in tags]
+    calls, peak = Counter(), Counter()
+    response = _batch_upload(backend, files, calls, peak)
+
+    assert response.status_code == 200
+    assert all(r["success"] for r in response.json()["results"])
+    assert calls["caption"] == 8
+    assert peak["caption"] == 2
+    assert peak["tavily"] == 1 and peak["serp"] == 1
+
+
+def test_batch_rejects_too_many_files(monkeypatch, backend):
+    monkeypatch.setattr(config, "BATCH_MAX_FILES", 2)
+    files = [("files", (f"{i}.png", _image(b"a"), "image/png")) for i in range(3)]
+    response = _batch_upload(backend, files, Counter(), Counter())
+    assert response.status_code == 400
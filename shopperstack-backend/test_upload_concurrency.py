@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from conftest import PNG_BYTES
+from services.gemini import GENERIC_CAPTION
+
+# Fixed latency for every stubbed provider call (seconds)
+LATENCY = 0.2
+CONCURRENT_UPLOADS = 10
+
+# Every upload gets its own caption, query and results, so the refine/search caches
+# and in-flight coalescing can't make a serial pipeline look concurrent
+STUBS = {
+    "caption": lambda image: f"A black button-up shirt number {int.from_bytes(image[-4:], 'big')}",
+    "refine": lambda caption: caption.lower().removeprefix("a ") + " long sleeve cotton",
+    "tavily": lambda query: [{"title": query.title(), "link": f"https://example.com/tavily/{query.split()[-4]}"}],
+    "serp": lambda query: [{"title": query.title(), "link": f"https://example.com/serp/{query.split()[-4]}"}],
+    "delays": dict.fromkeys(("caption", "refine", "tavily", "serp"), LATENCY),
+}
+
+
+def _timed_uploads(backend, count: int, first: int = 0) -> float:
+    async def uploads():
+        async with backend(**STUBS) as (client, services):
+
+            async def upload(i: int):
+                # Distinct bytes per upload so the caption cache never short-circuits
+                files = {"file": (f"img{i}.png", PNG_BYTES + i.to_bytes(4, "big"), "image/png")}
+                response = await client.post("/upload", files=files)
+                assert response.status_code == 200
+                body = response.json()
+                assert body["success"] is True
+                assert body["refined_query"] == f"black button-up shirt number {i} long sleeve cotton"
+
+            start = time.perf_counter()
+            await asyncio.gather(*(upload(i) for i in range(first, first + count)))
+            elapsed = time.perf_counter() - start
+            # Nothing was shared: every upload made its own refine and search calls
+            assert services.refine_flight.stats()["calls"] == count
+            assert services.search_flight.stats()["calls"] == 2 * count
+            return elapsed
+    return asyncio.run(uploads())
+
+
+def test_concurrent_uploads_finish_in_roughly_single_upload_time(backend):
+    # The result caches persist in the cache file; keep the single upload's query out of the batch
+    single = _timed_uploads(backend, 1, first=CONCURRENT_UPLOADS)
+    concurrent = _timed_uploads(backend, CONCURRENT_UPLOADS)
+
+    # caption + refine + parallel search = 3 * LATENCY for one upload; a blocking
+    # pipeline would take CONCURRENT_UPLOADS times that.
+    assert single >= 3 * LATENCY
+    assert concurrent < single * 2, f"{CONCURRENT_UPLOADS} uploads took {concurrent:.2f}s vs {single:.2f}s for one"
+
+
+def test_a_failed_caption_falls_back_to_the_generic_caption(backend):
+    def broken(image):
+        raise RuntimeError("vision call blew up")
+
+    async def upload():
+        async with backend(caption=broken) as (client, _):
+            return await client.post("/upload", files={"file": ("shirt.png", PNG_BYTES, "image/png")})
+
+    body = asyncio.run(upload()).json()
+    assert body["raw_caption"] == GENERIC_CAPTION
+    assert body["processing_info"]["preprocessing"]["error"] == "vision call blew up"
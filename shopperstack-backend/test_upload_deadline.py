@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import pytest
+
+from conftest import PNG_BYTES
+from services.gemini import GENERIC_CAPTION
+from utils import config
+
+STUBS = {
+    "refine": "black button-up shirt long sleeve cotton",
+    "tavily": [{"title": "Black Button-Up Shirt", "link": "https://example.com/tavily"}],
+    "serp": [{"title": "Black Cotton Long Sleeve Shirt", "link": "https://example.com/serp"}],
+}
+
+
+def _timed_upload(backend, deadline_ms, **delays):
+    async def upload():
+        async with backend(delays=delays, **STUBS) as (client, _):
+            start = time.perf_counter()
+            response = await client.post(
+                "/upload",
+                files={"file": ("shirt.png", PNG_BYTES, "image/png")},
+                headers={"X-Deadline-Ms": str(deadline_ms)}
+            )
+            return response, time.perf_counter() - start
+    return asyncio.run(upload())
+
+
+def test_slow_refine_and_search_are_cut_off_at_the_deadline(backend):
+    response, elapsed = _timed_upload(backend, 400, refine=2.0, serp=2.0)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert elapsed < 1.0
+    assert body["partial"] is True
+    assert body["degraded_stages"] == ["refine", "search:serp"]
+    # Refinement overran, so the raw caption was searched; Tavily still answered in time
+    assert body["refined_query"] == body["raw_caption"] == "A black button-up shirt"
+    assert [r["link"] for r in body["results"]] == ["https://example.com/tavily"]
+    assert body["processing_info"]["deadline"]["budget_ms"] == 400
+
+
+def test_slow_caption_falls_back_to_local_captioner(backend):
+    response, elapsed = _timed_upload(backend, 300, caption=2.0)
+
+    body = response.json()
+    assert elapsed < 1.0
+    assert body["degraded_stages"] == ["caption"]
+    # The stub bytes aren't a decodable image, so the local captioner gives the generic caption
+    assert body["raw_caption"] == GENERIC_CAPTION
+
+
+def test_fast_pipeline_is_not_partial(backend):
+    response, _ = _timed_upload(backend, 2000)
+
+    body = response.json()
+    assert body["partial"] is False and body["degraded_stages"] == []
+    assert body["refined_query"] == "black button-up shirt long sleeve cotton"
+    assert len(body["results"]) == 2
+
+
+@pytest.mark.parametrize("header", ["0", "-5", "nan", "inf", "soon"])
+def test_invalid_deadline_header_uses_the_default_budget(backend, header):
+    response, _ = _timed_upload(backend, header)
+
+    assert response.status_code == 200
+    assert response.json()["processing_info"]["deadline"]["budget_ms"] == config.UPLOAD_DEADLINE_SECONDS * 1000
+
+
+def test_deadline_header_is_capped_at_the_maximum(backend):
+    response, _ = _timed_upload(backend, config.UPLOAD_DEADLINE_MAX_SECONDS * 1000 * 10)
+
+    assert response.json()["processing_info"]["deadline"]["budget_ms"] == config.UPLOAD_DEADLINE_MAX_SECONDS * 1000
+
+
+def test_refine_timeout_without_a_deadline_falls_back_to_the_caption(backend):
+    async def timed_out(caption):
+        raise asyncio.TimeoutError
+
+    async def upload():
+        # /upload/batch runs its stages without a Deadline
+        async with backend(**{**STUBS, "refine": timed_out}) as (client, _):
+            return await client.post("/upload/batch", files=[("files", ("shirt.png", PNG_BYTES, "image/png"))])
+
+    entry = asyncio.run(upload()).json()["results"][0]
+    assert entry["success"] is True
+    assert entry["refined_query"] == entry["raw_caption"] == "A black button-up shirt"
+
+
+def test_a_search_cut_off_by_the_deadline_still_fills_the_cache(backend):
+    calls = []
+
+    def serp(query):
+        calls.append(query)
+        return STUBS["serp"]
+
+    async def uploads():
+        async with backend(**{**STUBS, "serp": serp}, delays={"serp": 0.5}) as (client, _):
+            bodies = []
+            for _ in range(2):
+                response = await client.post("/upload", files={"file": ("shirt.png", PNG_BYTES, "image/png")},
+                                             headers={"X-Deadline-Ms": "400"})
+                bodies.append(response.json())
+                # Let the abandoned provider call finish
+                await asyncio.sleep(0.3)
+            return bodies
+
+    first, second = asyncio.run(uploads())
+    assert first["degraded_stages"] == ["search:serp"]
+    assert second["degraded_stages"] == [] and len(second["results"]) == 2
+    assert len(calls) == 1
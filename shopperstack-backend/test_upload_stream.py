@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import main
+from conftest import PNG_BYTES
+
+SHARED_LINK = "https://example.com/black-shirt"
+STUBS = {
+    "caption": "A black button-up shirt",
+    "refine": "black button-up shirt",
+    "tavily": [{"title": "Black Button-Up Shirt", "link": SHARED_LINK}],
+    # Serp finds the same product again (behind a tracking parameter) plus one of its own
+    "serp": [{"title": "Black Button Up Shirt Cotton", "link": SHARED_LINK + "?utm_source=serp"},
+             {"title": "Black Long Sleeve Shirt", "link": "https://example.com/long-sleeve"}],
+    "delays": {"serp": 0.05},
+}
+
+
+def _stream(backend):
+    async def upload():
+        async with backend(**STUBS) as (client, _):
+            response = await client.post("/upload/stream", files={"file": ("shirt.png", PNG_BYTES, "image/png")})
+            return response, [json.loads(line) for line in response.text.splitlines() if line]
+    return asyncio.run(upload())
+
+
+def test_stream_emits_stages_in_order_without_repeating_links(backend):
+    response, events = _stream(backend)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [(e["event"], e.get("provider")) for e in events] == [
+        ("raw_caption", None), ("refined_query", None), ("results", "tavily"), ("results", "serp"), ("summary", None)
+    ]
+    assert events[0]["raw_caption"] == "A black button-up shirt"
+    assert events[1]["refined_query"] == "black button-up shirt"
+
+    streamed = [item["link"] for e in events if e["event"] == "results" for item in e["results"]]
+    assert streamed == [SHARED_LINK, "https://example.com/long-sleeve"]
+
+    summary = events[-1]
+    assert summary["success"] is True and summary["partial"] is False
+    assert summary["result_counts"] == {"tavily": 1, "serp": 1}
+    assert summary["total_results"] == len(summary["results"]) == 2
+
+
+def test_stream_reports_failures_in_band(backend, monkeypatch):
+    def broken(candidates):
+        raise RuntimeError("comparison blew up")
+
+    monkeypatch.setattr(main.price_compare_agent, "compare", broken)
+    response, events = _stream(backend)
+
+    # Headers were already sent with 200, so the failure arrives as the last event
+    assert response.status_code == 200
+    assert [e["event"] for e in events] == ["raw_caption", "refined_query", "results", "results", "error"]
+    assert "comparison blew up" in events[-1]["detail"]
@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+
+from conftest import PNG_BYTES
+from utils import config
+
+
+def _post(backend, build):
+    async def upload():
+        async with backend() as (client, services):
+            calls = []
+            caption = services.gemini.caption_image_async
+
+            async def counted(image, *args, **kwargs):
+                calls.append(1)
+                return await caption(image, *args, **kwargs)
+
+            services.gemini.caption_image_async = counted
+            response = await build(client)
+            return response, calls
+    return asyncio.run(upload())
+
+
+def _upload(content, content_type="image/png"):
+    return lambda client: client.post("/upload", files={"file": ("shirt.png", content, content_type)})
+
+
+def test_declared_size_over_the_limit_is_refused_before_parsing(backend, monkeypatch):
+    monkeypatch.setattr(config, "MAX_UPLOAD_BYTES", 1024)
+    response, calls = _post(backend, _upload(PNG_BYTES + b"\x00" * (32 * 1024)))
+    assert response.status_code == 413
+    assert "1024 byte upload limit" in response.json()["detail"]
+    assert not calls
+
+
+def test_streamed_body_over_the_limit_is_refused(backend, monkeypatch):
+    monkeypatch.setattr(config, "MAX_UPLOAD_BYTES", 1024)
+    request = httpx.Request("POST", "http://test/upload",
+                            files={"file": ("shirt.png", PNG_BYTES + b"\x00" * 4096, "image/png")})
+    body = request.read()
+
+    async def chunked():
+        # No Content-Length, so only the streaming read can enforce the limit
+        for start in range(0, len(body), 512):
+            yield body[start:start + 512]
+
+    response, calls = _post(backend, lambda client: client.post(
+        "/upload", content=chunked(), headers={"content-type": request.headers["content-type"]}))
+    assert response.status_code == 413
+    assert not calls
+
+
+def test_chunked_body_is_cut_off_while_it_streams_in(backend, monkeypatch):
+    monkeypatch.setattr(config, "MAX_UPLOAD_BYTES", 1024)
+    monkeypatch.setattr(config, "UPLOAD_MULTIPART_OVERHEAD", 1024)
+    request = httpx.Request("POST", "http://test/upload",
+                            files={"file": ("shirt.png", PNG_BYTES + b"\x00" * 100_000, "image/png")})
+    body = request.read()
+    sent = []
+
+    async def chunked():
+        for start in range(0, len(body), 512):
+            sent.append(start)
+            yield body[start:start + 512]
+
+    response, calls = _post(backend, lambda client: client.post(
+        "/upload", content=chunked(), headers={"content-type": request.headers["content-type"]}))
+    assert response.status_code == 413
+    assert "1024 byte upload limit" in response.json()["detail"]
+    # Refused after about 2 KB, not after buffering the whole 100 KB
+    assert len(sent) < 10
+    assert not calls
+
+
+def test_non_image_bytes_with_an_image_content_type_are_refused(backend):
+    response, calls = _post(backend, _upload(b"%PDF-1.7 not really a png"))
+    assert response.status_code == 415
+    assert not calls
+
+
+def test_empty_file_is_refused(backend):
+    response, calls = _post(backend, _upload(b""))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Uploaded file is empty"
+    assert not calls
+
+
+def test_a_valid_image_passes_validation(backend):
+    response, calls = _post(backend, _upload(PNG_BYTES))
+    assert response.status_code == 200
+    assert len(calls) == 1
@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import numpy as np
+
+from benchmarks.bench_local_caption import make_image
+from services.image_features import FEATURE_DIM, embed_images
+from services.vector_index import VectorIndex, VisualSearch, build_from_catalog
+from utils import config
+
+
+def _catalog_with_images(tmp_path, count=6):
+    images = [make_image(256, seed) for seed in range(count)]
+    (tmp_path / "images").mkdir()
+    with open(tmp_path / "catalog.jsonl", "w") as f:
+        for i, image in enumerate(images):
+            (tmp_path / "images" / f"{i}.jpg").write_bytes(image)
+            link = "https://example.com/tavily" if i == 0 else f"https://example.com/p/{i}"
+            f.write(json.dumps({"title": f"Product {i}", "link": link, "image_path": f"images/{i}.jpg"}) + "\n")
+        f.write(json.dumps({"title": "No picture", "link": "https://example.com/none"}) + "\n")
+    return images
+
+
+def test_features_are_unit_vectors_that_match_the_same_image():
+    images = [make_image(512, seed) for seed in range(4)] + [b"not an image"]
+    vectors = embed_images(images)
+
+    assert vectors.shape == (5, FEATURE_DIM) and vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:4], axis=1), 1.0, atol=1e-5)
+    assert not vectors[4].any()
+    # The same garment re-encoded at another size is still its own nearest neighbour
+    resized = embed_images([make_image(1024, 2)])[0]
+    assert int(np.argmax(vectors[:4] @ resized)) == 2
+
+
+def test_flat_quantized_and_ivf_indexes_agree_and_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2000, 32)).astype(np.float32)
+    records = [json.dumps({"link": f"https://example.com/{i}"}).encode() for i in range(2000)]
+    queries = vectors[[5, 700, 1999]] + 0.05 * rng.standard_normal((3, 32)).astype(np.float32)
+
+    for options in ({}, {"quantize": True}, {"nlist": 16}, {"nlist": 16, "quantize": True}):
+        index = VectorIndex.build(vectors, records, **options)
+        top = [matches[0][0] for matches in index.search(queries, k=3, nprobe=16)]
+        assert [index.record(row)["link"] for row in top] == [
+            "https://example.com/5", "https://example.com/700", "https://example.com/1999"
+        ]
+
+        index.save(str(tmp_path / "index"))
+        loaded = VectorIndex.load(str(tmp_path / "index"))
+        assert not loaded.vectors.flags.writeable
+        assert loaded.search(queries, k=3, nprobe=4) == index.search(queries, k=3, nprobe=4)
+
+    assert VectorIndex.build(vectors, records, quantize=True).vectors.nbytes * 4 == vectors.nbytes
+
+
+def test_visual_search_finds_the_uploaded_product_and_picks_up_rebuilds(tmp_path):
+    images = _catalog_with_images(tmp_path)
+    visual = VisualSearch(str(tmp_path / "index"), top_k=3)
+    assert visual.search(images[3]) == [] and not visual.reload_if_changed()
+
+    build_from_catalog(str(tmp_path / "catalog.jsonl"), str(tmp_path / "index"), nlist=2)
+    assert visual.reload_if_changed()
+    matches = visual.search(images[3])
+    assert matches[0]["link"] == "https://example.com/p/3"
+    assert matches[0]["visual_score"] > 0.99
+    assert visual.stats()["vectors"] == 6 and visual.stats()["nlist"] == 2
+
+    # An index built by another embedder is never queried with this one's vectors
+    other = VisualSearch(str(tmp_path / "index"), embedder="services.image_features:embed_images")
+    assert not other.reload_if_changed() and not other.loaded
+
+
+def test_upload_returns_similar_items_alongside_results(tmp_path, monkeypatch, backend):
+    images = _catalog_with_images(tmp_path)
+    build_from_catalog(str(tmp_path / "catalog.jsonl"), str(tmp_path / "index"))
+    monkeypatch.setattr(config, "VISUAL_INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(config, "VISUAL_MIN_SCORE", 0.0)
+
+    async def upload():
+        async with backend(caption="A red dress", refine="red dress",
+                           tavily=[{"title": "Red Dress", "link": "https://example.com/tavily"}],
+                           serp=[]) as (client, services):
+            while not services.visual.loaded:
+                await asyncio.sleep(0.01)
+            return await client.post("/upload", files={"file": ("look.jpg", images[0], "image/jpeg")})
+
+    body = asyncio.run(upload()).json()
+
+    # The stubbed Tavily result is also the closest product visually: it is annotated, not repeated
+    tavily_result = next(r for r in body["results"] if r["link"] == "https://example.com/tavily")
+    assert tavily_result["visual_score"] > 0.99
+    similar = [item["link"] for item in body["similar_items"]]
+    assert similar and "https://example.com/tavily" not in similar
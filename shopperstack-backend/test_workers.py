@@ -0,0 +1,103 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.loadtest import _free_port
+from utils.cache import SharedStore, TTLCache
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_workers_share_refine_and_search_results(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    # Two caches over one file stand in for two worker processes
+    first = TTLCache("search", ttl=60.0, stale_ttl=60.0, shared=SharedStore(path))
+    second = TTLCache("search", ttl=60.0, stale_ttl=60.0, shared=SharedStore(path))
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return [{"title": "Black shirt", "url": "https://x/1"}]
+
+    async def scenario():
+        loaded = await first.get_or_load(("serp", "black shirt"), loader)
+        shared = await second.get_or_load(("serp", "black shirt"), loader)
+        again = await second.get_or_load(("serp", "black shirt"), loader)
+        return loaded, shared, again
+
+    loaded, shared, again = asyncio.run(scenario())
+    assert loaded == shared == again
+    assert len(calls) == 1
+    stats = second.stats()
+    assert stats["shared_hits"] == 1 and stats["hits"] == 1 and stats["misses"] == 0
+
+
+def test_shared_entries_keep_their_age(tmp_path):
+    store = SharedStore(str(tmp_path / "cache.sqlite3"))
+    store.set("refine", "black shirt", "old query", lifetime=60.0)
+    cache = TTLCache("refine", ttl=0.0, stale_ttl=60.0, shared=store)
+
+    async def reload():
+        return "new query"
+
+    async def scenario():
+        # Already past its TTL: served stale while this worker refreshes it
+        served = await cache.get_or_load("black shirt", reload)
+        await asyncio.sleep(0.05)
+        await cache.aclose()
+        return served
+
+    assert asyncio.run(scenario()) == "old query"
+    assert cache.stats()["refreshes"] == 1
+    assert store.get("refine", "black shirt")[0] == "new query"
+    # Values that aren't JSON stay process-local
+    store.set("refine", "opaque", object(), lifetime=60.0)
+    assert store.get("refine", "opaque") is None
+
+
+def test_launcher_forks_workers_and_drains_on_sigterm(tmp_path):
+    if not hasattr(os, "fork"):
+        return
+    port = _free_port()
+    env = {**os.environ, "CAPTION_CACHE_PATH": str(tmp_path / "captions.sqlite3"), "LOG_LEVEL": "ERROR",
+           "GEMINI_API_KEY": "", "HF_API_KEY": "", "SERPAPI_KEY": "", "TAVILY_API_KEY": "",
+           "RATE_LIMIT_SERP_PER_MINUTE": "60", "RATE_LIMIT_SERP_BURST": "10"}
+    proc = subprocess.Popen(
+        [sys.executable, "run.py", "--workers", "2", "--port", str(port), "--log-level", "warning",
+         "--no-access-log", "--graceful-timeout", "5"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 60
+        pids, answered, health = set(), 0, None
+        while time.monotonic() < deadline and proc.poll() is None and len(pids) < 2 and answered < 50:
+            try:
+                # A fresh connection each time, so both workers get to accept
+                response = httpx.get(f"http://127.0.0.1:{port}/health", timeout=2.0)
+                health = response.json()
+                pids.add(health["worker_pid"])
+                answered += 1
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        assert proc.poll() is None
+        assert pids and proc.pid not in pids
+        # The two workers split the SerpApi quota
+        assert health["rate_limits"]["serp"]["per_minute"] == 30
+        assert health["rate_limits"]["serp"]["burst"] == 5
+
+        children = f"/proc/{proc.pid}/task/{proc.pid}/children"
+        if os.path.exists(children):
+            with open(children) as f:
+                assert len(f.read().split()) == 2
+
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=20) == 0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
@@ -0,0 +1,404 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from utils.rate_limit import BACKGROUND, priority_var
+
+logger = logging.getLogger(__name__)
+
+
+class CaptionCache:
+    """Two-tier cache for image captions keyed by a hash of the raw image bytes.
+
+    A small in-memory LRU (with TTL) sits in front of a SQLite file so repeat
+    uploads skip the vision call entirely and cached captions survive restarts.
+    Every worker process opens the same file, so a caption generated by one
+    worker is a disk hit for the others.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1024, memory_ttl: float = 3600.0, disk_ttl: float = 30 * 24 * 3600.0):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.memory_ttl = memory_ttl
+        self.disk_ttl = disk_ttl
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = _connect(path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS captions ("
+                "key TEXT PRIMARY KEY, caption TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except (OSError, sqlite3.Error) as e:
+            # Keep serving from memory only if the disk tier is unavailable
+            logger.warning("Caption cache disk tier unavailable (%s): %s", path, e)
+            self._db = None
+
+    @staticmethod
+    def key_for(image_bytes: bytes) -> str:
+        """Content address for an image: SHA-256 of the raw bytes."""
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, caption = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return caption
+                del self._memory[key]
+
+            caption = self._disk_get(key, now)
+            if caption is not None:
+                self._memory_set(key, caption, now)
+                self.disk_hits += 1
+                return caption
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, caption: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._memory_set(key, caption, now)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO captions (key, caption, created_at) VALUES (?, ?, ?)",
+                    (key, caption, now),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("Caption cache write failed: %s", e)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_enabled": self._db is not None,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # Internal helpers (callers hold self._lock)
+
+    def _memory_set(self, key: str, caption: str, now: float) -> None:
+        self._memory[key] = (now + self.memory_ttl, caption)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT caption, created_at FROM captions WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Caption cache read failed: %s", e)
+            return None
+        if row is None:
+            return None
+        caption, created_at = row
+        if created_at + self.disk_ttl <= now:
+            try:
+                self._db.execute("DELETE FROM captions WHERE key = ?", (key,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                # Another worker holds the write lock; the row goes on a later read or write
+                logger.warning("Caption cache cleanup failed: %s", e)
+            return None
+        return caption
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """Open a cache file that several worker processes read and write at once."""
+    db = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+    if path != ":memory:":
+        # Readers never wait for a writer; commits skip the fsync (a crash only loses cache entries)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+class SharedStore:
+    """Result cache entries in a SQLite file shared by every worker process.
+
+    Sits behind each TTLCache's in-memory tier, so a refinement or search done
+    by one worker is served to the others instead of being repeated per process.
+    Values are stored as JSON with a wall-clock timestamp (monotonic clocks
+    aren't comparable across processes). Expired rows are pruned as writes go by.
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+        self.reads = 0
+        self.hits = 0
+        self.writes = 0
+
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = _connect(path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "cache TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (cache, key))"
+            )
+            self._db.commit()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Shared result cache unavailable (%s): %s", path, e)
+            self._db = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def get(self, cache: str, key) -> Optional[tuple]:
+        """(value, age in seconds) of an unexpired entry, else None."""
+        if self._db is None:
+            return None
+        now = time.time()
+        with self._lock:
+            self.reads += 1
+            try:
+                row = self._db.execute(
+                    "SELECT value, stored_at FROM results WHERE cache = ? AND key = ? AND expires_at > ?",
+                    (cache, _encode_key(key), now),
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning("Shared result cache read failed: %s", e)
+                return None
+            if row is None:
+                return None
+            self.hits += 1
+        return json.loads(row[0]), max(0.0, now - row[1])
+
+    def set(self, cache: str, key, value, lifetime: float) -> None:
+        """Store `value` for `lifetime` seconds; values that aren't JSON are kept out."""
+        if self._db is None:
+            return
+        try:
+            encoded = json.dumps(value)
+        except (TypeError, ValueError):
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (cache, key, value, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (cache, _encode_key(key), encoded, now, now + lifetime),
+                )
+                self._writes += 1
+                if self._writes % self.PRUNE_EVERY == 0:
+                    self._db.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+                self._db.commit()
+                self.writes += 1
+            except sqlite3.Error as e:
+                logger.warning("Shared result cache write failed: %s", e)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self._db is not None,
+                "reads": self.reads,
+                "hits": self.hits,
+                "writes": self.writes,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def _encode_key(key) -> str:
+    return json.dumps(key, separators=(",", ":"))
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text_key(text: str) -> str:
+    """Cache key for free text: case-folded, trimmed, whitespace and edge punctuation collapsed."""
+    return _WHITESPACE.sub(" ", (text or "").casefold()).strip(" \t.,;:!?\"'")
+
+
+class TTLCache:
+    """Async in-memory result cache with per-entry TTL and stale-while-revalidate.
+
+    Fresh entries are returned as-is. Once an entry passes its TTL it is still
+    served (up to `stale_ttl` seconds longer) while a single background task
+    reloads it, so popular keys never wait on a cold provider call. Refreshes
+    run at background priority in the provider rate limiters.
+
+    With a `shared` store, memory misses are looked up there before loading and
+    every stored value is written through, so worker processes share results.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0.0, max_entries: int = 1024,
+                 shared: Optional[SharedStore] = None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max(1, max_entries)
+        self.shared = shared if shared is not None and shared.enabled else None
+
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._refreshing: Dict[Any, asyncio.Task] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    async def get_or_load(self, key, loader: Callable[[], Awaitable[Any]],
+                          cacheable: Callable[[Any], bool] = lambda value: value is not None):
+        """Return the cached value for `key`, calling `loader()` on a miss.
+
+        Values rejected by `cacheable` (e.g. empty provider responses) are returned
+        but not stored. Loader exceptions propagate on a miss and are logged during
+        a background refresh, where the stale value keeps being served.
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = now - stored_at
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                self._schedule_refresh(key, loader, cacheable)
+                return value
+            del self._entries[key]
+
+        if self.shared is not None:
+            found = await asyncio.to_thread(self.shared.get, self.name, key)
+            if found is not None:
+                value, age = found
+                # Keep the writer's age, so the entry goes stale on schedule in every worker
+                self._store(key, value, stored_at=now - age)
+                self.shared_hits += 1
+                if age >= self.ttl:
+                    self._schedule_refresh(key, loader, cacheable)
+                return value
+
+        self.misses += 1
+        # Load and store in one shielded task: a caller that gives up (a blown deadline,
+        # a cancelled request) doesn't discard the result, so the next lookup is a hit
+        task = asyncio.ensure_future(self._load(key, loader, cacheable))
+        task.add_done_callback(_retrieve_exception)
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        served = self.hits + self.stale_hits + self.shared_hits
+        lookups = served + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "entries": len(self._entries),
+        }
+
+    async def aclose(self) -> None:
+        """Cancel in-flight background refreshes."""
+        tasks: Set[asyncio.Task] = set(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._refreshing.clear()
+
+    def _store(self, key, value, stored_at: Optional[float] = None) -> None:
+        self._entries[key] = (time.monotonic() if stored_at is None else stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _save(self, key, value) -> None:
+        self._store(key, value)
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.set, self.name, key, value, self.ttl + self.stale_ttl)
+
+    async def _load(self, key, loader, cacheable):
+        value = await loader()
+        if cacheable(value):
+            await self._save(key, value)
+        return value
+
+    def _schedule_refresh(self, key, loader, cacheable) -> None:
+        # One background refresh per key at a time
+        if key in self._refreshing:
+            return
+        self._refreshing[key] = asyncio.create_task(self._refresh(key, loader, cacheable))
+
+    async def _refresh(self, key, loader, cacheable) -> None:
+        # Runs in its own task context: its provider calls queue behind uploads
+        priority_var.set(BACKGROUND)
+        try:
+            await self._load(key, loader, cacheable)
+            self.refreshes += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.warning("%s cache refresh failed for %r: %s", self.name, key, e)
+        finally:
+            self._refreshing.pop(key, None)
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    # Mark a failure as retrieved even if every caller stopped waiting for it
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,235 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from utils import config
+from utils.metrics import provider_error
+from utils.rate_limit import RateLimitedError, RateLimiter
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit is open (retry in {retry_in:.1f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Per-provider circuit breaker with a rolling window of outcomes and latencies.
+
+    Closed: calls go through and are recorded. Once the window holds at least
+    `min_calls` outcomes and the error rate reaches `failure_rate` (or the share of
+    calls slower than `slow_call_seconds` reaches `slow_call_rate`) the breaker
+    opens and every call fails fast with CircuitOpenError, so callers take their
+    fallback immediately. After `open_seconds` it goes half-open and lets
+    `half_open_probes` calls through: a success closes it, a failure reopens it.
+
+    With a `limiter`, `call` and `call_sync` also wait for the provider's rate-limit
+    token once the breaker admits them. A call the limiter refuses raises
+    RateLimitedError, and counts as neither success nor failure, since it never
+    reached the provider.
+
+    Thread-safe, so the blocking provider paths running in worker threads can
+    share a breaker with the async ones.
+    """
+
+    def __init__(self, name: str, window_seconds: Optional[float] = None, min_calls: Optional[int] = None,
+                 failure_rate: Optional[float] = None, slow_call_seconds: Optional[float] = None,
+                 slow_call_rate: Optional[float] = None, open_seconds: Optional[float] = None,
+                 half_open_probes: Optional[int] = None, max_samples: int = 512,
+                 limiter: Optional[RateLimiter] = None):
+        self.name = name
+        self.limiter = limiter
+        self.window_seconds = config.BREAKER_WINDOW_SECONDS if window_seconds is None else window_seconds
+        self.min_calls = max(1, config.BREAKER_MIN_CALLS if min_calls is None else min_calls)
+        self.failure_rate = config.BREAKER_FAILURE_RATE if failure_rate is None else failure_rate
+        self.slow_call_seconds = config.BREAKER_SLOW_CALL_SECONDS if slow_call_seconds is None else slow_call_seconds
+        self.slow_call_rate = config.BREAKER_SLOW_CALL_RATE if slow_call_rate is None else slow_call_rate
+        self.open_seconds = config.BREAKER_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.half_open_probes = max(1, config.BREAKER_HALF_OPEN_PROBES if half_open_probes is None else half_open_probes)
+
+        # (finished_at, succeeded, seconds)
+        self._samples: Deque[Tuple[float, bool, float]] = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._closed_at = float("-inf")
+        self._probes = 0
+
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._state
+
+    def allow(self) -> bool:
+        """Reserve a call slot. Every True must be followed by `record` or `release`."""
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            provider_error(self.name, "circuit_open")
+            return False
+
+    def record(self, succeeded: bool, seconds: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.calls += 1
+            if not succeeded:
+                self.failures += 1
+                provider_error(self.name)
+            self._samples.append((now, succeeded, seconds))
+
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if succeeded and seconds < self.slow_call_seconds:
+                    self._close()
+                else:
+                    self._open(now)
+            elif self._state == CLOSED and self._tripped(now):
+                self._open(now)
+
+    def release(self) -> None:
+        """Give back a slot whose call was cancelled before it produced an outcome."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], succeeded: Optional[Callable[[Any], bool]] = None):
+        """Await `fn()` through the breaker; raises CircuitOpenError without calling it when open.
+        Exceptions, and results for which `succeeded(result)` is false, count as failures.
+        """
+        self._reserve()
+        if self.limiter is not None:
+            try:
+                await self.limiter.acquire()
+            except BaseException:
+                self.release()
+                raise
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except RateLimitedError:
+            # Shed by a limiter inside `fn` before reaching the provider
+            self.release()
+            raise
+        except Exception:
+            self.record(False, time.monotonic() - started)
+            raise
+        except BaseException:
+            # Cancelled: no outcome to record
+            self.release()
+            raise
+        self.record(succeeded is None or bool(succeeded(result)), time.monotonic() - started)
+        return result
+
+    def call_sync(self, fn: Callable[[], Any], succeeded: Optional[Callable[[Any], bool]] = None):
+        """Blocking variant of `call`."""
+        self._reserve()
+        if self.limiter is not None:
+            try:
+                self.limiter.acquire_sync()
+            except BaseException:
+                self.release()
+                raise
+        started = time.monotonic()
+        try:
+            result = fn()
+        except RateLimitedError:
+            # Shed by a limiter inside `fn` before reaching the provider
+            self.release()
+            raise
+        except Exception:
+            self.record(False, time.monotonic() - started)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record(succeeded is None or bool(succeeded(result)), time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            window = self._window(now)
+            latencies = sorted(seconds for _, _, seconds in window)
+            errors = sum(1 for _, ok, _ in window if not ok)
+            stats = {
+                "state": self._state,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+                "window_calls": len(window),
+                "error_rate": round(errors / len(window), 3) if window else 0.0,
+                "p50_ms": _percentile_ms(latencies, 0.50),
+                "p95_ms": _percentile_ms(latencies, 0.95),
+            }
+            if self._state == OPEN:
+                stats["retry_in_seconds"] = round(max(0.0, self._opened_at + self.open_seconds - now), 1)
+            return stats
+
+    def _reserve(self) -> None:
+        if not self.allow():
+            with self._lock:
+                retry_in = max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+            raise CircuitOpenError(self.name, retry_in)
+
+    def _advance(self, now: float) -> None:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+
+    def _window(self, now: float):
+        cutoff = now - self.window_seconds
+        return [sample for sample in self._samples if sample[0] >= cutoff]
+
+    def _tripped(self, now: float) -> bool:
+        # Outcomes from before the last recovery don't count towards re-opening
+        window = [sample for sample in self._window(now) if sample[0] > self._closed_at]
+        if len(window) < self.min_calls:
+            return False
+        errors = sum(1 for _, ok, _ in window if not ok)
+        slow = sum(1 for _, _, seconds in window if seconds >= self.slow_call_seconds)
+        return errors / len(window) >= self.failure_rate or slow / len(window) >= self.slow_call_rate
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._probes = 0
+        self.times_opened += 1
+        logger.warning("%s circuit opened for %.0fs", self.name, self.open_seconds)
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self._probes = 0
+        self._closed_at = time.monotonic()
+        logger.info("%s circuit closed", self.name)
+
+
+def _percentile_ms(sorted_seconds, fraction: float) -> Optional[float]:
+    if not sorted_seconds:
+        return None
+    index = min(len(sorted_seconds) - 1, int(len(sorted_seconds) * fraction))
+    return round(sorted_seconds[index] * 1000, 1)
@@ -0,0 +1,195 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _bool_env(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return default if value is None else value.strip().lower() not in ("0", "false", "no", "off", "")
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Provider API endpoints. Unset means the public API; the load-test harness in
+# benchmarks/loadtest.py points these at local stub servers.
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT") or None
+HF_INFERENCE_URL = (os.getenv("HF_INFERENCE_URL") or "https://api-inference.huggingface.co").rstrip("/")
+SERPAPI_URL = os.getenv("SERPAPI_URL") or "https://serpapi.com/search"
+TAVILY_API_URL = os.getenv("TAVILY_API_URL") or None
+
+# Caption cache (keyed by a hash of the raw image bytes). Its SQLite file is shared by every
+# worker process; with SHARED_RESULT_CACHE the refine and search caches are kept there too.
+CAPTION_CACHE_PATH = os.getenv("CAPTION_CACHE_PATH") or os.path.join(BACKEND_DIR, ".cache", "captions.sqlite3")
+SHARED_RESULT_CACHE = _bool_env("SHARED_RESULT_CACHE", True)
+CAPTION_CACHE_MAX_ENTRIES = _int_env("CAPTION_CACHE_MAX_ENTRIES", 1024)
+CAPTION_CACHE_MEMORY_TTL = _float_env("CAPTION_CACHE_MEMORY_TTL", 3600.0)
+CAPTION_CACHE_DISK_TTL = _float_env("CAPTION_CACHE_DISK_TTL", 30 * 24 * 3600.0)
+
+# Offline product catalog (see services/catalog.py), searched when Tavily is unavailable.
+# Its index is rebuilt when the file changes, checked every CATALOG_RELOAD_SECONDS (0 disables).
+CATALOG_PATH = os.getenv("CATALOG_PATH") or os.path.join(BACKEND_DIR, "data", "catalog.jsonl")
+CATALOG_INDEX_DIR = os.getenv("CATALOG_INDEX_DIR") or os.path.join(BACKEND_DIR, ".cache", "catalog-index")
+CATALOG_TOP_K = _int_env("CATALOG_TOP_K", 5)
+# Most postings one query reads; beyond it only the highest-impact ones are scored (0 = exact)
+CATALOG_POSTINGS_BUDGET = _int_env("CATALOG_POSTINGS_BUDGET", 20000)
+CATALOG_RELOAD_SECONDS = _float_env("CATALOG_RELOAD_SECONDS", 30.0)
+
+# Vocabulary of the heuristic query refiner used when Gemini is unavailable (see services/attributes.py)
+ATTRIBUTE_VOCAB_PATH = os.getenv("ATTRIBUTE_VOCAB_PATH") or os.path.join(BACKEND_DIR, "data", "attributes.json")
+
+# Visual similarity index (see services/vector_index.py), built offline from catalog images.
+# /upload returns its nearest products as "similar_items"; a newly saved index is picked up
+# on the CATALOG_RELOAD_SECONDS check. VISUAL_EMBEDDER is "module:function" (empty = built-in).
+VISUAL_INDEX_DIR = os.getenv("VISUAL_INDEX_DIR") or os.path.join(BACKEND_DIR, ".cache", "visual-index")
+VISUAL_EMBEDDER = os.getenv("VISUAL_EMBEDDER", "")
+VISUAL_TOP_K = _int_env("VISUAL_TOP_K", 5)
+VISUAL_MIN_SCORE = _float_env("VISUAL_MIN_SCORE", 0.5)
+# IVF clusters scanned per query (only used by indexes built with --ivf-lists)
+VISUAL_NPROBE = _int_env("VISUAL_NPROBE", 8)
+
+# SerpApi result pages fetched per search, concurrently; fetching stops at the first
+# SERP_TARGET_RESULTS valid products (0 = every page). SERP_JSON_RESTRICTOR, when set, asks
+# SerpApi to return only those fields, e.g. "shopping_results[].{title,link,price,source,snippet}".
+SERP_PAGES = _int_env("SERP_PAGES", 1)
+SERP_PAGE_SIZE = _int_env("SERP_PAGE_SIZE", 60)
+SERP_TARGET_RESULTS = _int_env("SERP_TARGET_RESULTS", 0)
+SERP_JSON_RESTRICTOR = os.getenv("SERP_JSON_RESTRICTOR", "")
+
+# Pooled async HTTP clients shared by every request (see services/container.py)
+SERP_MAX_CONNECTIONS = _int_env("SERP_MAX_CONNECTIONS", 16)
+SERP_MAX_KEEPALIVE = _int_env("SERP_MAX_KEEPALIVE", 8)
+HF_MAX_CONNECTIONS = _int_env("HF_MAX_CONNECTIONS", 16)
+HF_MAX_KEEPALIVE = _int_env("HF_MAX_KEEPALIVE", 8)
+TAVILY_MAX_CONNECTIONS = _int_env("TAVILY_MAX_CONNECTIONS", 16)
+TAVILY_MAX_KEEPALIVE = _int_env("TAVILY_MAX_KEEPALIVE", 8)
+HTTP_KEEPALIVE_EXPIRY = _float_env("HTTP_KEEPALIVE_EXPIRY", 30.0)
+
+# Result caches with stale-while-revalidate (seconds)
+REFINE_CACHE_TTL = _float_env("REFINE_CACHE_TTL", 24 * 3600.0)
+REFINE_CACHE_STALE_TTL = _float_env("REFINE_CACHE_STALE_TTL", 7 * 24 * 3600.0)
+REFINE_CACHE_MAX_ENTRIES = _int_env("REFINE_CACHE_MAX_ENTRIES", 4096)
+SEARCH_CACHE_TTL = _float_env("SEARCH_CACHE_TTL", 900.0)
+SEARCH_CACHE_STALE_TTL = _float_env("SEARCH_CACHE_STALE_TTL", 6 * 3600.0)
+SEARCH_CACHE_MAX_ENTRIES = _int_env("SEARCH_CACHE_MAX_ENTRIES", 2048)
+
+# Merge/ranking of multi-provider search results (see services/ranking.py)
+RANK_TOP_K = _int_env("RANK_TOP_K", 20)
+RANK_MIN_SCORE = _float_env("RANK_MIN_SCORE", 0.05)
+RANK_DUPLICATE_THRESHOLD = _float_env("RANK_DUPLICATE_THRESHOLD", 0.8)
+
+# Image ingest: request bodies are cut off with 413 once they pass the limit (plus multipart
+# headroom, per file for /upload/batch) while streaming in, then each image is checked on its own
+MAX_UPLOAD_BYTES = _int_env("MAX_UPLOAD_BYTES", 15 * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = _int_env("UPLOAD_CHUNK_SIZE", 64 * 1024)
+# Headroom for multipart boundaries/headers in the request-body limit
+UPLOAD_MULTIPART_OVERHEAD = _int_env("UPLOAD_MULTIPART_OVERHEAD", 16 * 1024)
+
+# Image preprocessing before any vision call (see services/preprocess.py)
+PREPROCESS_ENABLED = _bool_env("PREPROCESS_ENABLED", True)
+PREPROCESS_MAX_EDGE = _int_env("PREPROCESS_MAX_EDGE", 1024)
+PREPROCESS_FORMAT = os.getenv("PREPROCESS_FORMAT", "JPEG").upper()
+PREPROCESS_QUALITY = _int_env("PREPROCESS_QUALITY", 85)
+PREPROCESS_WORKERS = _int_env("PREPROCESS_WORKERS", 2)
+
+# Multi-image uploads (POST /upload/batch): per-stage concurrency limits
+BATCH_MAX_FILES = _int_env("BATCH_MAX_FILES", 20)
+BATCH_CAPTION_CONCURRENCY = _int_env("BATCH_CAPTION_CONCURRENCY", 4)
+BATCH_REFINE_CONCURRENCY = _int_env("BATCH_REFINE_CONCURRENCY", 4)
+BATCH_SEARCH_CONCURRENCY = _int_env("BATCH_SEARCH_CONCURRENCY", 2)
+
+# Hugging Face captioning (see services/huggingface_blip.py). Candidate models are
+# raced under one overall deadline; models that 404 or keep returning 5xx are
+# skipped for HF_MODEL_COOLOFF seconds.
+HF_CAPTION_DEADLINE = _float_env("HF_CAPTION_DEADLINE", 20.0)
+HF_REQUEST_TIMEOUT = _float_env("HF_REQUEST_TIMEOUT", 15.0)
+HF_MAX_RETRIES = max(1, _int_env("HF_MAX_RETRIES", 2))
+HF_BACKOFF_BASE = _float_env("HF_BACKOFF_BASE", 0.5)
+HF_HEDGE_DELAY = _float_env("HF_HEDGE_DELAY", 1.5)
+HF_MODEL_COOLOFF = _float_env("HF_MODEL_COOLOFF", 300.0)
+
+# Per-provider circuit breakers (see utils/circuit_breaker.py). Outcomes are kept
+# for BREAKER_WINDOW_SECONDS; the breaker opens once the error rate or the share of
+# slow calls passes its threshold, then probes again after BREAKER_OPEN_SECONDS.
+BREAKER_WINDOW_SECONDS = _float_env("BREAKER_WINDOW_SECONDS", 60.0)
+BREAKER_MIN_CALLS = _int_env("BREAKER_MIN_CALLS", 5)
+BREAKER_FAILURE_RATE = _float_env("BREAKER_FAILURE_RATE", 0.5)
+BREAKER_SLOW_CALL_SECONDS = _float_env("BREAKER_SLOW_CALL_SECONDS", 8.0)
+BREAKER_SLOW_CALL_RATE = _float_env("BREAKER_SLOW_CALL_RATE", 0.8)
+BREAKER_OPEN_SECONDS = _float_env("BREAKER_OPEN_SECONDS", 30.0)
+BREAKER_HALF_OPEN_PROBES = _int_env("BREAKER_HALF_OPEN_PROBES", 1)
+
+# Outbound rate limits (see utils/rate_limit.py): a token bucket per provider refilled at
+# RATE_LIMIT_<PROVIDER>_PER_MINUTE, holding up to RATE_LIMIT_<PROVIDER>_BURST calls (0 per
+# minute = unlimited). Uploads queue ahead of background cache refreshes; once
+# RATE_LIMIT_MAX_QUEUE calls are waiting, or the wait would pass RATE_LIMIT_MAX_WAIT seconds,
+# the provider is skipped and its fallback runs.
+RATE_LIMITS = {
+    "gemini": (_float_env("RATE_LIMIT_GEMINI_PER_MINUTE", 60.0), _int_env("RATE_LIMIT_GEMINI_BURST", 10)),
+    "huggingface": (_float_env("RATE_LIMIT_HUGGINGFACE_PER_MINUTE", 60.0), _int_env("RATE_LIMIT_HUGGINGFACE_BURST", 10)),
+    "serp": (_float_env("RATE_LIMIT_SERP_PER_MINUTE", 60.0), _int_env("RATE_LIMIT_SERP_BURST", 10)),
+    "tavily": (_float_env("RATE_LIMIT_TAVILY_PER_MINUTE", 100.0), _int_env("RATE_LIMIT_TAVILY_BURST", 20)),
+}
+RATE_LIMIT_MAX_QUEUE = _int_env("RATE_LIMIT_MAX_QUEUE", 32)
+RATE_LIMIT_MAX_WAIT = _float_env("RATE_LIMIT_MAX_WAIT", 2.0)
+# Processes sharing those quotas: each one's limiters get 1/RATE_LIMIT_WORKERS of every rate
+# and burst. run.py sets it to its worker count; set it when starting workers another way.
+RATE_LIMIT_WORKERS = _int_env("RATE_LIMIT_WORKERS", 1)
+
+# Product search providers (see services/search_registry.py), queried concurrently. Each has
+# its own timeout in seconds (0 = only the request deadline), a weight its scores are scaled
+# by when results are merged, and SEARCH_<PROVIDER>_ENABLED to take it out of the fan-out.
+SEARCH_PROVIDERS = {
+    name: {
+        "timeout": _float_env(f"SEARCH_{name.upper()}_TIMEOUT", 12.0),
+        "weight": _float_env(f"SEARCH_{name.upper()}_WEIGHT", 1.0),
+        "enabled": _bool_env(f"SEARCH_{name.upper()}_ENABLED", True),
+    }
+    for name in ("tavily", "serp")
+}
+# First-k mode: once SEARCH_FIRST_K distinct results scoring at least SEARCH_FIRST_K_MIN_SCORE
+# against the query have arrived, stop waiting for the other providers (0 waits for all)
+SEARCH_FIRST_K = _int_env("SEARCH_FIRST_K", 0)
+SEARCH_FIRST_K_MIN_SCORE = _float_env("SEARCH_FIRST_K_MIN_SCORE", 0.2)
+
+# End-to-end /upload latency budget (see utils/deadline.py). Clients may ask for a
+# tighter or looser one with the X-Deadline-Ms header, up to UPLOAD_DEADLINE_MAX_SECONDS.
+# 0 disables the deadline. Each stage gets its share of the time still left.
+UPLOAD_DEADLINE_SECONDS = _float_env("UPLOAD_DEADLINE_SECONDS", 15.0)
+UPLOAD_DEADLINE_MAX_SECONDS = _float_env("UPLOAD_DEADLINE_MAX_SECONDS", 60.0)
+DEADLINE_SHARES = {
+    "caption": _float_env("DEADLINE_SHARE_CAPTION", 0.5),
+    "refine": _float_env("DEADLINE_SHARE_REFINE", 0.2),
+    "search": _float_env("DEADLINE_SHARE_SEARCH", 0.3),
+}
+
+# Server launched by run.py. WEB_WORKERS processes share one listening socket (0 = one per
+# CPU); with WEB_PRELOAD the app is imported once before forking them. On SIGTERM each worker
+# stops accepting, finishes in-flight requests for up to WEB_GRACEFUL_TIMEOUT seconds and exits.
+WEB_HOST = os.getenv("WEB_HOST", "127.0.0.1")
+WEB_PORT = _int_env("WEB_PORT", 8000)
+WEB_WORKERS = _int_env("WEB_WORKERS", 1)
+WEB_PRELOAD = _bool_env("WEB_PRELOAD", True)
+WEB_GRACEFUL_TIMEOUT = _float_env("WEB_GRACEFUL_TIMEOUT", 30.0)
+
+# Provider SDKs are imported on first use; with PROVIDER_WARMUP each worker imports them and
+# builds its clients in the background once it is taking requests
+PROVIDER_WARMUP = _bool_env("PROVIDER_WARMUP", True)
+
+# Logging (see utils/log.py): records go through a queue so handlers never block on stdout
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
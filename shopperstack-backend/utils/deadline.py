@@ -0,0 +1,46 @@
+import math
+import time
+from typing import Dict, List, Optional
+
+
+class Deadline:
+    """End-to-end latency budget for one request, split across pipeline stages.
+
+    `shares` maps each stage, in pipeline order, to its weight. A stage's budget is
+    its share of whatever time is left, relative to the stages still to run, so
+    time a fast stage doesn't use carries over to the later ones and the last
+    stage gets everything that remains. `seconds=None` means no deadline.
+    """
+
+    def __init__(self, seconds: Optional[float], shares: Dict[str, float]):
+        self.seconds = seconds
+        self.shares = dict(shares)
+        self.started = time.monotonic()
+        self.expires_at = math.inf if seconds is None else self.started + seconds
+        self.degraded: List[str] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget_for(self, stage: str) -> Optional[float]:
+        """Seconds `stage` may take (None when there is no deadline)."""
+        if self.seconds is None:
+            return None
+        stages = list(self.shares)
+        later = stages[stages.index(stage):] if stage in self.shares else [stage]
+        total = sum(self.shares.get(s, 0.0) for s in later)
+        share = self.shares.get(stage, 0.0) / total if total > 0 else 1.0
+        return self.remaining() * share
+
+    def degrade(self, stage: str) -> None:
+        """Record that `stage` fell back or was cut off to stay within the budget."""
+        if stage not in self.degraded:
+            self.degraded.append(stage)
+
+    def info(self) -> Dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "budget_ms": None if self.seconds is None else round(self.seconds * 1000),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "degraded_stages": list(self.degraded),
+        }
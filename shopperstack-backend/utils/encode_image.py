@@ -1,8 +1,58 @@
 import base64
 
+from services.huggingface_blip import _detect_content_type
+
 def encode_image_to_base64(image_path):
     with open(image_path, "rb") as f:
         return base64.b64encode(f.read()).decode("utf-8")
 
+def read_uploaded_file(file):
+    return file.file.read()
+
+def encode_bytes_to_base64(image_bytes):
+    return base64.b64encode(image_bytes).decode("utf-8")
+
 def encode_uploaded_file(file):
-    return base64.b64encode(file.file.read()).decode("utf-8")
\ No newline at end of file
+    return encode_bytes_to_base64(read_uploaded_file(file))
+
+
+class ImageUploadError(Exception):
+    """An upload rejected during ingest; carries the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def read_image_upload(file, max_bytes: int, chunk_size: int = 64 * 1024):
+    """Read an uploaded image in chunks into a single buffer.
+
+    The first chunk is sniffed for image magic bytes, so non-images are refused
+    after reading at most `chunk_size` bytes, and the per-image size limit is
+    enforced as chunks arrive. The request body has already been spooled by then;
+    main.UploadSizeLimit bounds it while it streams in. Returns
+    `(memoryview, content_type)`; the view is the only copy of the image and is
+    passed as-is to the captioners.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise ImageUploadError(413, f"Image exceeds the {max_bytes} byte upload limit")
+
+    first = await file.read(chunk_size)
+    if not first:
+        raise ImageUploadError(400, "Uploaded file is empty")
+    content_type = _detect_content_type(first)
+    if content_type == "application/octet-stream":
+        raise ImageUploadError(415, "File must be an image (JPEG, PNG, GIF, WebP or BMP)")
+
+    buffer = bytearray(first)
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        if len(buffer) + len(chunk) > max_bytes:
+            raise ImageUploadError(413, f"Image exceeds the {max_bytes} byte upload limit")
+        buffer += chunk
+    if len(buffer) > max_bytes:
+        raise ImageUploadError(413, f"Image exceeds the {max_bytes} byte upload limit")
+    return memoryview(buffer), content_type
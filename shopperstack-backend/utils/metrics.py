@@ -0,0 +1,131 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Own registry, so importing the app twice (tests, reloads) never double-registers
+REGISTRY = CollectorRegistry()
+
+# Covers local cache hits (~1 ms) up to a blown upload deadline
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0)
+
+REQUESTS = Counter(
+    "shopperstack_requests_total", "HTTP requests handled", ["endpoint", "method", "status"], registry=REGISTRY
+)
+REQUEST_SECONDS = Histogram(
+    "shopperstack_request_duration_seconds", "End-to-end request latency", ["endpoint"],
+    buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "shopperstack_requests_in_flight", "Requests currently being handled", ["endpoint"], registry=REGISTRY
+)
+STAGE_SECONDS = Histogram(
+    "shopperstack_stage_duration_seconds", "Upload pipeline stage latency (encode, preprocess, caption, refine, search, visual)",
+    ["stage"], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+STAGES_IN_FLIGHT = Gauge(
+    "shopperstack_stages_in_flight", "Pipeline stages currently running", ["stage"], registry=REGISTRY
+)
+PROVIDER_SECONDS = Histogram(
+    "shopperstack_search_provider_duration_seconds", "Latency of each search provider within the search stage",
+    ["provider"], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+PROVIDER_ERRORS = Counter(
+    "shopperstack_provider_errors_total", "Provider calls that failed, timed out, or were rejected by an open circuit or a saturated rate limiter",
+    ["provider", "kind"], registry=REGISTRY
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time one pipeline stage into STAGE_SECONDS, track it as in flight and log its duration."""
+    STAGES_IN_FLIGHT.labels(stage).inc()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGES_IN_FLIGHT.labels(stage).dec()
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        logger.debug("stage finished", extra={"stage": stage, "ms": round(elapsed * 1000, 1)})
+
+
+@contextmanager
+def provider_timer(provider: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PROVIDER_SECONDS.labels(provider).observe(time.perf_counter() - started)
+
+
+def provider_error(provider: str, kind: str = "error") -> None:
+    PROVIDER_ERRORS.labels(provider, kind).inc()
+
+
+class ServiceCollector:
+    """Reads cache and single-flight counters from the service container at scrape time,
+    so the hot path doesn't pay for them twice.
+    """
+
+    def __init__(self, services):
+        self.services = services
+
+    def collect(self):
+        hits = CounterMetricFamily("shopperstack_cache_hits", "Cache lookups served from cache", labels=["cache"])
+        misses = CounterMetricFamily("shopperstack_cache_misses", "Cache lookups that had to load", labels=["cache"])
+        ratio = GaugeMetricFamily("shopperstack_cache_hit_ratio", "Share of cache lookups served from cache",
+                                  labels=["cache"])
+        caches = {
+            "caption": self.services.caption_cache,
+            "refine": self.services.refine_cache,
+            "search": self.services.search_cache,
+        }
+        for name, cache in caches.items():
+            stats = cache.stats()
+            served = stats["hits"] + stats.get("stale_hits", 0) + stats.get("shared_hits", 0)
+            hits.add_metric([name], served)
+            misses.add_metric([name], stats["misses"])
+            ratio.add_metric([name], stats["hit_ratio"])
+
+        coalesced = CounterMetricFamily("shopperstack_coalesced_calls", "Calls that joined an identical in-flight call",
+                                        labels=["group"])
+        in_flight = GaugeMetricFamily("shopperstack_singleflight_in_flight", "Distinct provider calls in flight",
+                                      labels=["group"])
+        for flight in (self.services.caption_flight, self.services.refine_flight, self.services.search_flight):
+            stats = flight.stats()
+            coalesced.add_metric([flight.name], stats["coalesced"])
+            in_flight.add_metric([flight.name], stats["in_flight"])
+
+        breaker_open = GaugeMetricFamily("shopperstack_circuit_open", "1 while a provider's circuit is not closed",
+                                         labels=["provider"])
+        for name, breaker in self.services.breakers.items():
+            breaker_open.add_metric([name], 0 if breaker.state == "closed" else 1)
+
+        waiting = GaugeMetricFamily("shopperstack_rate_limit_waiting", "Provider calls queued for a rate-limit token",
+                                    labels=["provider"])
+        for name, limiter in self.services.rate_limiters.items():
+            waiting.add_metric([name], limiter.stats()["waiting"])
+
+        yield from (hits, misses, ratio, coalesced, in_flight, breaker_open, waiting)
+
+
+def register_services(services) -> ServiceCollector:
+    collector = ServiceCollector(services)
+    REGISTRY.register(collector)
+    return collector
+
+
+def unregister(collector: ServiceCollector) -> None:
+    try:
+        REGISTRY.unregister(collector)
+    except KeyError:
+        pass
+
+
+def render() -> bytes:
+    return generate_latest(REGISTRY)
@@ -0,0 +1,232 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from utils import config
+from utils.metrics import provider_error
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first: uploads waiting on a provider go ahead of background cache refreshes
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Priority of the provider calls made by the current task; utils/cache.py lowers it
+# for stale-while-revalidate refreshes
+priority_var: ContextVar[int] = ContextVar("provider_priority", default=INTERACTIVE)
+
+
+class RateLimitedError(Exception):
+    """Raised instead of queueing for a provider whose limiter is saturated."""
+
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"{name} rate limited: {reason}")
+        self.name = name
+        self.reason = reason
+
+
+class RateLimiter:
+    """Token bucket shared by every call to one provider.
+
+    The bucket holds up to `burst` tokens and refills at `per_minute` tokens a
+    minute; each outbound request takes one. Callers that find it empty queue
+    by priority (then arrival order) and wake when their token is due. A caller
+    is refused with RateLimitedError instead of queueing when `max_queue` calls
+    are already waiting, or when its expected wait passes `max_wait` seconds, so
+    the pipeline takes that provider's fallback rather than stacking latency.
+    A 429 from the provider pauses the whole bucket (`pause`), so concurrent
+    callers back off together instead of each retrying into the quota.
+
+    Thread-safe: the blocking provider paths running in worker threads share a
+    limiter with the async ones.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: int = 1, max_queue: Optional[int] = None,
+                 max_wait: Optional[float] = None):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_queue = max(0, config.RATE_LIMIT_MAX_QUEUE if max_queue is None else max_queue)
+        self.max_wait = config.RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        # (priority, arrival) of every queued caller; the smallest is served next
+        self._waiting: List[Tuple[int, int]] = []
+        self._arrivals = itertools.count()
+
+        self.granted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.pauses = 0
+
+    async def acquire(self, priority: Optional[int] = None, timeout: Optional[float] = None) -> None:
+        """Take a token, waiting at most `timeout` (and `max_wait`) seconds for it."""
+        entry, deadline = self._enqueue(priority, timeout)
+        if entry is None:
+            return
+        try:
+            while True:
+                wait = self._wait_for(entry, deadline)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+        finally:
+            self._leave(entry)
+
+    def acquire_sync(self, priority: Optional[int] = None, timeout: Optional[float] = None) -> None:
+        """Blocking variant of `acquire`, for the provider paths that run in worker threads."""
+        entry, deadline = self._enqueue(priority, timeout)
+        if entry is None:
+            return
+        try:
+            while True:
+                wait = self._wait_for(entry, deadline)
+                if wait <= 0:
+                    return
+                time.sleep(wait)
+        finally:
+            self._leave(entry)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for `seconds` (a provider's Retry-After) and drop the saved burst."""
+        if seconds <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, now + seconds)
+            self.pauses += 1
+        logger.warning("%s rate limited by the provider; pausing for %.1fs", self.name, seconds)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            stats = {
+                "per_minute": round(self.rate * 60, 2),
+                "burst": self.burst,
+                "tokens": round(self._tokens, 2),
+                "waiting": len(self._waiting),
+                "granted": self.granted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "pauses": self.pauses,
+            }
+            if self._paused_until > now:
+                stats["paused_seconds"] = round(self._paused_until - now, 1)
+            return stats
+
+    # Internal helpers
+
+    def _enqueue(self, priority: Optional[int], timeout: Optional[float]):
+        """Take a token at once (returns (None, _)) or join the queue; raises when saturated."""
+        priority = priority_var.get() if priority is None else priority
+        budget = self.max_wait if timeout is None else min(timeout, self.max_wait)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if not self._waiting and self._available(now):
+                self._tokens -= 1.0
+                self.granted += 1
+                return None, now
+            if len(self._waiting) >= self.max_queue:
+                self._reject("queue_full", f"{len(self._waiting)} calls already waiting")
+            entry = (priority, next(self._arrivals))
+            heapq.heappush(self._waiting, entry)
+            wait = self._estimate(entry, now)
+            if wait > budget:
+                self._remove(entry)
+                self._reject("wait", f"next slot in {wait:.1f}s")
+            self.queued += 1
+            return entry, now + budget
+
+    def _wait_for(self, entry: Tuple[int, int], deadline: float) -> float:
+        """0 once `entry` has taken its token, else how long to sleep before checking again."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._waiting[0] == entry and self._available(now):
+                heapq.heappop(self._waiting)
+                self._tokens -= 1.0
+                self.granted += 1
+                return 0.0
+            if now >= deadline:
+                # Overtaken by higher-priority callers, or paused by the provider, past our budget
+                self._remove(entry)
+                self._reject("wait", "waited too long")
+            # The queue may have changed under us; the estimate is rechecked on every wake-up
+            return max(0.001, min(self._estimate(entry, now), deadline - now))
+
+    def _leave(self, entry: Tuple[int, int]) -> None:
+        # Cancelled or rejected while queued: don't hold up the callers behind us
+        with self._lock:
+            if entry in self._waiting:
+                self._remove(entry)
+
+    def _refill(self, now: float) -> None:
+        start = max(self._updated_at, self._paused_until)
+        if now > start:
+            self._tokens = min(float(self.burst), self._tokens + (now - start) * self.rate)
+        self._updated_at = now
+
+    def _available(self, now: float) -> bool:
+        return now >= self._paused_until and self._tokens >= 1.0
+
+    def _estimate(self, entry: Tuple[int, int], now: float) -> float:
+        ahead = sum(1 for other in self._waiting if other < entry)
+        paused = max(0.0, self._paused_until - now)
+        tokens = 0.0 if paused else self._tokens
+        return paused + max(0.0, ahead + 1 - tokens) / self.rate
+
+    def _remove(self, entry: Tuple[int, int]) -> None:
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+
+    def _reject(self, kind: str, reason: str) -> None:
+        self.rejected += 1
+        provider_error(self.name, "rate_limited")
+        logger.debug("%s call shed (%s): %s", self.name, kind, reason)
+        raise RateLimitedError(self.name, reason)
+
+
+def retry_after_seconds(headers, default: float) -> float:
+    """Seconds from a 429's Retry-After header (delta-seconds form), else `default`."""
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return default
+
+
+_limiters: Dict[str, Optional[RateLimiter]] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> Optional[RateLimiter]:
+    """The process-wide limiter for a provider in config.RATE_LIMITS, or None when it is unlimited.
+
+    With RATE_LIMIT_WORKERS processes sharing the quota, each gets an equal share of
+    the rate and of the burst (at least one call), so together they stay within it.
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            per_minute, burst = config.RATE_LIMITS.get(name, (0.0, 0))
+            workers = max(1, config.RATE_LIMIT_WORKERS)
+            _limiters[name] = (
+                RateLimiter(name, per_minute / workers, max(1, burst // workers)) if per_minute > 0 else None
+            )
+        return _limiters[name]
+
+
+def limiters() -> Dict[str, RateLimiter]:
+    """Every configured provider's limiter, by provider name."""
+    found = {name: get_limiter(name) for name in config.RATE_LIMITS}
+    return {name: limiter for name, limiter in found.items() if limiter is not None}
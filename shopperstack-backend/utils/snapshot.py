@@ -0,0 +1,98 @@
+"""Versioned on-disk snapshots of NumPy arrays, mapped back in with mmap.
+
+A snapshot directory holds one `v<timestamp>` subdirectory per saved version
+(one `.npy` file per array plus JSON documents) and a `CURRENT` file naming the
+live one. `CURRENT` is replaced atomically, so a reader never sees a partly
+written version; older versions are removed after the switch.
+
+Every worker started by run.py may save the same index at once, so saves hold
+an exclusive lock on `.lock` in the snapshot directory.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process only
+    fcntl = None
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def save_snapshot(index_dir: str, arrays: Dict[str, np.ndarray], documents: Dict[str, object]) -> str:
+    """Write `arrays` (as .npy) and `documents` (as JSON) as a new version and point CURRENT at it.
+
+    Versions older than the one CURRENT named before the switch are removed; a
+    reader that has just read the old pointer can still open its files, and
+    processes that still map older versions keep working (on POSIX). A failed
+    removal is simply retried on the next save.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    with _exclusive(index_dir):
+        version = f"v{time.time_ns()}"
+        target = os.path.join(index_dir, version)
+        os.makedirs(target)
+        for name, values in arrays.items():
+            np.save(os.path.join(target, f"{name}.npy"), values)
+        for name, document in documents.items():
+            with open(os.path.join(target, f"{name}.json"), "w") as f:
+                json.dump(document, f, separators=(",", ":"))
+
+        pointer = os.path.join(index_dir, "CURRENT")
+        previous = _read_pointer(pointer)
+        with open(pointer + ".tmp", "w") as f:
+            f.write(version)
+        os.replace(pointer + ".tmp", pointer)
+
+        for entry in os.listdir(index_dir):
+            if entry.startswith("v") and entry not in (version, previous):
+                shutil.rmtree(os.path.join(index_dir, entry), ignore_errors=True)
+    return target
+
+
+def load_snapshot(index_dir: str, arrays: Iterable[str],
+                  documents: Iterable[str]) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, object]]]:
+    """Map the CURRENT version's arrays read-only and parse its documents.
+
+    Returns `(arrays, documents)`, or None if there is no complete saved version.
+    """
+    try:
+        with open(os.path.join(index_dir, "CURRENT")) as f:
+            target = os.path.join(index_dir, f.read().strip())
+        loaded_documents = {}
+        for name in documents:
+            with open(os.path.join(target, f"{name}.json")) as f:
+                loaded_documents[name] = json.load(f)
+        loaded_arrays = {name: np.load(os.path.join(target, f"{name}.npy"), mmap_mode="r") for name in arrays}
+    except (OSError, ValueError) as e:
+        logger.debug("No usable snapshot in %s: %s", index_dir, e)
+        return None
+    return loaded_arrays, loaded_documents
+
+
+def _read_pointer(pointer: str) -> Optional[str]:
+    try:
+        with open(pointer) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+@contextmanager
+def _exclusive(index_dir: str):
+    """Hold the snapshot directory's lock file, so concurrent saves don't prune each other's versions."""
+    with open(os.path.join(index_dir, ".lock"), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)